@@ -0,0 +1,60 @@
+"""Benchmark creating classes at run time.
+
+Class statements inside functions and loops, as in record factories
+and ORM-style model declarations, go through LOAD_BUILD_CLASS and
+x-python's build_class() once per execution of the statement.
+"""
+import time
+
+
+def record_factory(n):
+    total = 0
+    for i in range(n):
+
+        class Record(object):
+            fields = ("id", "name")
+            size = i
+
+            def __init__(self, id, name):
+                self.id = id
+                self.name = name
+
+            def __repr__(self):
+                return "Record(%r, %r)" % (self.id, self.name)
+
+        total += Record(i, "x").id + Record.size
+    return total
+
+
+class Field(object):
+    def __init__(self, kind):
+        self.kind = kind
+
+
+def models(n):
+    total = 0
+    for i in range(n):
+
+        class Base(object):
+            id = Field(int)
+
+        class User(Base):
+            name = Field(str)
+            email = Field(str)
+
+        class Admin(User):
+            level = Field(int)
+
+        total += len(Admin.__mro__) + len(vars(User))
+    return total
+
+
+def main(n=2000):
+    for fn in (record_factory, models):
+        start = time.perf_counter()
+        fn(n)
+        print("%-14s %.3fs" % (fn.__name__, time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Benchmark building literal containers and unpacking them.
+
+Exercises BUILD_TUPLE, BUILD_LIST, BUILD_SET, BUILD_MAP,
+BUILD_CONST_KEY_MAP, the *-unpacking displays (BUILD_*_UNPACK, or
+LIST_EXTEND and DICT_UPDATE from 3.9 on), UNPACK_SEQUENCE and
+UNPACK_EX.
+"""
+import time
+
+
+def literals(n):
+    total = 0
+    for i in range(n):
+        t = (i, i + 1, i + 2)
+        l = [i, i, i, i]
+        s = {i, 1, 2}
+        d = {"a": i, "b": t, "c": l}
+        k = {i: 1, -i: 2}
+        total += len(t) + len(l) + len(s) + len(d) + len(k)
+    return total
+
+
+def unpacking(n):
+    total = 0
+    pair = (1, 2)
+    row = [1, 2, 3, 4, 5]
+    for i in range(n):
+        a, b = pair
+        c, d, e, f, g = row
+        h, *rest, j = row
+        b, a = a, b
+        total += a + b + c + g + h + j + len(rest)
+    return total
+
+
+def star_displays(n):
+    total = 0
+    head = [1, 2]
+    tail = (3, 4)
+    base = {"a": 1}
+    for i in range(n):
+        l = [*head, i, *tail]
+        t = (*tail, *head)
+        d = {**base, "b": i}
+        total += len(l) + len(t) + len(d)
+    return total
+
+
+def main(n=5000):
+    for fn in (literals, unpacking, star_displays):
+        start = time.perf_counter()
+        fn(n)
+        print("%-14s %.3fs" % (fn.__name__, time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Benchmark structural pattern matching (Python 3.10 and later).
+
+A message dispatcher in the style of an event loop or interpreter
+front end, matching each message against mapping, class, sequence and
+literal patterns. Exercises MATCH_MAPPING, MATCH_KEYS,
+COPY_DICT_WITHOUT_KEYS, MATCH_CLASS, MATCH_SEQUENCE, GET_LEN and ROT_N.
+"""
+import time
+
+
+class Move:
+    __match_args__ = ("x", "y")
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+class Quit:
+    pass
+
+
+def dispatch(msg):
+    match msg:
+        case {"op": "add", "args": [a, b]}:
+            return a + b
+        case {"op": "neg", "arg": a, **rest}:
+            return -a + len(rest)
+        case Move(0, y):
+            return y
+        case Move(x, y=y):
+            return x * y
+        case Quit():
+            return 0
+        case [op, *args]:
+            return len(args)
+        case int(n) | float(n):
+            return n
+        case "noop" | None:
+            return 0
+        case _:
+            return -1
+
+
+MESSAGES = (
+    {"op": "add", "args": [1, 2]},
+    {"op": "neg", "arg": 3, "tag": "x"},
+    Move(0, 4),
+    Move(2, 3),
+    Quit(),
+    ["call", 1, 2, 3],
+    7,
+    "noop",
+    b"unknown",
+)
+
+
+def messages(n):
+    total = 0
+    for i in range(n):
+        for msg in MESSAGES:
+            total += dispatch(msg)
+    return total
+
+
+def main(n=1000):
+    start = time.perf_counter()
+    messages(n)
+    print("%-14s %.3fs" % ("messages", time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
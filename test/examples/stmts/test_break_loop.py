@@ -0,0 +1,43 @@
+# Test break, with and without a block between it and its loop.
+# Before 3.8 this is BREAK_LOOP.
+"""This program is self-checking!"""
+
+
+def first_over(items, limit):
+    for i in items:
+        for j in items:
+            if j > i:
+                break
+        if i > limit:
+            break
+    else:
+        return None
+    return i, j
+
+
+assert first_over(range(10), 4) == (5, 6)
+assert first_over(range(10), 40) is None
+
+n = 0
+while True:
+    n += 1
+    if n > 5:
+        break
+assert n == 6
+
+l = []
+for i in range(5):
+    try:
+        if i == 2:
+            break
+        l.append(i)
+    finally:
+        l.append("f")
+assert l == [0, "f", 1, "f", "f"]
+
+for i in range(3):
+    try:
+        break
+    except ValueError:
+        pass
+assert i == 0
@@ -0,0 +1,59 @@
+# Test the print statement, which is Python 2 only. Between items
+# PRINT_ITEM and PRINT_ITEM_TO write a space unless the last item
+# written ended in whitespace other than a space.
+"""This program is self-checking!"""
+import sys
+import tempfile
+
+
+class Out(object):
+    def __init__(self):
+        self.parts = []
+
+    def write(self, s):
+        self.parts.append(s)
+
+    def getvalue(self):
+        return "".join(self.parts)
+
+
+out = Out()
+print >> out, 1, "a"
+print >> out, "b\t",
+print >> out, "c"
+print >> out, "d ",
+print >> out, "e"
+assert out.getvalue() == "1 a\nb\tc\nd  e\n"
+
+stdout = sys.stdout
+sys.stdout = out = Out()
+try:
+    print "x", 2,
+    print
+    print "y",
+    print "z"
+finally:
+    sys.stdout = stdout
+assert out.getvalue() == "x 2\ny z\n"
+
+# Anything else written to the stream in between drops the pending space,
+# as the write() of a Python 2 file clears softspace.
+out = tempfile.TemporaryFile("w+")
+sys.stdout = out
+try:
+    print "a",
+    sys.stdout.write("x\n")
+    print "b"
+finally:
+    sys.stdout = stdout
+out.seek(0)
+assert out.read() == "ax\nb\n"
+
+print "c",
+print "d", 3
+
+# Run on Python 3, no softspace attribute is left on its streams.
+if sys.version_info[0] >= 3:
+    assert not hasattr(out, "softspace")
+    assert not hasattr(sys.stdout, "softspace")
+out.close()
@@ -10,6 +10,87 @@ PY2 = not PYTHON3
 
 
 class TestBasic(vmtest.VmTestCase):
+    if PYTHON_VERSION_TRIPLE >= (3, 10):
+        # "match" statement and its bytecode were added in 3.10
+        def test_match(self):
+            self.assert_ok(
+                """\
+                from collections import OrderedDict, deque
+
+                class Point:
+                    __match_args__ = ("x", "y")
+                    def __init__(self, x, y):
+                        self.x, self.y = x, y
+
+                def classify(msg):
+                    match msg:
+                        case {"type": "ping", **rest}:
+                            return ("ping", rest)
+                        case {"type": "data", "payload": [first, *others]}:
+                            return ("data", first, others)
+                        case Point(0, y=yy):
+                            return ("y-axis", yy)
+                        case Point(x, y) if x == y:
+                            return ("diag", x)
+                        case int(n) | float(n):
+                            return ("num", n)
+                        case str() as s:
+                            return ("str", s)
+                        case (a, b, c):
+                            return ("triple", a, b, c)
+                        case [a, b]:
+                            return ("pair", a, b)
+                        case _:
+                            return ("other",)
+
+                results = [
+                    classify(c)
+                    for c in (
+                        {"type": "ping", "id": 3},
+                        OrderedDict(type="data", payload=(1, 2, 3)),
+                        Point(0, 5), Point(2, 2), Point(3, 4),
+                        7, 2.5, "hi", (1, 2, 3), deque([4, 5]), b"ab",
+                    )
+                ]
+                print(results)
+                assert results[1] == ("data", 1, [2, 3])
+                assert results[9] == ("pair", 4, 5) and results[10] == ("other",)
+                """
+            )
+
+    if PYTHON_VERSION_TRIPLE[:2] == (3, 10):
+        # Exception tables, which 3.11 uses for try statements, are not
+        # run yet.
+        def test_match_errors(self):
+            self.assert_ok(
+                """\
+                class Point:
+                    __match_args__ = ("x", "y")
+                    def __init__(self, x, y):
+                        self.x, self.y = x, y
+                try:
+                    match Point(1, 2):
+                        case Point(1, 2, 3):
+                            pass
+                except TypeError as e:
+                    print(e)
+                """
+            )
+
+    def test_huge_range(self):
+        # A range longer than sys.maxsize can be iterated over but has
+        # no len().
+        self.assert_ok(
+            """\
+            for i in range(10**20):
+                if i == 2:
+                    break
+            print("ok", i)
+            squares = [i * i for i in range(10**20, 10**20 + 3)]
+            assert squares[0] == 10**40
+            """
+        )
+
     if PYTHON_VERSION_TRIPLE[:2] in ((3, 10),):
         print("Test not gone over yet for %s" % version_tuple_to_str())
     else:
@@ -47,9 +128,126 @@ class TestBasic(vmtest.VmTestCase):
     def test_comprehensions(self):
         self.self_checking()
 
+        self.assert_ok(
+            """\
+            def f(n):
+                y = 10
+                a = [x + y for x in range(n)]
+                b = [[i * j for j in range(3)] for i in range(n)]
+                c = {k: v for k, v in zip("ab", a)}
+                d = [lambda: x for x in range(2)]
+                try:
+                    [1 // x for x in range(2)]
+                except ZeroDivisionError:
+                    y = 0
+                return a, b, c, [g() for g in d], y
+            assert f(2) == ([10, 11], [[0, 0, 0], [0, 1, 2]], {"a": 10, "b": 11}, [1, 1], 0)
+            """
+        )
+
     def test_generator_expression(self):
         self.self_checking()
 
+    def test_operators_on_mixed_types(self):
+        self.assert_ok(
+            """\
+            class Acc(object):
+                def __init__(self):
+                    self.items = []
+                def __iadd__(self, other):
+                    self.items.append(other)
+                    return self
+                def __radd__(self, other):
+                    return other + len(self.items)
+            a = Acc()
+            b = a
+            a += 1
+            a += "x"
+            assert a is b and a.items == [1, "x"]
+            assert 40 + a == 42
+            n, f, s = 7, 2.5, "ab"
+            n -= 2
+            f *= 2
+            s += "c"
+            assert (n, f, s, n ** 2, -n, ~n, n // 2, n % 3) == (5, 5.0, "abc", 25, -5, -6, 2, 2)
+            assert s[1:] == "bc"
+            """
+        )
+
+    if PYTHON_VERSION_TRIPLE < (3, 11):
+        # Exception tables, which 3.11 uses for try statements, are not
+        # run yet.
+        def test_operators_on_mixed_types_errors(self):
+            self.assert_ok(
+                """\
+                n, s = 7, "ab"
+                try:
+                    s - 1
+                except TypeError:
+                    n = None
+                assert n is None
+                """
+            )
+
+    if PYTHON3:
+
+        def test_containers_and_unpacking(self):
+            self.assert_ok(
+                """\
+                def f(n):
+                    a, *b, c = range(n)
+                    d, e = (x for x in "de")
+                    l = [a, *b, c]
+                    m = {"a": a, "n": n, **{"c": c}}
+                    return (a, n, c), l, {a, *b}, m, {a: 1, c: 2}, d + e
+                assert f(4) == (
+                    (0, 4, 3),
+                    [0, 1, 2, 3],
+                    {0, 1, 2},
+                    {"a": 0, "n": 4, "c": 3},
+                    {0: 1, 3: 2},
+                    "de",
+                )
+                """
+            )
+
+        if PYTHON_VERSION_TRIPLE < (3, 11):
+            # Exception tables, which 3.11 uses for try statements, are
+            # not run yet.
+            def test_unpacking_errors(self):
+                self.assert_ok(
+                    """\
+                    try:
+                        p, q = iter([1])
+                    except ValueError:
+                        p = q = None
+                    try:
+                        p, q = iter(range(10**9))
+                    except ValueError:
+                        q = 0
+                    assert (p, q) == (None, 0)
+                    """
+                )
+
+        def test_keyword_argument_errors(self):
+            for call in (
+                'f(**{"a": 1}, **{"a": 2})',
+                'f(a=1, **{"a": 2})',
+                "f(**{}, **1)",
+                "f(**1)",
+                "dict(**{}, **1)",
+            ):
+                self.assert_ok(
+                    """\
+                    __name__ = "m"
+                    def f(**kwargs):
+                        return kwargs
+                    %s
+                    """
+                    % call,
+                    raises=TypeError,
+                )
+
     if PYTHON_VERSION_TRIPLE[:2] in ((3, 10),):
         print("Test not gone over yet for %s" % version_tuple_to_str())
     else:
@@ -136,6 +334,23 @@ class TestBasic(vmtest.VmTestCase):
                 raises=NameError,
             )
 
+        def test_module_level_names(self):
+            self.assert_ok(
+                """\
+                total = 0
+                for i in range(5):
+                    total = total + i
+                len = lambda x: -1
+                assert (total, len("abc")) == (10, -1)
+                del len
+                assert len("abc") == 3
+                class C:
+                    total = total * 2
+                    name = __name__
+                assert C.total == 20 and total == 10
+                """
+            )
+
         def test_deleting_local_names(self):
             self.assert_ok(
                 """\
@@ -301,6 +516,66 @@ class TestBasic(vmtest.VmTestCase):
                 """
             )
 
+        def test_method_calls(self):
+            self.assert_ok(
+                """\
+                class Thing(object):
+                    def meth(self, x, y=2):
+                        return x * y
+                class Shadow(Thing):
+                    def __init__(self):
+                        self.meth = lambda x: -x
+                t = Thing()
+                assert t.meth(3) == 6
+                assert t.meth(3, y=4) == 12
+                assert Shadow().meth(3) == -3
+                assert "-".join(["a", "b"]) == "a-b"
+                assert Thing.meth(t, 5) == 10
+                """
+            )
+
+        def test_native_method_override(self):
+            # An override added to a subclass without going through
+            # interpreted STORE_ATTR or setattr() is still found.
+            self.assert_ok(
+                """\
+                class A(object):
+                    def m(self):
+                        return "A"
+                class B(A):
+                    pass
+                b = B()
+                assert b.m() == "A"
+                type.__setattr__(B, "m", lambda self: "B")
+                assert b.m() == "B"
+                """
+            )
+
+        def test_break_from_nested_loops(self):
+            self.assert_ok(
+                """\
+                def first_over(items, limit):
+                    for i in items:
+                        for j in items:
+                            if j > i:
+                                break
+                        if i > limit:
+                            break
+                    else:
+                        return None
+                    return i, j
+
+                assert first_over(range(10), 4) == (5, 6)
+                assert first_over(range(10), 40) is None
+                n = 0
+                while True:
+                    n += 1
+                    if n > 5:
+                        break
+                print(n)
+                """
+            )
+
         def test_unpacking(self):
             self.assert_ok(
                 """\
@@ -355,6 +630,133 @@ class TestBasic(vmtest.VmTestCase):
                 """
             )
 
+        if PYTHON3:
+
+            if PYTHON_VERSION_TRIPLE < (3, 11):
+                # MAKE_CELL, which 3.11 uses to set up cells, is not run
+                # yet.
+                def test_classes_in_a_loop(self):
+                    self.assert_ok(
+                        """\
+                        class Meta(type):
+                            @classmethod
+                            def __prepare__(mcs, name, bases):
+                                return {"made_by": "Meta"}
+
+                        def make(i):
+                            class Point(object, metaclass=Meta):
+                                size = i
+                                def __init__(self, x):
+                                    self.x = x
+                                def __repr__(self):
+                                    return "Point(%d)" % self.x
+                            return Point
+
+                        classes = [make(i) for i in range(3)]
+                        assert [c.size for c in classes] == [0, 1, 2]
+                        assert len(set(classes)) == 3
+                        assert repr(classes[2](7)) == "Point(7)"
+                        assert classes[0].made_by == "Meta"
+                        """
+                    )
+
+            def test_creating_instances(self):
+                self.assert_ok(
+                    """\
+                    class Point(object):
+                        def __init__(self, x, y=0, z=0):
+                            self.x, self.y, self.z = x, y, z
+
+                    class Point3(Point):
+                        def __init__(self, x, y, z):
+                            Point.__init__(self, x, y, z=z)
+
+                    class Singleton(object):
+                        instance = None
+                        def __new__(cls, *args):
+                            if cls.instance is None:
+                                cls.instance = object.__new__(cls)
+                            return cls.instance
+                        def __init__(self, name):
+                            self.name = name
+
+                    class Error(Exception):
+                        def __init__(self, msg):
+                            Exception.__init__(self, msg.upper())
+
+                    p = Point(1, z=3)
+                    assert (p.x, p.y, p.z) == (1, 0, 3)
+                    q = Point3(1, 2, 3)
+                    assert (q.x, q.y, q.z) == (1, 2, 3)
+                    assert Singleton("a") is Singleton("b")
+                    assert Singleton.instance.name == "b"
+                    assert Error("oops").args == ("OOPS",)
+                    """
+                )
+
+            if PYTHON_VERSION_TRIPLE < (3, 11):
+                # Exception tables, which 3.11 uses for try statements,
+                # are not run yet.
+                def test_creating_instances_errors(self):
+                    self.assert_ok(
+                        """\
+                        class Point(object):
+                            def __init__(self, x, y=0):
+                                self.x, self.y = x, y
+
+                        class Bad(object):
+                            def __init__(self):
+                                return 1
+
+                        try:
+                            Point(1, x=2)
+                        except TypeError:
+                            p = None
+                        try:
+                            Bad()
+                        except TypeError:
+                            q = None
+                        assert p is None and q is None
+                        """
+                    )
+
+            if PYTHON_VERSION_TRIPLE < (3, 11):
+                # MAKE_CELL, which 3.11 uses to set up the __class__ cell
+                # for super(), is not run yet.
+                def test_super_and_changing_classes(self):
+                    self.assert_ok(
+                        """\
+                        class A(object):
+                            def __init__(self, x):
+                                self.x = x
+                            def hello(self, n=1):
+                                return "A" * n
+
+                        class B(A):
+                            def __init__(self, x, y):
+                                super().__init__(x)
+                                self.y = y
+                            def hello(self, n=1):
+                                return "B" + super().hello(n)
+
+                        class C(B):
+                            def hello(self, n=1):
+                                return "C" + super(C, self).hello(n=n)
+
+                        c = C(1, 2)
+                        assert (c.x, c.y) == (1, 2)
+                        assert c.hello(2) == "CBAA"
+                        A.hello = lambda self, n=1: "new"
+                        assert c.hello() == "CBnew"
+                        del B.hello
+                        assert c.hello() == "Cnew"
+                        setattr(C, "hello", lambda self: "C only")
+                        assert c.hello() == "C only"
+                        c.hello = lambda: "instance"
+                        assert c.hello() == "instance"
+                        """
+                    )
+
     if PY2:
 
         class TestPrinting(vmtest.VmTestCase):
@@ -386,6 +788,22 @@ class TestBasic(vmtest.VmTestCase):
                     """
                 )
 
+            def test_printing_softspace(self):
+                self.assert_ok(
+                    """\
+                    class Out:
+                        def __init__(self):
+                            self.parts = []
+                        def write(self, s):
+                            self.parts.append(s)
+                    out = Out()
+                    print >>out, 1, "a", 2.5
+                    print >>out, "x\\n", "y",
+                    print >>out, "z"
+                    assert "".join(out.parts) == "1 a 2.5\\nx\\ny z\\n"
+                    """
+                )
+
     class TestLoops(vmtest.VmTestCase):
         def test_break(self):
             self.assert_ok(
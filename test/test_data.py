@@ -27,3 +27,22 @@ class TestData(vmtest.VmTestCase):
         # No fstrings before 3.6
         def test_fstring(self):
             self.self_checking()
+
+        def test_fstring_in_function(self):
+            self.assert_ok(
+                """\
+                class Point(object):
+                    def __init__(self):
+                        self.x = 3
+                def f(a, b, p, width):
+                    return (
+                        f"{a}",
+                        f"a={a} b={b!r} x={p.x:>4} {a + 1}",
+                        f"[{a:{width}}|{b:<{width}}]",
+                        f"{1.5:.2f} {True} {None} {[1]!a}",
+                    )
+                assert f(1, "q", Point(), 3) == (
+                    "1", "a=1 b='q' x=   3 2", "[  1|q  ]", "1.50 True None [1]"
+                )
+                """
+            )
@@ -40,6 +40,26 @@ else:
             def test_function_calls(self):
                 self.self_checking()
 
+            def test_function_attributes(self):
+                self.assert_ok(
+                    """\
+                    def f(a, b=2, *, c=3):
+                        "doc"
+                        return a + b + c
+                    assert f.__name__ == "f" and f.__doc__ == "doc"
+                    assert f.__defaults__ == (2,) and f.__kwdefaults__ == {"c": 3}
+                    f.__defaults__ = (10,)
+                    assert f(1) == 14
+                    assert f(1, c=0) == 11
+                    f.tag = "x"
+                    assert f.tag == "x"
+                    f.__doc__ = "new doc"
+                    assert f.__doc__ == "new doc"
+                    adders = [lambda x, i=i: x + i for i in range(3)]
+                    assert [g(1) for g in adders] == [1, 2, 3]
+                    """
+                )
+
         # test_pos_args has function syntax added in 3.3
         if PYTHON_VERSION_TRIPLE >= (3, 3):
 
@@ -120,6 +140,45 @@ else:
                 def test_call_ex_kw(self):
                     self.self_checking()
 
+        if PYTHON_VERSION_TRIPLE >= (3, 0):
+
+            def test_closure_cells(self):
+                self.assert_ok(
+                    """\
+                    def counter(start):
+                        count = start
+                        def incr(step=1):
+                            nonlocal count
+                            count += step
+                            return count
+                        def peek():
+                            return count
+                        return incr, peek
+
+                    incr, peek = counter(10)
+                    incr()
+                    incr(5)
+                    assert peek() == 16
+                    assert incr.__closure__[0].cell_contents == 16
+
+                    def late():
+                        def get():
+                            return value
+                        try:
+                            get()
+                        except NameError:
+                            first = "unbound"
+                        value = 3
+                        return first, get()
+                    assert late() == ("unbound", 3)
+
+                    class Thing:
+                        def klass(self):
+                            return __class__
+                    assert Thing().klass() is Thing
+                    """
+                )
+
     class TestGenerators(vmtest.VmTestCase):
         def test_first(self):
             self.assert_ok(
@@ -169,6 +228,22 @@ else:
                 """
             )
 
+        def test_exhausted_generator(self):
+            self.assert_ok(
+                """\
+                def gen():
+                    yield 1
+                    raise ValueError("boom")
+                g = gen()
+                try:
+                    for v in g:
+                        pass
+                except ValueError:
+                    pass
+                print(v, list(g), list(g))
+                """
+            )
+
         def test_generator_from_generator(self):
             self.assert_ok(
                 """\
@@ -290,6 +365,110 @@ else:
                 """
                 )
 
+            def test_yield_from_chain_send_and_raise(self):
+                self.assert_ok(
+                    """\
+                    def leaf(n):
+                        x = yield n
+                        if x == "boom":
+                            raise ValueError(x)
+                        return n * 10
+
+                    def middle(n):
+                        try:
+                            r = yield from leaf(n)
+                        except ValueError as e:
+                            r = str(e)
+                        return r
+
+                    def outer():
+                        a = yield from middle(1)
+                        b = yield from middle(2)
+                        return a, b
+
+                    g = outer()
+                    assert next(g) == 1
+                    assert g.send(None) == 2
+                    try:
+                        g.send("boom")
+                    except StopIteration as e:
+                        assert e.value == (10, "boom")
+                """
+                )
+
+            def test_deep_yield_from_chain(self):
+                self.assert_ok(
+                    """\
+                    def tree(depth):
+                        if depth == 0:
+                            x = yield 0
+                            return x
+                        left = yield from tree(depth - 1)
+                        right = yield from tree(depth - 1)
+                        return left + right
+
+                    g = tree(10)
+                    assert next(g) == 0
+                    n = 1
+                    try:
+                        while True:
+                            assert g.send(1) == 0
+                            n += 1
+                    except StopIteration as e:
+                        assert e.value == 1024
+                    assert n == 1024
+
+                    # Resuming a generator inside the chain by itself
+                    # moves the chain on under the outer generator.
+                    g = tree(2)
+                    assert next(g) == 0
+                    inner = g.gi_yieldfrom
+                    assert inner.send(1) == 0
+                    assert g.send(1) == 0
+                    assert g.send(1) == 0
+                    try:
+                        g.send(1)
+                    except StopIteration as e:
+                        assert e.value == 4
+                """
+                )
+
+        if PYTHON_VERSION_TRIPLE >= (3, 8):
+
+            def test_coroutines_on_asyncio(self):
+                self.assert_ok(
+                    """\
+                    import asyncio
+
+                    class Resource:
+                        async def __aenter__(self):
+                            await asyncio.sleep(0)
+                            return "resource"
+                        async def __aexit__(self, *exc_info):
+                            return exc_info[0] is KeyError
+
+                    async def double(n):
+                        await asyncio.sleep(0)
+                        return n * 2
+
+                    async def main():
+                        assert await double(1) == 2
+                        assert await asyncio.gather(double(2), double(3)) == [4, 6]
+                        async with Resource() as r:
+                            assert r == "resource"
+                            raise KeyError(r)
+                        task = asyncio.ensure_future(asyncio.sleep(10))
+                        await asyncio.sleep(0)
+                        task.cancel()
+                        try:
+                            await task
+                        except asyncio.CancelledError:
+                            return "cancelled"
+
+                    assert asyncio.run(main()) == "cancelled"
+                """
+                )
+
     if __name__ == "__main__":
         # import unittest
         # unittest.main()
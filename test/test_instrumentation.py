@@ -0,0 +1,240 @@
+"""Test the PyVM variants that gather statistics about a run."""
+
+import json
+import os
+import pstats
+import sqlite3
+import sys
+import tempfile
+import textwrap
+import unittest
+from io import StringIO
+
+from xpython.vmcoverage import CoverageCollector, PyVMCoverage
+from xpython.vmprofile import FunctionProfiler, PyVMProfiled
+from xpython.vmsample import PyVMSampled, StackSampler
+from xpython.vmstats import OpStats, PyVMOpStats
+
+# The opcode that "a + b" compiles to.
+BINARY_ADD = "BINARY_OP" if sys.version_info >= (3, 11) else "BINARY_ADD"
+
+
+def compile_source(source: str, filename: str = "<instrumented>"):
+    return compile(textwrap.dedent(source), filename, "exec")
+
+
+class TestOpStats(unittest.TestCase):
+    def test_counts(self):
+        code = compile_source(
+            """\
+            def add(a, b):
+                return a + b
+            total = 0
+            for i in range(10):
+                total = add(total, i)
+            assert total == 45
+            """
+        )
+        opstats = OpStats(per_offset=True)
+        PyVMOpStats(opstats).run_code(code)
+
+        ops = opstats.ops
+        self.assertEqual(ops[BINARY_ADD][0], 10)
+        self.assertEqual(ops["FOR_ITER"][0], 11)
+        # Each count is in exactly one histogram bucket.
+        for count, ns, histogram in ops.values():
+            self.assertEqual(sum(histogram), count)
+
+        stats = opstats.as_dict()
+        (add,) = [
+            entry for entry in stats["instructions"] if entry["opname"] == BINARY_ADD
+        ]
+        self.assertEqual((add["function"], add["line"], add["count"]), ("add", 2, 10))
+        times = [entry["time_ns"] for entry in stats["opcodes"].values()]
+        self.assertEqual(times, sorted(times, reverse=True))
+
+        out = StringIO()
+        opstats.write_json(out)
+        stats = json.loads(out.getvalue())
+        self.assertEqual(stats["opcodes"][BINARY_ADD]["count"], 10)
+        out = StringIO()
+        opstats.write_report(out)
+        self.assertIn(BINARY_ADD, out.getvalue())
+
+
+class TestStackSampler(unittest.TestCase):
+    def test_every_instruction(self):
+        code = compile_source(
+            """\
+            def inner(n):
+                return [i * i for i in range(n)]
+            def outer():
+                return len(inner(5))
+            assert outer() == 5
+            """
+        )
+        opstats = OpStats()
+        PyVMOpStats(opstats).run_code(code)
+        sampler = StackSampler(every=1)
+        PyVMSampled(sampler).run_code(code)
+
+        stacks = sampler.stacks
+        instructions = sum(entry[0] for entry in opstats.ops.values())
+        self.assertEqual(sum(stacks.values()), instructions)
+        names = {tuple(frame[1] for frame in stack) for stack in stacks}
+        self.assertIn(("<module>", "outer", "inner", "<listcomp>"), names)
+
+        out = StringIO()
+        sampler.write_collapsed(out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), len(stacks))
+        self.assertTrue(lines[0].startswith("<instrumented>:<module>:"))
+
+        out = StringIO()
+        sampler.write_speedscope(out)
+        (profile,) = json.loads(out.getvalue())["profiles"]
+        self.assertEqual(profile["endValue"], sum(stacks.values()))
+
+    def test_timer(self):
+        code = compile_source(
+            """\
+            import time
+            end = time.perf_counter() + 0.05
+            while time.perf_counter() < end:
+                pass
+            """
+        )
+        sampler = StackSampler(interval=1000)
+        PyVMSampled(sampler).run_code(code)
+        self.assertTrue(sampler.stacks)
+        self.assertEqual(sampler.unit, "microseconds")
+
+
+class TestFunctionProfiler(unittest.TestCase):
+    def test_pstats(self):
+        code = compile_source(
+            """\
+            def fib(n):
+                return n if n < 2 else fib(n - 1) + fib(n - 2)
+            def key(x):
+                return -x
+            assert fib(10) == 55
+            assert sorted([1, 3, 2], key=key) == [3, 2, 1]
+            """
+        )
+        profiler = FunctionProfiler()
+        PyVMProfiled(profiler).run_code(code)
+
+        fd, path = tempfile.mkstemp(suffix=".prof")
+        os.close(fd)
+        try:
+            profiler.dump_stats(path)
+            stats = pstats.Stats(path).stats
+        finally:
+            os.remove(path)
+
+        by_name = {key[2]: value for key, value in stats.items()}
+        cc, nc, tt, ct, callers = by_name["fib"]
+        self.assertEqual((cc, nc), (1, 177))
+        self.assertGreaterEqual(ct, tt)
+        # Caller entries have the calls first, and count a call as
+        # recursive when one from the same caller is in progress, as
+        # cProfile does: fib(10) calls fib(9) and fib(8) primitively.
+        fib_key = next(key for key in stats if key[2] == "fib")
+        self.assertEqual(callers[fib_key][:2], (176, 2))
+        self.assertEqual(
+            [entry[:2] for caller, entry in callers.items() if caller != fib_key],
+            [(1, 1)],
+        )
+        sorted_key = ("~", 0, "<built-in method builtins.sorted>")
+        self.assertIn(sorted_key, stats)
+        self.assertEqual(by_name["key"][1], 3)
+        self.assertEqual(list(by_name["key"][4]), [sorted_key])
+
+
+class TestCoverage(unittest.TestCase):
+    source = """\
+        def sign(n):
+            if n < 0:
+                return -1
+            return 1
+        def odd(n):
+            for i in range(n):
+                if i % 2:
+                    yield i
+        def unused():
+            pass
+        assert [sign(n) for n in (1, 2)] == [1, 1]
+        assert list(odd(4)) == [1, 3]
+        """
+
+    def test_lines(self):
+        coverage = CoverageCollector()
+        PyVMCoverage(coverage).run_code(compile_source(self.source, "covered.py"))
+        stats = coverage.as_dict()
+        entry = stats["files"]["covered.py"]
+        self.assertEqual(entry["missing_lines"], [3, 10])
+        self.assertEqual(entry["executed_lines"], [1, 2, 4, 5, 6, 7, 8, 9, 11, 12])
+        self.assertEqual(stats["totals"]["percent_covered_display"], "83")
+
+        fd, path = tempfile.mkstemp(suffix=".coverage")
+        os.close(fd)
+        try:
+            coverage.write_sqlite(path)
+            db = sqlite3.connect(path)
+            try:
+                ((filename, numbits),) = db.execute(
+                    "select path, numbits from file, line_bits where id = file_id"
+                ).fetchall()
+            finally:
+                db.close()
+        finally:
+            os.remove(path)
+        self.assertEqual(filename, os.path.abspath("covered.py"))
+        lines = [n for n in range(len(numbits) * 8) if numbits[n // 8] & 1 << n % 8]
+        self.assertEqual(lines, entry["executed_lines"])
+
+    def test_arcs(self):
+        code = compile_source(self.source)
+        coverage = CoverageCollector(branch=True)
+        PyVMCoverage(coverage).run_code(code)
+        arcs = coverage.executed_arcs()["<instrumented>"]
+        # These are the arcs that coverage.py records running this.
+        self.assertEqual(
+            arcs,
+            {
+                (-1, 1), (1, 5), (5, 9), (9, 11), (11, 12), (12, -1),
+                (-11, 11), (11, -11), (11, 11),
+                (-1, 2), (2, 4), (4, -1),
+                (-5, 6), (6, 7), (7, 6), (7, 8), (8, 6), (6, -5),
+            },
+        )  # fmt: skip
+
+        fd, path = tempfile.mkstemp(suffix=".coverage")
+        os.close(fd)
+        try:
+            coverage.write_sqlite(path)
+            db = sqlite3.connect(path)
+            try:
+                has_arcs = db.execute("select value from meta where key = 'has_arcs'")
+                self.assertEqual(has_arcs.fetchall(), [("1",)])
+                # Code not read from a file is left out.
+                self.assertEqual(db.execute("select * from arc").fetchall(), [])
+            finally:
+                db.close()
+        finally:
+            os.remove(path)
+
+    def test_equal_code(self):
+        # Equal code objects of different files are covered separately.
+        coverage = CoverageCollector()
+        vm = PyVMCoverage(coverage)
+        vm.run_code(compile_source("def f(): return 1\nf()\n", "a.py"))
+        vm.run_code(compile_source("def f():\n\n    return 1\nf()\n", "b.py"))
+        lines = {"a.py": {1, 2}, "b.py": {1, 3, 4}}
+        self.assertEqual(coverage.executed_lines(), lines)
+        self.assertEqual(coverage.statements(), lines)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -20,6 +20,29 @@ else:
         def test_for_loop(self):
             self.self_checking()
 
+        def test_for_loop_sequences(self):
+            self.assert_ok(
+                """\
+                def f():
+                    l = [1, 2]
+                    for x in l:
+                        if len(l) < 5:
+                            l.append(x)
+                    s = ""
+                    for c in "abc":
+                        s += c
+                    for i in range(10, 0, -3):
+                        s += str(i)
+                    for k in {"a": 1, "b": 2}:
+                        s += k
+                    return l, s, i
+                assert f() == ([1, 2, 1, 2, 1], "abc10741ab", 1)
+                for j in (1, 2):
+                    pass
+                assert j == 2
+                """
+            )
+
         def test_while(self):
             self.self_checking()
 
@@ -30,9 +53,32 @@ else:
             self.self_checking()
 
 
+class TestPython2Bytecode(vmtest.VmTestCase):
+    """Python 2.7 bytecode, run whatever Python runs the tests, for the
+    opcodes that went away in 3.0."""
+
+    def test_slice(self):
+        self.self_checking_in_process((2, 7))
+
+    def test_slice_stmts(self):
+        self.self_checking_in_process((2, 7))
+
+    def test_break_loop(self):
+        self.self_checking_in_process((2, 7))
+
+    def test_break_in_with(self):
+        output = self.self_checking_in_process((2, 7))
+        self.assertEqual(output, "Look: 'iwzoeiwor'\n")
+
+    def test_print_softspace(self):
+        output = self.self_checking_in_process((2, 7))
+        self.assertEqual(output, "c d 3\n")
+
+
 if __name__ == "__main__":
     # import unittest
     # unittest.main()
 
     t = TestStmts("test_for_loop")
     t.test_for_loop()
+
@@ -0,0 +1,250 @@
+"""Test the callbacks of PyVMTraced."""
+
+import builtins
+import gc
+import unittest
+from dis import findlinestarts
+from types import CodeType
+
+from xpython.coderegistry import CodeRegistry
+from xpython.vm import PyVM
+from xpython.vmtrace import PyVMEVENT_ALL, PyVMEVENT_NONE, PyVMTraced
+
+SOURCE = """\
+def add(a, b):
+    return a + b
+total = 0
+for i in range(5):
+    total = add(total, i)
+"""
+
+
+def run_traced(callback, event_flags=PyVMEVENT_ALL):
+    code = compile(SOURCE, "<traced>", "exec")
+    env = {"__builtins__": builtins}
+    PyVMTraced(callback, event_flags=event_flags).run_code(code, f_globals=env)
+    return env
+
+
+class TestTraced(unittest.TestCase):
+    def test_all_events(self):
+        events = []
+
+        def callback(event, offset, byte_name, byte_code, line_number, *args):
+            events.append((event, line_number))
+            return callback
+
+        env = run_traced(callback)
+        self.assertEqual(env["total"], 10)
+        self.assertEqual(events.count(("line", 2)), 5)
+        self.assertEqual(len([e for e in events if e[0] == "call"]), 6)
+
+    def test_finish(self):
+        # After "finish", the module frame is run without line events, and
+        # only returns are reported.
+        events = []
+
+        def callback(event, offset, byte_name, byte_code, line_number, *args):
+            events.append(event)
+            return "finish" if event == "line" else callback
+
+        env = run_traced(callback)
+        self.assertEqual(env["total"], 10)
+        self.assertEqual(events[:2], ["call", "line"])
+        self.assertEqual(set(events[2:]), {"return"})
+
+    def test_trace_from_return(self):
+        # A callback for the return of a call can turn line events back on
+        # for the caller, which was running without them after "finish".
+        events = []
+
+        def callback(event, offset, byte_name, byte_code, line_number, *args):
+            events.append((event, line_number))
+            if event == "line" and len(events) == 2:
+                return "finish"
+            if event == "return" and len(events) == 3:
+                vm = args[-1]
+                vm.frame.f_trace = callback
+                vm.frame.event_flags = PyVMEVENT_ALL
+            return callback
+
+        env = run_traced(callback)
+        self.assertEqual(env["total"], 10)
+        self.assertEqual([event for event, _ in events[:3]], ["call", "line", "return"])
+        self.assertIn(("line", 5), events[3:])
+
+    def test_no_events(self):
+        events = []
+
+        def callback(event, *args):
+            events.append(event)
+
+        env = run_traced(callback, PyVMEVENT_NONE)
+        self.assertEqual(env["total"], 10)
+        self.assertEqual(events, [])
+
+    def test_breakpoint(self):
+        # With tracing turned off by returning None, a breakpoint still
+        # calls back, and can turn line events back on.
+        events = []
+
+        def callback(event, offset, byte_name, byte_code, line_number, *args):
+            events.append((event, line_number))
+            if event == "breakpoint":
+                args[-1].frame.event_flags = PyVMEVENT_ALL
+            elif len(events) == 2:
+                # The first line event.
+                return None
+            return callback
+
+        code = compile(SOURCE, "<traced>", "exec")
+        env = {"__builtins__": builtins}
+        vm = PyVMTraced(callback)
+        frame = vm.make_frame(code, f_globals=env)
+        (offset,) = [offset for offset, line in findlinestarts(code) if line == 5]
+        vm.add_breakpoint(frame, offset)
+        vm.eval_frame(frame)
+
+        self.assertEqual(env["total"], 10)
+        self.assertEqual(events[2][0], "breakpoint")
+        self.assertIn("line", [event for event, line_number in events[3:]])
+
+    def test_code_breakpoint(self):
+        # A breakpoint on the code of a function stops in every call of it,
+        # without changing the code.
+        hits = []
+
+        def callback(event, offset, byte_name, byte_code, line_number, *args):
+            vm = args[-1]
+            if event == "breakpoint":
+                hits.append(vm.frame.f_code)
+                if len(hits) == 3:
+                    vm.remove_breakpoint(vm.frame.f_code, offset)
+            return callback
+
+        code = compile(SOURCE, "<traced>", "exec")
+        (add_code,) = [const for const in code.co_consts if isinstance(const, CodeType)]
+        env = {"__builtins__": builtins}
+        vm = PyVMTraced(callback, event_flags=PyVMEVENT_NONE)
+        vm.add_breakpoint(add_code, 0)
+        vm.run_code(code, f_globals=env)
+
+        self.assertEqual(env["total"], 10)
+        self.assertEqual(hits, [add_code] * 3)
+        self.assertEqual(vm.code_breakpoints[add_code], {})
+
+    def test_equal_code_breakpoint(self):
+        # A breakpoint in one file's code doesn't stop in equal code of
+        # another file.
+        hits = []
+
+        def callback(event, offset, byte_name, byte_code, line_number, *args):
+            if event == "breakpoint":
+                hits.append(args[-1].frame.f_code.co_filename)
+            return callback
+
+        a_code = compile("def f(): return 1\nf()\n", "a.py", "exec")
+        b_code = compile("def f():\n\n    return 1\nf()\n", "b.py", "exec")
+        (a_f_code,) = [
+            const for const in a_code.co_consts if isinstance(const, CodeType)
+        ]
+        vm = PyVMTraced(callback, event_flags=PyVMEVENT_NONE)
+        vm.add_breakpoint(a_f_code, 0)
+        self.assertIsNone(vm.code_breakpoints.get(b_code.co_consts[0]))
+        for code in (a_code, b_code):
+            vm.run_code(code, f_globals={"__builtins__": builtins})
+        self.assertEqual(hits, ["a.py"])
+
+    def test_line_breakpoint(self):
+        hits = []
+
+        def callback(event, offset, byte_name, byte_code, line_number, *args):
+            if event == "breakpoint":
+                hits.append(line_number)
+            return callback
+
+        code = compile(SOURCE, "<traced>", "exec")
+        env = {"__builtins__": builtins}
+        vm = PyVMTraced(callback, event_flags=PyVMEVENT_NONE)
+        vm.code_registry.add(code)
+        # Line 2 is in a function that has not been run yet.
+        self.assertEqual(vm.add_line_breakpoint("<traced>", 2), 2)
+        self.assertIsNone(vm.add_line_breakpoint("<traced>", 6))
+        self.assertIsNone(vm.add_line_breakpoint("other.py", 1))
+        vm.run_code(code, f_globals=env)
+
+        self.assertEqual(env["total"], 10)
+        self.assertEqual(hits, [2] * 5)
+
+
+class TestCodeRegistry(unittest.TestCase):
+    def test_lookup(self):
+        registry = CodeRegistry()
+        code = compile("x = [\n  lambda: 1]\n\nx = 2\n", "<registry>", "exec")
+        registry.add(code)
+        registry.add(code)
+
+        line_4 = [(code, offset) for offset, line in findlinestarts(code) if line == 4]
+        self.assertEqual(registry.lookup("<registry>", 4), line_4)
+        (lambda_code,) = [
+            const for const in code.co_consts if isinstance(const, CodeType)
+        ]
+        self.assertIn((lambda_code, 0), registry.lookup("<registry>", 2))
+        self.assertEqual(registry.find("<registry>", 3), (4, line_4))
+        self.assertEqual(registry.find("<registry>", 5), (None, []))
+
+        # The registry doesn't keep code objects alive.
+        del code, lambda_code, line_4
+        gc.collect()
+        self.assertEqual(registry.find("<registry>", 1), (None, []))
+        self.assertEqual(registry.file_lines["<registry>"], [])
+
+    def test_equal_code(self):
+        # Code objects in different files can compare equal; each is
+        # registered all the same.
+        registry = CodeRegistry()
+        a_code = compile("def f(): return 1\n", "a.py", "exec")
+        b_code = compile("def f():\n\n    return 1\n", "b.py", "exec")
+        registry.add(a_code)
+        registry.add(b_code)
+        (b_f_code,) = [
+            const for const in b_code.co_consts if isinstance(const, CodeType)
+        ]
+        self.assertIs(registry.lookup("b.py", 3)[0][0], b_f_code)
+        self.assertEqual(registry.find("a.py", 2), (None, []))
+
+    def test_equal_code_line_tables(self):
+        # Equal code objects with different line numbers get their own
+        # line tables.
+        vm = PyVM()
+        a_code, b_code = [
+            compile(source, filename, "exec").co_consts[0]
+            for source, filename in (
+                ("def f(): return 1\n", "a.py"),
+                ("def f():\n\n    return 1\n", "b.py"),
+            )
+        ]
+        self.assertEqual(vm.line_tables(a_code)[1], list(findlinestarts(a_code)))
+        self.assertEqual(vm.line_tables(b_code)[1], list(findlinestarts(b_code)))
+
+    def test_release_after_run(self):
+        # Neither the VM's per-code tables nor its breakpoints keep the code
+        # objects that it has run alive.
+        vm = PyVMTraced(lambda *args: None, event_flags=PyVMEVENT_NONE)
+        code = compile(SOURCE, "<traced>", "exec")
+        (add_code,) = [const for const in code.co_consts if isinstance(const, CodeType)]
+        vm.add_breakpoint(add_code, 0)
+        env = {"__builtins__": builtins}
+        vm.run_code(code, f_globals=env)
+        self.assertEqual(vm.code_registry.find("<traced>", 2)[0], 2)
+        self.assertTrue(vm.code_line_tables)
+
+        del code, add_code, env
+        gc.collect()
+        self.assertEqual(vm.code_registry.find("<traced>", 1), (None, []))
+        self.assertEqual(len(vm.code_line_tables), 0)
+        self.assertEqual(len(vm.code_breakpoints), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,7 @@
 
 import inspect
 import os.path as osp
+import subprocess
 import sys
 import textwrap
 import unittest
@@ -84,6 +85,31 @@ class VmTestCase(unittest.TestCase):
         )
         self.assert_runs_ok(path, arg_type="bytecode-file")
 
+    def self_checking_in_process(self, version_pair):
+        """Like self_checking(), but for the bytecode of `version_pair`, which
+        is run by "python -m xpython" in a process of its own. Importing the
+        byteop of a later version deletes the opcodes that went away from
+        the byteop classes of earlier ones, so bytecode from before 3.0
+        can't be run in the process that runs the other tests.
+        Returns what the program wrote."""
+        self.version_pair = version_pair
+        assert self.version_pair in supported_versions
+
+        path = osp.join(
+            srcdir,
+            "bytecode-%s" % version_tuple_to_str(self.version_pair),
+            parent_function_name() + ".pyc",
+        )
+        result = subprocess.run(
+            [sys.executable, "-m", "xpython", path],
+            cwd=osp.dirname(srcdir),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        return result.stdout
+
     def assert_ok(self, path_or_code, raises=None, arg_type="string"):
         """Run `code` in our VM and in real Python: they behave the same."""
 
@@ -9,14 +9,15 @@ See the documentation for the full license.
 
 __docformat__ = "restructuredtext"
 
-from xpython.pyobj import (Cell, Function, Generator, Method, Traceback,
-                           traceback_from_frame)
+from xpython.pyobj import (Cell, Coroutine, Function, Generator, Method,
+                           Traceback, traceback_from_frame)
 from xpython.version import __version__  # noqa
 from xpython.vm import PyVM, PyVMError, PyVMRuntimeError
 from xpython.vmtrace import PyVMTraced, pretty_event_flags
 
 __all__ = [
     "Cell",
+    "Coroutine",
     "Function",
     "Generator",
     "Method",
@@ -9,6 +9,10 @@ from xdis.version_info import IS_PYPY, version_tuple_to_str
 from xpython import execfile
 from xpython.version import __version__
 from xpython.vm import PyVMRuntimeError
+from xpython.vmcoverage import CoverageCollector
+from xpython.vmprofile import FunctionProfiler
+from xpython.vmsample import StackSampler
+from xpython.vmstats import OpStats
 
 
 def version_message():
@@ -35,9 +39,89 @@ def version_message():
 @click.option(
     "-c", "--command-to-run", help="program passed in as a string", required=False
 )
+@click.option(
+    "--asyncio",
+    "use_asyncio",
+    is_flag=True,
+    default=False,
+    help="allow top-level await, running the program on an asyncio event loop",
+)
+@click.option(
+    "--opstats",
+    "opstats_path",
+    type=click.Path(dir_okay=False, writable=True, allow_dash=True),
+    help="count and time the instructions run, by opcode, and write a report "
+    'to this file when the program ends: JSON if the name ends in ".json", '
+    'otherwise a table. "-" writes a table to standard error',
+)
+@click.option(
+    "--opstats-offsets",
+    is_flag=True,
+    default=False,
+    help="with --opstats, also report each instruction by code object and offset",
+)
+@click.option(
+    "--profile",
+    "pstats_path",
+    type=click.Path(dir_okay=False, writable=True),
+    help="time each call of an interpreted function, or of a native one from "
+    "interpreted code, and write the profile to this file when the program "
+    "ends, in the format of cProfile for pstats or snakeviz",
+)
+@click.option(
+    "--profile-sample",
+    "profile_path",
+    type=click.Path(dir_okay=False, writable=True),
+    help="sample the stack of interpreted calls and write the samples to this "
+    'file when the program ends: a speedscope profile if the name ends in ".json", '
+    "otherwise collapsed stacks for flamegraph tools",
+)
+@click.option(
+    "--profile-interval",
+    type=click.FloatRange(min=1),
+    default=1000.0,
+    show_default=True,
+    help="with --profile-sample, the time between samples in microseconds",
+)
+@click.option(
+    "--profile-every",
+    type=click.IntRange(min=1),
+    help="with --profile-sample, take a sample every this many instructions "
+    "rather than on a timer",
+)
+@click.option(
+    "--coverage",
+    "coverage_path",
+    type=click.Path(dir_okay=False, writable=True),
+    help="record the lines run and write them to this file when the program "
+    'ends: a coverage.py JSON report if the name ends in ".json", otherwise a '
+    'coverage.py data file for "coverage report" and the like',
+)
+@click.option(
+    "--coverage-branch",
+    is_flag=True,
+    default=False,
+    help="with --coverage, also record the branches taken between lines; "
+    "these are only written to a coverage.py data file",
+)
 @click.argument("path", nargs=1, type=click.Path(readable=True), required=False)
 @click.argument("args", nargs=-1)
-def main(module, verbose, command_to_run, path, args):
+def main(
+    module,
+    verbose,
+    command_to_run,
+    use_asyncio,
+    opstats_path,
+    opstats_offsets,
+    pstats_path,
+    profile_path,
+    profile_interval,
+    profile_every,
+    coverage_path,
+    coverage_branch,
+    path,
+    args,
+):
     """
     Runs Python programs or bytecode using a bytecode interpreter written in Python.
     """
@@ -64,8 +148,34 @@ def main(module, verbose, command_to_run, path, args):
         print("You must pass either a file name or a command string, neither found.")
         sys.exit(4)
 
+    output_paths = (opstats_path, pstats_path, profile_path, coverage_path)
+    if len([path for path in output_paths if path]) > 1:
+        print(
+            "Only one of the options --opstats, --profile, --profile-sample and "
+            "--coverage can be given."
+        )
+        sys.exit(4)
+    opstats = OpStats(per_offset=opstats_offsets) if opstats_path else None
+    if profile_path:
+        sampler = StackSampler(interval=profile_interval, every=profile_every)
+    else:
+        sampler = None
+    profiler = FunctionProfiler() if pstats_path else None
+    if coverage_path:
+        coverage = CoverageCollector(branch=coverage_branch)
+    else:
+        coverage = None
+
     try:
-        run_fn(path, args)
+        run_fn(
+            path,
+            args,
+            use_asyncio=use_asyncio,
+            opstats=opstats,
+            sampler=sampler,
+            profiler=profiler,
+            coverage=coverage,
+        )
     except PyVMRuntimeError:
         # Tracebacks and error messages should been previously printed
         sys.exit(10)
@@ -87,6 +197,42 @@ def main(module, verbose, command_to_run, path, args):
         # Program ran sys.exit();
         # Respect that.
         raise
+    finally:
+        if opstats is not None:
+            write_opstats(opstats, opstats_path)
+        if sampler is not None:
+            write_samples(sampler, profile_path)
+        if profiler is not None:
+            profiler.dump_stats(pstats_path)
+        if coverage is not None:
+            write_coverage(coverage, coverage_path)
+
+
+def write_opstats(opstats, path: str):
+    if path == "-":
+        opstats.write_report(sys.stderr)
+    else:
+        with open(path, "w") as out:
+            if path.endswith(".json"):
+                opstats.write_json(out)
+            else:
+                opstats.write_report(out)
+
+
+def write_samples(sampler, path: str):
+    with open(path, "w") as out:
+        if path.endswith(".json"):
+            sampler.write_speedscope(out)
+        else:
+            sampler.write_collapsed(out)
+
+
+def write_coverage(coverage, path: str):
+    if path.endswith(".json"):
+        with open(path, "w") as out:
+            coverage.write_json(out)
+    else:
+        coverage.write_sqlite(path)
 
 
 if __name__ == "__main__":
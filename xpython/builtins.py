@@ -4,11 +4,22 @@ A place to implement built-in functions.
 We use the bytecode for these when doing cross-version interpreting
 """
 
-from typing import Any
+from weakref import WeakKeyDictionary
 
 from xdis import IS_PYPY, PYTHON_VERSION_TRIPLE, codeType2Portable
 
-from xpython.pyobj import Cell, Function, make_cell
+from xpython.coderegistry import CodeMap
+from xpython.pyobj import Cell, Function
+
+PYTHON_IMPLEMENTATION = "PyPy" if IS_PYPY else "CPython"
+
+# Class-body code converted by codeType2Portable(), keyed by the
+# native code object. A class statement inside a function or a loop
+# runs the same code object each time, so convert it only once. This
+# also keeps per-code caches in the interpreter keyed on one object.
+# Equal class bodies of different files are kept apart, so that each
+# keeps its own file name and line numbers.
+portable_class_code = CodeMap()
 
 
 def func_code(func):
@@ -56,14 +67,17 @@ def build_class(opc, func, name, *bases, **kwds):
     else:
         namespace = {}
 
-    python_implementation = "PyPy" if IS_PYPY else "CPython"
-
     if not (
         opc.version_tuple == PYTHON_VERSION_TRIPLE[:2]
-        and python_implementation == opc.python_implementation
+        and PYTHON_IMPLEMENTATION == opc.python_implementation
     ):
         # convert code to xdis's portable code type.
-        class_body_code = codeType2Portable(func_code(func))
+        code = func_code(func)
+        class_body_code = portable_class_code.get(code)
+        if class_body_code is None:
+            class_body_code = codeType2Portable(code)
+            if class_body_code is not code:
+                portable_class_code[code] = class_body_code
     else:
         class_body_code = func.func_code
 
@@ -87,12 +101,10 @@ def build_class(opc, func, name, *bases, **kwds):
 
     # Add any class variables that may have been added in running class_body_code.
     # See test_attribute_access.py for a simple example that needs the update below.
-    namespace.update(frame.f_locals)
-
-    # If metaclass is builtin "type", it can't deal with a xpython.pyobj.Cell object
-    # but needs a builtin cell object. make_cell() can do this.
-    if "__classcell__" in namespace and metaclass == type:
-        namespace["__classcell__"] = make_cell(namespace["__classcell__"].get())
+    # Usually the class body stored straight into namespace, so there
+    # is nothing to add.
+    if frame.f_locals is not namespace:
+        namespace.update(frame.f_locals)
 
     try:
         cls = metaclass(name, bases, namespace)
@@ -108,59 +120,52 @@ def build_class(opc, func, name, *bases, **kwds):
         pass
 
     if isinstance(cell, Cell):
-        cell.set(cls)
+        cell.cell_contents = cls
     return cls
 
 
-# FIXME: change to return a true Proxy object.
-def builtin_super(self: Any, typ=None, obj=None):
-    """
-    super() but first argument is filled in via interpreter
-    """
-    cells = self.cells
-    if hasattr(cells, "__class__"):
-        cell = cells["__class__"]
-    elif hasattr(cells, "__classcell__"):
-        cell = cells["__classcell__"]
-
-    start_class = cell.get()
-    return WrappedSuperClass(start_class, typ, obj)
-
-    return None
+# For each code object that uses the zero-argument form of super(),
+# where to find its arguments: the index of the __class__ cell in the
+# frame's cells, the name of the first parameter, and the index of
+# that parameter's cell when it is a cell variable, else None. Held
+# weakly so that code objects which are no longer run can be freed.
+super_arg_sources = WeakKeyDictionary()
 
 
-class WrappedSuperClass(object):
+def builtin_super(frame, typ=None, obj=None):
     """
-    builtin "super" object return type. This is a
-    proxy object that delegates method calls to a parent or sibling class of ``type``.
-    See https://docs.python.org/3.7/library/functions.html#super
+    super() but, in the zero-argument form, with the class and the
+    instance filled in from the interpreter's `frame`, as the compiler
+    arranges for CPython. The result is a native super object, so
+    attribute lookup on it walks the MRO just as it does in CPython.
     """
-
-    def __init__(self, start_class, typ, obj: Any):
-        if obj is not None:
-            assert isinstance(obj, typ)
-
-        self.type_given = typ is not None
-        if self.type_given:
-            start_class = typ
-        self.start_class = start_class
-        self.superclass = start_class.__mro__[1]
-        self.__orig_init__ = self.superclass.__init__
-        self.__init__ = self.init
-        self.object = obj
-        self.type = typ
-
-    def __repr__(self):
-        if self.type_given is not None and self.object is None:
-            obj_str = "NULL"
-        elif self.object is not None:
-            obj_str = f"<{self.object.__class__.__name__} object>"
+    if typ is None:
+        code = frame.f_code
+        sources = super_arg_sources.get(code)
+        if sources is None:
+            cell_names = code.co_cellvars + code.co_freevars
+            if "__class__" not in cell_names:
+                raise RuntimeError("super(): __class__ cell not found")
+            if not code.co_argcount:
+                raise RuntimeError("super(): no arguments")
+            first = code.co_varnames[0]
+            first_cell = (
+                code.co_cellvars.index(first) if first in code.co_cellvars else None
+            )
+            sources = super_arg_sources[code] = (
+                cell_names.index("__class__"),
+                first,
+                first_cell,
+            )
+        class_cell, first, first_cell = sources
+        typ = frame.cells[class_cell].cell_contents
+        if first_cell is None:
+            obj = frame.f_locals[first]
         else:
-            obj_str = repr(self.type)
-        return f"<super: <class '{self.start_class.__name__}'>, {obj_str}>"
-
-    def init(self, *args, **kwargs):
-        return self.__orig_init__(self, *args, **kwargs)
+            obj = frame.cells[first_cell].cell_contents
+    if obj is None:
+        return super(typ)
+    return super(typ, obj)
 
 
 # From Pypy 3.6
@@ -6,43 +6,77 @@ Note: this is subclassed. Later versions use operations from here.
 
 import inspect
 import logging
-import operator
 import sys
+import types
+from itertools import islice
 from typing import Any, Callable
-
+from weakref import WeakKeyDictionary
+
+from xdis import (
+    CO_ASYNC_GENERATOR,
+    CO_COROUTINE,
+    CO_GENERATOR,
+    CO_ITERABLE_COROUTINE,
+    code2num,
+    iscode,
+    next_offset,
+)
 from xdis.version_info import PYTHON_VERSION_TRIPLE, version_tuple_to_str
 
 from xpython.builtins import build_class, builtin_super
-from xpython.pyobj import Function
+from xpython.pyobj import (
+    INLINE_COMPREHENSION_NAMES,
+    Comprehension,
+    Function,
+    Method,
+)
 from xpython.vm import PyVM
 
 
 log = logging.getLogger(__name__)
 
-UNARY_OPERATORS = {
-    "POSITIVE": operator.pos,
-    "NEGATIVE": operator.neg,
-    "NOT": operator.not_,
-    "CONVERT": repr,
-    "INVERT": operator.invert,
-}
-
-BINARY_OPERATORS = {
-    "POWER": pow,
-    "MULTIPLY": operator.mul,
-    "DIVIDE": getattr(operator, "div", lambda x, y: x / y),
-    "FLOOR_DIVIDE": operator.floordiv,
-    "TRUE_DIVIDE": operator.truediv,
-    "MODULO": operator.mod,
-    "ADD": operator.add,
-    "SUBTRACT": operator.sub,
-    "SUBSCR": operator.getitem,
-    "LSHIFT": operator.lshift,
-    "RSHIFT": operator.rshift,
-    "AND": operator.and_,
-    "XOR": operator.xor,
-    "OR": operator.or_,
-}
+# Operator names, used to pick out the stack formatter of the
+# UNARY_*, BINARY_* and INPLACE_* instructions. The instructions
+# themselves are methods of the ByteOp classes.
+UNARY_OPERATORS = frozenset(["POSITIVE", "NEGATIVE", "NOT", "CONVERT", "INVERT"])
+
+# The instructions that fstring_run() will run together, in the
+# order that FSTRING_* below gives their index.
+FSTRING_RUN_OPS = (
+    "LOAD_CONST",
+    "LOAD_FAST",
+    "LOAD_ATTR",
+    "FORMAT_VALUE",
+    "BUILD_STRING",
+)
+(
+    FSTRING_LOAD_CONST,
+    FSTRING_LOAD_FAST,
+    FSTRING_LOAD_ATTR,
+    FSTRING_FORMAT_VALUE,
+    FSTRING_BUILD_STRING,
+) = range(len(FSTRING_RUN_OPS))
+
+BINARY_OPERATORS = frozenset(
+    [
+        "ADD",
+        "AND",
+        "DIVIDE",
+        "FLOOR_DIVIDE",
+        "LSHIFT",
+        "MODULO",
+        "MULTIPLY",
+        "OR",
+        "POWER",
+        "RSHIFT",
+        "SUBSCR",
+        "SUBTRACT",
+        "TRUE_DIVIDE",
+        "XOR",
+        # 3.5 on
+        "MATRIX_MULTIPLY",
+    ]
+)
 
 INPLACE_OPERATORS = frozenset(
     [
@@ -54,18 +88,169 @@ INPLACE_OPERATORS = frozenset(
         "MODULO",
         "MULTIPLY",
         "OR",
-        "POWER" "RSHIFT",
+        "POWER",
+        "RSHIFT",
         "SUBTRACT",
         "TRUE_DIVIDE",
         "XOR",
         # 3.5 on
-        "POWER",
         "MATRIX_MULTIPLY",
     ]
 )
 
-if PYTHON_VERSION_TRIPLE >= (3, 5):
-    BINARY_OPERATORS["MATRIX_MULTIPLY"] = operator.matmul
+# Kinds of class attributes that LOAD_METHOD can hand back unbound,
+# together with "self", instead of creating a bound method.
+METHOD_TYPES = frozenset([types.FunctionType, Function])
+if hasattr(types, "MethodDescriptorType"):
+    METHOD_TYPES |= frozenset([types.MethodDescriptorType])
+
+# Caches keyed by class are emptied when they have entries for this
+# many classes, so that classes made in a loop aren't kept alive.
+METHOD_CACHE_TYPES = 1000
+
+
+class _Null(object):
+    """The value of C's NULL on the evaluation stack.
+
+    None can't be used for this since None is a perfectly good stack
+    value.  There is only one instance of this class: NULL.
+    """
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return "NULL"
+
+
+NULL = _Null()
+
+# Comprehension code with these flags can suspend, so it can't be run
+# inline in the caller's frame.
+NOT_INLINE_FLAGS = (
+    CO_GENERATOR | CO_COROUTINE | CO_ITERABLE_COROUTINE | CO_ASYNC_GENERATOR
+)
+
+# Exact types whose iterators GET_ITER replaces with a SequenceIterator.
+# Subclasses are left alone since they may override __iter__().
+SEQUENCE_ITER_TYPES = frozenset([list, tuple, str, range])
+
+
+class SequenceIterator(object):
+    """An iterator over a list, tuple, str or range which FOR_ITER
+    advances by index, without calling next() or catching StopIteration.
+
+    Like a list iterator, the length is checked on each step, so
+    appending to a list inside the loop extends the iteration.
+    """
+
+    __slots__ = ("seq", "index")
+
+    def __init__(self, seq):
+        self.seq = seq
+        self.index = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        i = self.index
+        seq = self.seq
+        if i < len(seq):
+            self.index = i + 1
+            return seq[i]
+        self.seq = ()
+        raise StopIteration
+
+    def __length_hint__(self):
+        return max(len(self.seq) - self.index, 0)
+
+
+def classic_divide(x, y):
+    """Return x / y with Python 2 semantics, where dividing two integers
+    floors the result."""
+    if isinstance(x, int) and isinstance(y, int):
+        return x // y
+    return x / y
+
+
+def dict_from_pairs(elts):
+    """Return a dict built from the flat list [key1, value1, key2, value2, ...]."""
+    it = iter(elts)
+    return dict(zip(it, it))
+
+
+def merge_dicts(elts):
+    """Return a new dict holding the items of each mapping in `elts`,
+    later mappings taking precedence."""
+    result = {}
+    for d in elts:
+        result.update(d)
+    return result
+
+
+def merge_kwargs(elts, func, version: tuple) -> dict:
+    """Return a new dict holding the keyword arguments passed as mappings
+    `elts` to `func`, as in f(**x, **y); see update_kwargs()."""
+    kwargs = {}
+    for mapping in elts:
+        update_kwargs(kwargs, mapping, func, version)
+    return kwargs
+
+
+def update_kwargs(kwargs: dict, mapping, func, version: tuple):
+    """Add the keyword arguments in `mapping` to those for `func` in dict
+    `kwargs`. As in CPython `version`, a TypeError is raised if `mapping`
+    is not a mapping or repeats a keyword.
+    """
+    if not hasattr(mapping, "keys"):
+        raise TypeError(
+            f"{func_str(func, version)} argument after ** must be a mapping, "
+            f"not {type(mapping).__name__}"
+        )
+    keys = mapping.keys()
+    if not kwargs.keys().isdisjoint(keys):
+        key = next(key for key in keys if key in kwargs)
+        raise TypeError(
+            f"{func_str(func, version)} got multiple values "
+            f"for keyword argument '{key}'"
+        )
+    kwargs.update(mapping)
+
+
+def func_str(func, version: tuple) -> str:
+    """Return how CPython `version` names the callable `func` in the
+    TypeErrors about the arguments of a call to it, like "f()"."""
+    if isinstance(func, Method):
+        func = func.im_func
+    elif isinstance(func, types.MethodType):
+        func = func.__func__
+    if version >= (3, 9):
+        # As _PyObject_FunctionStr() does.
+        qualname = getattr(func, "__qualname__", None)
+        if qualname is None:
+            return str(func)
+        if isinstance(func, Function):
+            module = func.func_globals.get("__name__")
+        else:
+            module = getattr(func, "__module__", None)
+        if module is not None and module != "builtins":
+            return f"{module}.{qualname}()"
+        return f"{qualname}()"
+    # As PyEval_GetFuncName() and PyEval_GetFuncDesc() do.
+    if isinstance(func, (Function, types.FunctionType, types.BuiltinFunctionType)):
+        return f"{func.__name__}()"
+    return f"{type(func).__name__} object"
+
+
+def stream_position(stream):
+    """Return stream.tell(), or None if `stream` has no position."""
+    tell = getattr(stream, "tell", None)
+    if tell is None:
+        return None
+    try:
+        return tell()
+    except (OSError, ValueError):
+        return None
 
 
 def fmt_binary_op(vm: PyVM, arg=None, repr=repr):
@@ -109,27 +294,118 @@ class ByteOpBase(object):
         # This is used in `vm.format_instruction()` to pick out stack elements
         # to better show operand(s) of opcode.
         self.stack_fmt = {}
-        for op in BINARY_OPERATORS.keys():
+        for op in BINARY_OPERATORS:
             self.stack_fmt["BINARY_" + op] = fmt_binary_op
-        for op in UNARY_OPERATORS.keys():
+        self.stack_fmt["BINARY_OP"] = fmt_binary_op
+        for op in UNARY_OPERATORS:
             self.stack_fmt["UNARY_" + op] = fmt_unary_op
         for op in INPLACE_OPERATORS:
             self.stack_fmt["INPLACE_" + op] = fmt_binary_op
 
+        # FOR_ITER can store directly into the variable of a STORE_FAST
+        # or STORE_NAME that follows it. for_iter_targets maps a code
+        # object to a dictionary from a FOR_ITER offset to the name to
+        # store to and the offset of the store instruction, or None.
+        opmap = vm.opc.opmap
+        self.store_fast_op = opmap.get("STORE_FAST")
+        self.store_name_op = opmap.get("STORE_NAME")
+        self.for_iter_targets = WeakKeyDictionary()
+
+        # Likewise, the rest of an f-string starting at a FORMAT_VALUE
+        # can be run in one go; see fstring_run(). This is done for
+        # 3.6 .. 3.10 wordcode.
+        self.fstring_ops = {}
+        if (3, 6) <= vm.version < (3, 11):
+            self.fstring_ops = {
+                opmap[name]: kind for kind, name in enumerate(FSTRING_RUN_OPS)
+            }
+        self.fstring_runs = WeakKeyDictionary()
+
+        # The streams with a space pending from a print statement that
+        # ended in a comma, and have no softspace attribute to keep it,
+        # as id(stream) -> (stream, stream_position(stream)). See
+        # print_item().
+        self.softspace = {}
+
         # Set this lazily in "convert_method_native_func
         self.method_func_access = None
         self.cross_bytecode_eval_warning_shown = False
         self.cross_bytecode_exec_warning_shown = False
 
-    def binaryOperator(self, op):
-        x, y = self.vm.popn(2)
-        self.vm.push(BINARY_OPERATORS[op](x, y))
-
     def build_container(self, count, container_fn):
-        elts = self.vm.popn(count)
-        self.vm.push(container_fn(elts))
+        self.vm.build(count, container_fn)
+
+    def unpack_sequence(self, seq, count: int):
+        """Return `seq` as a list or tuple of exactly `count` items, raising
+        ValueError the way CPython does when it has more or fewer.
+
+        Lists and tuples are used as is; anything else is iterated at
+        most count + 1 times, so an endless iterator is reported as
+        having too many values.
+        """
+        if type(seq) not in (tuple, list):
+            seq = list(islice(seq, count + 1))
+        n = len(seq)
+        if n != count:
+            if n > count:
+                raise ValueError(f"too many values to unpack (expected {count})")
+            raise ValueError(
+                f"not enough values to unpack (expected {count}, got {n})"
+            )
+        return seq
+
+    def construct(self, cls, pos_args, named_args):
+        """Create an instance of the class `cls` as type.__call__() does,
+        when its __init__() is interpreted. The arguments are bound
+        straight into the frame for __init__(), rather than going
+        through type.__call__(), a bound Method and Function.__call__().
+        NULL is returned when `cls` is not such a class; the caller then
+        calls it as usual.
+        """
+        init = cls.__init__
+        if not isinstance(init, Function):
+            return NULL
+        new = cls.__new__
+        if new is object.__new__:
+            obj = new(cls)
+        elif isinstance(new, Function):
+            obj = new(cls, *pos_args, **named_args)
+            if not isinstance(obj, cls):
+                return obj
+            init = type(obj).__init__
+            if not isinstance(init, Function):
+                init(obj, *pos_args, **named_args)
+                return obj
+        else:
+            return NULL
+
+        args = [obj, *pos_args]
+        if named_args:
+            callargs = init.keyword_callargs(args, named_args)
+        else:
+            callargs = init.positional_callargs(args)
+        if callargs is None:
+            result = init(*args, **named_args)
+        else:
+            result = init.call_with_callargs(callargs)
+        if result is not None:
+            raise TypeError(
+                f"__init__() should return None, not '{type(result).__name__}'"
+            )
+        return obj
 
     def call_function_with_args_resolved(self, func, pos_args, named_args):
+        if type(func) is Comprehension:
+            self.vm.enter_comprehension(func, pos_args[0])
+            return
+
+        # Classes made by build_class() are plain instances of type.
+        if type(func) is type and self.vm.version >= (3, 0):
+            obj = self.construct(func, pos_args, named_args)
+            if obj is not NULL:
+                self.vm.push(obj)
+                return
+
         frame = self.vm.frame
         if hasattr(func, "im_func"):
             # Methods get self as an implicit first parameter.
@@ -159,6 +435,9 @@ class ByteOpBase(object):
                 # Use the frame's locals(), not the interpreter's
                 self.vm.push(frame.f_locals)
                 return
+            elif func is setattr or func is delattr:
+                if pos_args and isinstance(pos_args[0], type):
+                    self.class_changed()
             elif func == compile:
                 # Set dont_inherit parameter.  FIXME: we should set
                 # other flags too based on the interpreted
@@ -278,8 +557,8 @@ class ByteOpBase(object):
                     # we need a native function.  This is wrong though
                     # in that we won't trace into __init__().
                     init_fn = pos_args[0]
-                    if isinstance(init_fn, Function) and init_fn in self.vm.fn2native:
-                        pos_args[0] = self.vm.fn2native[init_fn]
+                    if isinstance(init_fn, Function) and init_fn._func:
+                        pos_args[0] = init_fn._func
         elif func == type and len(pos_args) == 3:
             # Set __module__
             assert not named_args
@@ -311,10 +590,9 @@ class ByteOpBase(object):
             and self.version_info[:2] == PYTHON_VERSION_TRIPLE[:2]
         ):
             log.debug(f"calling native function {func.__name__}")
-        elif inspect.isclass(func):
-            if func.__name__ == "super":
-                pos_args = [self.vm.frame] + pos_args
-                func = builtin_super
+        elif func is super:
+            pos_args = [self.vm.frame] + pos_args
+            func = builtin_super
 
         retval = func(*pos_args, **named_args)
         self.vm.push(retval)
@@ -332,6 +610,56 @@ class ByteOpBase(object):
         func = self.vm.pop()
         return self.call_function_with_args_resolved(func, pos_args, named_args)
 
+    def call_function_vector(self, func, args: list, kw_names=()):
+        """Call `func` using CPython's vectorcall layout: `args` is a flat
+        list of the positional argument values followed by the values for the
+        keyword names in `kw_names`. The result is pushed.
+
+        Interpreted functions bind `args` directly. Otherwise
+        when there are no keyword names, `args` is passed along as the
+        positional-argument list without further copying.
+        """
+        if isinstance(func, Function):
+            self.vm.push(func.vectorcall(args, kw_names))
+            return
+        if type(func) is Comprehension:
+            self.vm.enter_comprehension(func, args[0])
+            return
+        if (
+            type(func) is Method
+            and func.im_self is not None
+            and isinstance(func.im_func, Function)
+        ):
+            # A method bound by Function.__get__(), as super() lookups
+            # give.
+            args.insert(0, func.im_self)
+            self.vm.push(func.im_func.vectorcall(args, kw_names))
+            return
+        if kw_names:
+            nargs = len(args) - len(kw_names)
+            named_args = dict(zip(kw_names, args[nargs:]))
+            del args[nargs:]
+        else:
+            named_args = {}
+        self.call_function_with_args_resolved(func, args, named_args)
+
+    def call_method_vector(self, argc: int, kw_names=()):
+        """Pop and call what LOAD_METHOD (or its NULL-pushing
+        equivalent) left on the stack followed by `argc` arguments. Below
+        the arguments are either the unbound method and self, or NULL and
+        the callable. In the first case self becomes the first argument.
+        """
+        stack = self.vm.frame.stack
+        base = len(stack) - argc - 2
+        func = stack[base]
+        if func is NULL:
+            func = stack[base + 1]
+            args = stack[base + 2 :]
+        else:
+            args = stack[base + 1 :]
+        del stack[base:]
+        return self.call_function_vector(func, args, kw_names)
+
     def convert_native_to_Function(self, frame, func: Callable) -> Callable:
         assert inspect.isfunction(func) or isinstance(func, Function)
         slots = {"kwdefaults": {}, "annotations": {}}
@@ -416,53 +744,13 @@ class ByteOpBase(object):
         self.vm.last_exception = exc_type, val, val.__traceback__
         return "exception"
 
-    def inplaceOperator(self, op):
-        x, y = self.vm.popn(2)
-        if op == "POWER":
-            x **= y
-        elif op == "MULTIPLY":
-            x *= y
-        elif op == "DIVIDE":
-            # Overwritten __div__ is not picked up by x //= y
-            # which seems to puck up FLOOR_DIVIDE
-            # See Python 2.7 test_augassign.py
-            if hasattr(x, "__idiv__"):
-                x = x.__idiv__(y)
-            else:
-                x //= y
-        elif op == "FLOOR_DIVIDE":
-            x //= y
-        elif op == "TRUE_DIVIDE":
-            x /= y
-        elif op == "MODULO":
-            x %= y
-        elif op == "ADD":
-            x += y
-        elif op == "SUBTRACT":
-            x -= y
-        elif op == "LSHIFT":
-            x <<= y
-        elif op == "RSHIFT":
-            x >>= y
-        elif op == "AND":
-            x &= y
-        elif op == "XOR":
-            x ^= y
-        elif op == "OR":
-            x |= y
-        # 3.5 on
-        elif op == "MATRIX_MULTIPLY":
-            operator.imatmul(x, y)
-        else:  # pragma: no cover
-            raise self.PyVMError(f"Unknown in-place operator: {op!r}")
-        self.vm.push(x)
-
     def lookup_name(self, name):
         """Returns the value in the current frame associated for name"""
         frame = self.vm.frame
         if name in frame.f_locals:
             val = frame.f_locals[name]
-        elif name in frame.f_globals:
+        # At module level the locals are the globals; don't look twice.
+        elif frame.f_locals is not frame.f_globals and name in frame.f_globals:
             val = frame.f_globals[name]
         elif name in frame.f_builtins:
             val = frame.f_builtins[name]
@@ -470,6 +758,151 @@ class ByteOpBase(object):
             raise NameError(f"name '{name}' is not defined")
         return val
 
+    def make_comprehension(self, code, closure):
+        """Returns a Comprehension when `code` is a list, set or dict
+        comprehension that the VM can run inline in the calling frame.
+        Otherwise None is returned and a Function should be made.
+        """
+        if (
+            self.vm.inline_comprehensions
+            and iscode(code)
+            and code.co_name in INLINE_COMPREHENSION_NAMES
+            and not code.co_flags & NOT_INLINE_FLAGS
+            and not code.co_cellvars
+        ):
+            return Comprehension(code, self.vm.frame.f_globals, closure, self.vm)
+        return None
+
+    def for_iter_target(self, frame, offset: int):
+        """Returns a (name, store offset) tuple when the FOR_ITER at
+        `offset` in `frame` is followed by a STORE_FAST or STORE_NAME
+        of `name`. Otherwise None is returned. The result is cached
+        per code object.
+        """
+        code = frame.f_code
+        targets = self.for_iter_targets.get(code)
+        if targets is None:
+            targets = self.for_iter_targets[code] = {}
+        elif offset in targets:
+            return targets[offset]
+
+        target = None
+        co_code = code.co_code
+        opc = self.vm.opc
+        store_offset = next_offset(opc.FOR_ITER, opc, offset)
+        if store_offset < len(co_code):
+            store_op = co_code[store_offset]
+            if self.vm.version >= (3, 6):
+                arg = code2num(co_code, store_offset + 1)
+            else:
+                arg = code2num(co_code, store_offset + 1) + (
+                    code2num(co_code, store_offset + 2) * 256
+                )
+            if store_op == self.store_fast_op:
+                target = (str(code.co_varnames[arg]), store_offset)
+            elif store_op == self.store_name_op:
+                target = (str(code.co_names[arg]), store_offset)
+        targets[offset] = target
+        return target
+
+    def fstring_run(self, frame, offset: int):
+        """Returns a (steps, count, end offset) tuple when the FORMAT_VALUE
+        at `offset` in `frame` is followed, up to the f-string's
+        BUILD_STRING, by only the instructions in FSTRING_RUN_OPS, the
+        ones that make up simple f-strings like f"{x!r} = {self.y:>4}".
+
+        `steps` is a tuple of (kind, argument) pairs for these, where kind
+        is the instruction's index in FSTRING_RUN_OPS, `count` is
+        BUILD_STRING's argument and `end offset` its offset. Otherwise
+        None is returned. The result is cached per code object.
+        """
+        code = frame.f_code
+        runs = self.fstring_runs.get(code)
+        if runs is None:
+            runs = self.fstring_runs[code] = {}
+        elif offset in runs:
+            return runs[offset]
+
+        run = None
+        co_code = code.co_code
+        opc = self.vm.opc
+        fstring_ops = self.fstring_ops
+        steps = []
+        # How many values the run has on the stack. When a nested format
+        # spec needs more than that, as for the inner FORMAT_VALUE of
+        # f"{x:{width}}", the run isn't used.
+        depth = 1
+        op, pos = opc.FORMAT_VALUE, offset
+        while True:
+            pos = next_offset(op, opc, pos)
+            if pos >= len(co_code):
+                break
+            op = co_code[pos]
+            kind = fstring_ops.get(op)
+            if kind is None:
+                break
+            arg = code2num(co_code, pos + 1)
+            if kind == FSTRING_BUILD_STRING:
+                if arg >= depth:
+                    # The f-string's own BUILD_STRING, unless it built a
+                    # format spec from values pushed before the run.
+                    pos2 = next_offset(op, opc, pos)
+                    if pos2 >= len(co_code) or co_code[pos2] != opc.FORMAT_VALUE:
+                        run = (tuple(steps), arg, pos)
+                    break
+                # A format spec like the one in f"{x:>{width}}".
+                depth -= arg - 1
+            elif kind == FSTRING_LOAD_CONST:
+                arg = code.co_consts[arg]
+                depth += 1
+            elif kind == FSTRING_LOAD_FAST:
+                arg = str(code.co_varnames[arg])
+                depth += 1
+            elif kind == FSTRING_LOAD_ATTR:
+                arg = str(code.co_names[arg])
+            elif arg & 0x04:
+                if depth < 2:
+                    break
+                depth -= 1
+            steps.append((kind, arg))
+        runs[offset] = run
+        return run
+
+    def lookup_method(self, obj, name):
+        """Returns the unbound function for method `name` of `obj` when
+        `obj.name` would just bind that function to `obj`. Otherwise NULL is
+        returned and the caller should use getattr().
+
+        This is what LOAD_METHOD does in C so that a method call doesn't
+        need to create a bound method object.
+
+        The MRO of type(obj) is searched each time rather than caching
+        what is found: classes can be changed natively, where the
+        interpreter doesn't see it, and checking that a cached method is
+        still the one found costs as much as the search.
+        """
+        obj_type = type(obj)
+        if obj_type.__getattribute__ is not object.__getattribute__:
+            return NULL
+        for klass in obj_type.__mro__:
+            klass_dict = klass.__dict__
+            if name in klass_dict:
+                meth = klass_dict[name]
+                break
+        else:
+            return NULL
+        if type(meth) not in METHOD_TYPES:
+            return NULL
+        obj_dict = getattr(obj, "__dict__", None)
+        if obj_dict is not None and name in obj_dict:
+            return NULL
+        return meth
+
+    def class_changed(self):
+        """Called when interpreted code sets or deletes an attribute of a
+        class. Byteops that cache what is found in classes override this
+        to empty those caches."""
+
     def print_item(self, item, to=None):
         if to is None:
             to = sys.stdout
@@ -489,25 +922,37 @@ class ByteOpBase(object):
         # Note This attribute is not used to control the print
         # statement, but to allow the implementation of print to keep
         # track of its internal state.
-        if hasattr(to, "softspace") and to.softspace:
-            print(" ", end="", file=to)
-            to.softspace = 0
-        print(item, end="", file=to)
-
+        #
+        # Python 3 streams have no softspace attribute, and their write()
+        # would not clear one, as that of a Python 2 file does. For them,
+        # the pending space is kept here instead, with the position of the
+        # stream when it was set, so that it is dropped if anything else
+        # was written since. Streams without a position, like pipes, keep
+        # it until the next print to them.
         if hasattr(to, "softspace"):
-            if isinstance(item, str):
-                if (not item) or (not item[-1].isspace()) or (item[-1] == " "):
-                    to.softspace = 1
-            else:
-                to.softspace = 1
+            if to.softspace:
+                to.write(" ")
+        else:
+            pending = self.softspace.pop(id(to), None)
+            if pending is not None and pending[1] == stream_position(to):
+                to.write(" ")
+        if isinstance(item, str):
+            to.write(item)
+            softspace = (not item) or (not item[-1].isspace()) or (item[-1] == " ")
+        else:
+            to.write(str(item))
+            softspace = True
+        if hasattr(to, "softspace"):
+            to.softspace = int(softspace)
+        elif softspace:
+            self.softspace[id(to)] = (to, stream_position(to))
 
     def print_newline(self, to=None):
         if to is None:
             to = sys.stdout
-        print("", file=to)
+        to.write("\n")
         if hasattr(to, "softspace"):
             to.softspace = 0
+        else:
+            self.softspace.pop(id(to), None)
 
-    def unaryOperator(self, op):
-        x = self.vm.pop()
-        self.vm.push(UNARY_OPERATORS[op](x))
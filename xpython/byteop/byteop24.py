@@ -23,12 +23,21 @@ else:
     import_fn = __import__
 
 from xpython.byteop.byteop import (
+    NULL,
+    SEQUENCE_ITER_TYPES,
     ByteOpBase,
+    SequenceIterator,
+    classic_divide,
     fmt_binary_op,
     fmt_ternary_op,
     fmt_unary_op,
 )
-from xpython.pyobj import Cell, Function, traceback_from_frame
+from xpython.pyobj import (
+    DelegateResult,
+    Function,
+    Generator,
+    traceback_from_frame,
+)
 from xpython.vmtrace import PyVMEVENT_RETURN, PyVMEVENT_YIELD
 
 Version_info = namedtuple("version_info", "major minor micro releaselevel serial")
@@ -56,7 +65,23 @@ def fmt_store_deref(vm, int_arg, repr=repr):
 
 
 def fmt_load_deref(vm, int_arg, repr=repr):
-    return f" ({vm.frame.cells[get_cell_name(vm, int_arg)].get()})"
+    try:
+        return f" ({vm.frame.cells[int_arg].cell_contents})"
+    except ValueError:
+        return ""
+
+
+def unbound_cell_error(vm, i: int):
+    """Return the exception that CPython raises when the cell in slot i
+    of the cell and free variable storage is empty."""
+    name = get_cell_name(vm, i)
+    if i < len(vm.frame.f_code.co_cellvars):
+        return UnboundLocalError(
+            f"local variable '{name}' referenced before assignment"
+        )
+    return NameError(
+        f"free variable '{name}' referenced before assignment in enclosing scope"
+    )
 
 
 def fmt_call_function(vm, argc: int, repr=repr):
@@ -208,15 +233,302 @@ class ByteOp24(ByteOpBase):
         """Duplicates the reference on top of the stack."""
         self.vm.push(self.vm.top())
 
-    # Unary operators are handled elsewhere
+    # Unary operators
+
+    def UNARY_POSITIVE(self):
+        """Implements TOS = +TOS."""
+        stack = self.vm.frame.stack
+        stack[-1] = +stack[-1]
+
+    def UNARY_NEGATIVE(self):
+        """Implements TOS = -TOS."""
+        stack = self.vm.frame.stack
+        stack[-1] = -stack[-1]
+
+    def UNARY_NOT(self):
+        """Implements TOS = not TOS."""
+        stack = self.vm.frame.stack
+        stack[-1] = not stack[-1]
+
+    def UNARY_CONVERT(self):
+        """Implements TOS = `TOS`."""
+        stack = self.vm.frame.stack
+        stack[-1] = repr(stack[-1])
+
+    def UNARY_INVERT(self):
+        """Implements TOS = ~TOS."""
+        stack = self.vm.frame.stack
+        stack[-1] = ~stack[-1]
 
     def GET_ITER(self):
-        """Implements TOS = iter(TOS)."""
-        self.vm.push(iter(self.vm.pop()))
+        """Implements TOS = iter(TOS).
+
+        Iterators over exact lists, tuples, strings and ranges are
+        SequenceIterators so that FOR_ITER can advance them by index.
+        """
+        TOS = self.vm.pop()
+        if type(TOS) in SEQUENCE_ITER_TYPES:
+            if type(TOS) is range:
+                try:
+                    len(TOS)
+                except OverflowError:
+                    # A range longer than sys.maxsize has no len().
+                    self.vm.push(iter(TOS))
+                    return
+            self.vm.push(SequenceIterator(TOS))
+        else:
+            self.vm.push(iter(TOS))
 
-    # Binary operators are handled elsewhere
-    # Inplace operators are handled elsewhere
-    # Slice operators are handled elsewhere
+    # Binary operators
+    #
+    # Each operator is written out so that the Python running us sees
+    # "lhs + rhs" and so on directly, rather than a call through the
+    # operator module. The operand types are then dispatched on (and, on
+    # newer Pythons, specialized for) by the host's own instruction.
+
+    def BINARY_POWER(self):
+        """Implements TOS = TOS1 ** TOS."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] = stack[-1] ** rhs
+
+    def BINARY_MULTIPLY(self):
+        """Implements TOS = TOS1 * TOS."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] = stack[-1] * rhs
+
+    def BINARY_DIVIDE(self):
+        """Implements TOS = TOS1 / TOS when from __future__ import
+        division is not in effect: integers are floor-divided."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] = classic_divide(stack[-1], rhs)
+
+    def BINARY_FLOOR_DIVIDE(self):
+        """Implements TOS = TOS1 // TOS."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] = stack[-1] // rhs
+
+    def BINARY_TRUE_DIVIDE(self):
+        """Implements TOS = TOS1 / TOS."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] = stack[-1] / rhs
+
+    def BINARY_MODULO(self):
+        """Implements TOS = TOS1 % TOS."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] = stack[-1] % rhs
+
+    def BINARY_ADD(self):
+        """Implements TOS = TOS1 + TOS."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] = stack[-1] + rhs
+
+    def BINARY_SUBTRACT(self):
+        """Implements TOS = TOS1 - TOS."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] = stack[-1] - rhs
+
+    def BINARY_LSHIFT(self):
+        """Implements TOS = TOS1 << TOS."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] = stack[-1] << rhs
+
+    def BINARY_RSHIFT(self):
+        """Implements TOS = TOS1 >> TOS."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] = stack[-1] >> rhs
+
+    def BINARY_AND(self):
+        """Implements TOS = TOS1 & TOS."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] = stack[-1] & rhs
+
+    def BINARY_XOR(self):
+        """Implements TOS = TOS1 ^ TOS."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] = stack[-1] ^ rhs
+
+    def BINARY_OR(self):
+        """Implements TOS = TOS1 | TOS."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] = stack[-1] | rhs
+
+    def BINARY_SUBSCR(self):
+        """Implements TOS = TOS1[TOS]."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] = stack[-1][rhs]
+
+    # Inplace operators
+
+    def INPLACE_POWER(self):
+        """Implements in-place TOS = TOS1 ** TOS."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] **= rhs
+
+    def INPLACE_MULTIPLY(self):
+        """Implements in-place TOS = TOS1 * TOS."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] *= rhs
+
+    def INPLACE_DIVIDE(self):
+        """Implements in-place TOS = TOS1 / TOS when from __future__
+        import division is not in effect."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        lhs = stack[-1]
+        # An overwritten __div__ is not picked up by x /= y.
+        # See Python 2.7 test_augassign.py
+        if hasattr(lhs, "__idiv__"):
+            stack[-1] = lhs.__idiv__(rhs)
+        else:
+            stack[-1] = classic_divide(lhs, rhs)
+
+    def INPLACE_FLOOR_DIVIDE(self):
+        """Implements in-place TOS = TOS1 // TOS."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] //= rhs
+
+    def INPLACE_TRUE_DIVIDE(self):
+        """Implements in-place TOS = TOS1 / TOS."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] /= rhs
+
+    def INPLACE_MODULO(self):
+        """Implements in-place TOS = TOS1 % TOS."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] %= rhs
+
+    def INPLACE_ADD(self):
+        """Implements in-place TOS = TOS1 + TOS."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] += rhs
+
+    def INPLACE_SUBTRACT(self):
+        """Implements in-place TOS = TOS1 - TOS."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] -= rhs
+
+    def INPLACE_LSHIFT(self):
+        """Implements in-place TOS = TOS1 << TOS."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] <<= rhs
+
+    def INPLACE_RSHIFT(self):
+        """Implements in-place TOS = TOS1 >> TOS."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] >>= rhs
+
+    def INPLACE_AND(self):
+        """Implements in-place TOS = TOS1 & TOS."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] &= rhs
+
+    def INPLACE_XOR(self):
+        """Implements in-place TOS = TOS1 ^ TOS."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] ^= rhs
+
+    def INPLACE_OR(self):
+        """Implements in-place TOS = TOS1 | TOS."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] |= rhs
+
+    # Slice operators
+
+    # Before 3.0 a two-bound slice has its own opcodes rather than
+    # BUILD_SLICE and a subscript. The "+n" in the opcode name says
+    # which bounds are on the stack: 0 is [:], 1 is [start:], 2 is
+    # [:end] and 3 is [start:end]. Since "+" can't appear in a method
+    # name, these are defined as SLICE_n and so on, and registered under
+    # the opcode names after the class.
+
+    def SLICE_0(self):
+        """Implements TOS = TOS[:]."""
+        stack = self.vm.frame.stack
+        stack[-1] = stack[-1][:]
+
+    def SLICE_1(self):
+        """Implements TOS = TOS1[TOS:]."""
+        stack = self.vm.frame.stack
+        start = stack.pop()
+        stack[-1] = stack[-1][start:]
+
+    def SLICE_2(self):
+        """Implements TOS = TOS1[:TOS]."""
+        stack = self.vm.frame.stack
+        end = stack.pop()
+        stack[-1] = stack[-1][:end]
+
+    def SLICE_3(self):
+        """Implements TOS = TOS2[TOS1:TOS]."""
+        stack = self.vm.frame.stack
+        end = stack.pop()
+        start = stack.pop()
+        stack[-1] = stack[-1][start:end]
+
+    def STORE_SLICE_0(self):
+        """Implements TOS[:] = TOS1."""
+        val, obj = self.vm.popn(2)
+        obj[:] = val
+
+    def STORE_SLICE_1(self):
+        """Implements TOS1[TOS:] = TOS2."""
+        val, obj, start = self.vm.popn(3)
+        obj[start:] = val
+
+    def STORE_SLICE_2(self):
+        """Implements TOS1[:TOS] = TOS2."""
+        val, obj, end = self.vm.popn(3)
+        obj[:end] = val
+
+    def STORE_SLICE_3(self):
+        """Implements TOS2[TOS1:TOS] = TOS3."""
+        val, obj, start, end = self.vm.popn(4)
+        obj[start:end] = val
+
+    def DELETE_SLICE_0(self):
+        """Implements del TOS[:]."""
+        del self.vm.pop()[:]
+
+    def DELETE_SLICE_1(self):
+        """Implements del TOS1[TOS:]."""
+        obj, start = self.vm.popn(2)
+        del obj[start:]
+
+    def DELETE_SLICE_2(self):
+        """Implements del TOS1[:TOS]."""
+        obj, end = self.vm.popn(2)
+        del obj[:end]
+
+    def DELETE_SLICE_3(self):
+        """Implements del TOS2[TOS1:TOS]."""
+        obj, start, end = self.vm.popn(3)
+        del obj[start:end]
 
     def STORE_SUBSCR(self):
         """Implements TOS1[TOS] = TOS2."""
@@ -254,6 +566,14 @@ class ByteOp24(ByteOpBase):
 
     def BREAK_LOOP(self):
         """Terminates a loop due to a break statement."""
+        block_stack = self.vm.frame.block_stack
+        if block_stack and block_stack[-1].type == "loop":
+            # Nothing between us and the loop needs unwinding, so do what
+            # manage_block_stack() would for "break" right here.
+            block = block_stack.pop()
+            self.vm.unwind_block(block)
+            self.vm.jump(block.handler)
+            return None
         return "break"
 
     def CONTINUE_LOOP(self, dest):
@@ -288,16 +608,26 @@ class ByteOp24(ByteOpBase):
 
     def RETURN_VALUE(self):
         """Returns with TOS to the caller of the function."""
+        frame = self.vm.frame
+        if frame.inlined:
+            # The end of a comprehension run inline. Its value stays on
+            # the stack as the result of the call.
+            self.vm.leave_comprehension(frame)
+            return
         self.vm.return_value = self.vm.pop()
-        if self.vm.frame.generator:
-            self.vm.frame.generator.finished = True
+        if frame.generator:
+            frame.generator.finished = True
         return "return"
 
     def YIELD_VALUE(self):
         """
         Pops TOS and yields it from a generator.
         """
-        self.vm.return_value = self.vm.pop()
+        TOS = self.vm.pop()
+        if type(TOS) is DelegateResult:
+            # Generator.throw() has resumed us here again.
+            raise TOS.exception
+        self.vm.return_value = TOS
         return "yield"
 
     def IMPORT_STAR(self):
@@ -387,7 +717,8 @@ class ByteOp24(ByteOpBase):
         """Implements name = TOS. namei is the index of name in the attribute
         co_names of the code object. The compiler tries to use STORE_LOCAL or
         STORE_GLOBAL if possible."""
-        self.vm.frame.f_locals[name] = self.vm.pop()
+        f = self.vm.frame
+        f.f_locals[name] = f.stack.pop()
 
     def DELETE_GLOBAL(self, name):
         """Implements del name, where name in global."""
@@ -402,9 +733,8 @@ class ByteOp24(ByteOpBase):
         """Unpacks TOS into count individual values, which are put onto the
         stack right-to-left.
         """
-        seq = self.vm.pop()
-        for x in reversed(seq):
-            self.vm.push(x)
+        seq = self.unpack_sequence(self.vm.pop(), count)
+        self.vm.pushn(reversed(seq))
 
     def DUP_TOPX(self, count):
         """
@@ -419,11 +749,15 @@ class ByteOp24(ByteOpBase):
         """Implements TOS.name = TOS1, where namei is the index of name in co_names."""
         val, obj = self.vm.popn(2)
         setattr(obj, name, val)
+        if isinstance(obj, type):
+            self.class_changed()
 
     def DELETE_ATTR(self, name):
         """Implements del TOS.name, using namei as index into co_names."""
         obj = self.vm.pop()
         delattr(obj, name)
+        if isinstance(obj, type):
+            self.class_changed()
 
     def STORE_GLOBAL(self, name):
         """Works as STORE_NAME, but stores the name as a global."""
@@ -441,7 +775,21 @@ class ByteOp24(ByteOpBase):
         # FIXME: Better would be to separate NameErrors caused by
         # interpreting bytecode versus NameErrors that are caused as a result of bugs
         # in the interpreter.
-        self.vm.push(self.lookup_name(name))
+        #
+        # This is lookup_name() written out, since module-level loops
+        # run this for nearly every name they use.
+        f = self.vm.frame
+        f_locals = f.f_locals
+        if name in f_locals:
+            f.stack.append(f_locals[name])
+            return
+        f_globals = f.f_globals
+        if f_locals is not f_globals and name in f_globals:
+            f.stack.append(f_globals[name])
+        elif name in f.f_builtins:
+            f.stack.append(f.f_builtins[name])
+        else:
+            raise NameError(f"name '{name}' is not defined")
         # try:
         #     self.lookup_name(name)
         # except NameError:
@@ -464,13 +812,11 @@ class ByteOp24(ByteOpBase):
 
     def BUILD_LIST(self, count: int):
         """Works as BUILD_TUPLE, but creates a list."""
-        elts = self.vm.popn(count)
-        self.vm.push(elts)
+        self.vm.build(count)
 
     def BUILD_SET(self, count):
         """Works as BUILD_TUPLE, but creates a set. New in version 2.7"""
-        elts = self.vm.popn(count)
-        self.vm.push(set(elts))
+        self.vm.build(count, set)
 
     def BUILD_MAP(self, size):
         """
@@ -616,13 +962,42 @@ class ByteOp24(ByteOpBase):
         Note: jump = delta + f.f_lasti set in parse_byte_and_args()
         """
 
-        iterobj = self.vm.top()
-        try:
-            v = next(iterobj)
-            self.vm.push(v)
-        except StopIteration:
-            self.vm.pop()
+        f = self.vm.frame
+        iterobj = f.stack[-1]
+        if type(iterobj) is SequenceIterator:
+            i = iterobj.index
+            seq = iterobj.seq
+            if i < len(seq):
+                iterobj.index = i + 1
+                v = seq[i]
+            else:
+                iterobj.seq = ()
+                v = NULL
+        elif type(iterobj) is Generator:
+            v, finished = iterobj.resume(None)
+            if finished:
+                v = NULL
+        else:
+            # Exhaustion is signaled by the default value rather than
+            # by catching StopIteration.
+            v = next(iterobj, NULL)
+
+        if v is NULL:
+            f.stack.pop()
             self.vm.jump(jump_offset)
+            return
+
+        # Store straight into the loop variable when the next instruction
+        # is a STORE_FAST or STORE_NAME, skipping over that instruction.
+        # Tracing and breakpoints need to see the store, though.
+        if f.f_trace is None and not f.brkpt:
+            target = self.for_iter_target(f, f.f_lasti)
+            if target is not None:
+                name, store_offset = target
+                f.f_locals[name] = v
+                f.f_lasti = store_offset
+                return
+        f.stack.append(v)
 
     def LOAD_GLOBAL(self, name):
         """
@@ -671,9 +1046,10 @@ class ByteOp24(ByteOpBase):
         """Store a key and value pair in a dictionary. Pops the key
         and value while leaving the dictionary on the stack.
         """
-        the_map, val, key = self.vm.popn(3)
-        the_map[key] = val
-        self.vm.push(the_map)
+        stack = self.vm.frame.stack
+        key = stack.pop()
+        val = stack.pop()
+        stack[-1][key] = val
 
     # some (but not all) Names
 
@@ -705,19 +1081,22 @@ class ByteOp24(ByteOpBase):
         """
         self.vm.push(self.vm.frame.cells[i])
 
-    def LOAD_DEREF(self, name):
+    def LOAD_DEREF(self, i):
         """
         Loads the cell contained in slot i of the cell and free variable
         storage. Pushes a reference to the object the cell contains on the
         stack.
         """
-        self.vm.push(self.vm.frame.cells[name].get())
+        try:
+            self.vm.push(self.vm.frame.cells[i].cell_contents)
+        except ValueError:
+            raise unbound_cell_error(self.vm, i)
 
-    def STORE_DEREF(self, name):
+    def STORE_DEREF(self, i):
         """Stores TOS into the cell contained in slot i of the cell
         and free variable storage.
         """
-        self.vm.frame.cells[name].set(self.vm.pop())
+        self.vm.frame.cells[i].cell_contents = self.vm.pop()
 
     # End names
 
@@ -740,6 +1119,11 @@ class ByteOp24(ByteOpBase):
         code = self.vm.pop()
         defaults = self.vm.popn(argc)
         globs = self.vm.frame.f_globals
+        comprehension = self.make_comprehension(code, None)
+        if comprehension:
+            self.vm.push(comprehension)
+            return
+
         fn = Function(
             name=None,
             code=code,
@@ -764,10 +1148,15 @@ class ByteOp24(ByteOpBase):
         before the cells.
         """
         code = self.vm.pop()
+        closure = tuple(self.vm.popn(len(code.co_freevars)))
         defaults = self.vm.popn(argc)
         globs = self.vm.frame.f_globals
 
-        closure = tuple([Cell(self.lookup_name(var)) for var in code.co_freevars])
+        comprehension = self.make_comprehension(code, closure)
+        if comprehension:
+            self.vm.push(comprehension)
+            return
+
         fn = Function(
             name=None,
             code=code,
@@ -897,3 +1286,12 @@ class ByteOp24(ByteOpBase):
         """
         var_args, keyword_args = self.vm.popn(2)
         return self.call_function(argc, var_args=var_args, keyword_args=keyword_args)
+
+
+for _prefix in ("", "STORE_", "DELETE_"):
+    for _count in range(4):
+        setattr(
+            ByteOp24,
+            "%sSLICE+%d" % (_prefix, _count),
+            getattr(ByteOp24, "%sSLICE_%d" % (_prefix, _count)),
+        )
@@ -5,6 +5,7 @@ Note: this is subclassed. Later versions use operations from here.
 """
 
 from xpython.byteop.byteop24 import ByteOp24, Version_info
+from xpython.pyobj import Function
 
 
 class ByteOp25(ByteOp24):
@@ -13,6 +14,27 @@ class ByteOp25(ByteOp24):
         self.version = "2.5.6 (default, Oct 27 1955, 00:00:00)\n[x-python]"
         self.version_info = Version_info(2, 5, 6, "final", 0)
 
+    # Changed in 2.5: the cells are collected into a tuple by BUILD_TUPLE.
+    def MAKE_CLOSURE(self, argc: int):
+        """
+        Creates a new function object, sets its ``func_closure`` slot, and
+        pushes it on the stack. TOS is the code associated with the
+        function, TOS1 the tuple containing cells for the closure’s
+        free variables. The function also has ``argc`` default parameters,
+        which are found below the cells.
+        """
+        name = None
+        closure, code = self.vm.popn(2)
+        defaults = self.vm.popn(argc)
+        globs = self.vm.frame.f_globals
+        comprehension = self.make_comprehension(code, closure)
+        if comprehension:
+            self.vm.push(comprehension)
+            return
+
+        fn = Function(name, code, globs, defaults, closure, self.vm)
+        self.vm.push(fn)
+
     # New in Python 2.5 but changes in 3.3.
     def WITH_CLEANUP(self):
         """Cleans up the stack when a "with" statement block exits. On top of
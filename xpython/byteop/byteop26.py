@@ -19,7 +19,6 @@ except ImportError:
 from xpython.byteop.byteop import fmt_binary_op
 from xpython.byteop.byteop24 import Version_info, fmt_make_function
 from xpython.byteop.byteop25 import ByteOp25
-from xpython.pyobj import Function
 
 
 class ByteOp26(ByteOp25):
@@ -114,18 +113,3 @@ class ByteOp26(ByteOp25):
                     pass
                 pass
         self.vm.push(module)
-
-    def MAKE_CLOSURE(self, argc: int):
-        """
-        Creates a new function object, sets its ``func_closure`` slot, and
-        pushes it on the stack. TOS is the code associated with the
-        function, TOS1 the tuple containing cells for the closure’s
-        free variables. The function also has ``argc`` default parameters,
-        which are found below the cells.
-        """
-        name = None
-        closure, code = self.vm.popn(2)
-        defaults = self.vm.popn(argc)
-        globs = self.vm.frame.f_globals
-        fn = Function(name, code, globs, defaults, closure, self.vm)
-        self.vm.push(fn)
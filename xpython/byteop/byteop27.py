@@ -99,10 +99,10 @@ class ByteOp27(ByteOp26):
         Calls dict.setitem(TOS1[-count], TOS, TOS1). Used to implement dict
         comprehensions.
         """
-        # FIXME: the below seems fishy.
-        val, key = self.vm.popn(2)
-        the_map = self.vm.peek(count)
-        the_map[key] = val
+        stack = self.vm.frame.stack
+        key = stack.pop()
+        val = stack.pop()
+        stack[-count][key] = val
 
     # Note gone in 3.0 and 3.1, but appears again in 3.2
     def SETUP_WITH(self, delta):
@@ -146,8 +146,7 @@ class ByteOp27(ByteOp26):
 
     def BUILD_SET(self, count):
         """Works as BUILD_TUPLE, but creates a set. New in version 2.7"""
-        elts = self.vm.popn(count)
-        self.vm.push(set(elts))
+        self.vm.build(count, set)
 
     def JUMP_FORWARD(self, delta):
         """Increments bytecode counter by delta."""
@@ -7,18 +7,38 @@
 """Bytecode Interpreter operations for Python 3.10
 """
 import inspect
+from collections.abc import Mapping, Sequence
+from itertools import repeat
 
 from xdis.version_info import PYTHON_VERSION_TRIPLE
 
+from xpython.byteop.byteop import METHOD_CACHE_TYPES, NULL
 from xpython.byteop.byteop24 import Version_info
-from xpython.byteop.byteop36 import (
-    COMPREHENSION_FN_NAMES,
-    MAKE_FUNCTION_SLOT_NAMES,
-    MAKE_FUNCTION_SLOTS,
-)
+from xpython.byteop.byteop36 import COMPREHENSION_FN_NAMES
 from xpython.byteop.byteop39 import ByteOp39
 from xpython.pyobj import Function
 
+# What match_kind() returns for subjects that match mapping or sequence
+# patterns.
+MATCH_MAPPING_KIND = 1
+MATCH_SEQUENCE_KIND = 2
+
+# Instances of these, and of their subclasses, match a class pattern
+# with one positional sub-pattern as a whole, as in `case int(n)`.
+MATCH_SELF_TYPES = (
+    bool,
+    bytearray,
+    bytes,
+    dict,
+    float,
+    frozenset,
+    int,
+    list,
+    set,
+    str,
+    tuple,
+)
+
 
 class ByteOp310(ByteOp39):
     def __init__(self, vm):
@@ -27,7 +47,22 @@ class ByteOp310(ByteOp39):
         self.version = "3.10.0 (default, Oct 27 1955, 00:00:00)\n[x-python]"
         self.version_info = Version_info(3, 10, 0, "final", 0)
 
+        # Caches for match statements: match_kinds maps a subject type to
+        # the kind of patterns it matches, and match_args_cache maps a
+        # class pattern to its __match_args__.
+        self.match_kinds = {}
+        self.match_args_cache = {}
+
     # Changed in 3.10...
+    def RERAISE(self, oparg: int):
+        """Re-raises the exception currently on top of the stack. If
+        oparg is non-zero, restores f_lasti of the current frame to its
+        value when the exception was raised.
+        """
+        # Tracebacks here come from the frame, not f_lasti, so oparg
+        # can be ignored.
+        return super(ByteOp310, self).RERAISE()
+
     def MAKE_FUNCTION(self, argc: int):
         """
         Pushes a new function object on the stack. From bottom to top,
@@ -50,23 +85,20 @@ class ByteOp310(ByteOp39):
         name = qualname.split(".")[-1]
         code = self.vm.pop()
 
-        slot = {
-            "defaults": tuple(),
-            "kwdefaults": {},
-            "annotations": tuple(),
-            "closure": tuple(),
-        }
-        assert 0 <= argc < (1 << MAKE_FUNCTION_SLOTS)
-        have_param = list(
-            reversed([True if 1 << i & argc else False for i in range(4)])
-        )
-        for i in range(MAKE_FUNCTION_SLOTS):
-            if have_param[i]:
-                slot[MAKE_FUNCTION_SLOT_NAMES[i]] = self.vm.pop()
+        assert 0 <= argc < 0x10
+        stack = self.vm.frame.stack
+        closure = stack.pop() if argc & 0x08 else ()
+        annotations_tup = stack.pop() if argc & 0x04 else ()
+        kwdefaults = stack.pop() if argc & 0x02 else {}
+        defaults = stack.pop() if argc & 0x01 else ()
 
         # FIXME: DRY with code in byteop3{2,4,6}.py
 
         globs = self.vm.frame.f_globals
+        comprehension = self.make_comprehension(code, closure)
+        if comprehension:
+            self.vm.push(comprehension)
+            return
 
         if (
             not inspect.iscode(code)
@@ -77,7 +109,6 @@ class ByteOp310(ByteOp39):
 
         # Convert annotations tuple into dictionary
         annotations = {}
-        annotations_tup = slot["annotations"]
         for i in range(0, len(annotations_tup), 2):
             annotations[annotations_tup[i]] = annotations_tup[i + 1]
 
@@ -85,20 +116,17 @@ class ByteOp310(ByteOp39):
             name=name,
             code=code,
             globs=globs,
-            argdefs=slot["defaults"],
-            closure=slot["closure"],
+            argdefs=defaults,
+            closure=closure,
             vm=self.vm,
             qualname=qualname,
-            kwdefaults=slot["kwdefaults"],
+            kwdefaults=kwdefaults,
             annotations=annotations,
         )
 
         if argc == 0 and code.co_name in COMPREHENSION_FN_NAMES:
             fn_vm.has_dot_zero = True
 
-        if fn_vm._func:
-            self.vm.fn2native[fn_vm] = fn_vm._func
-
         self.vm.push(fn_vm)
 
     # New in 3.10
@@ -115,24 +143,72 @@ class ByteOp310(ByteOp39):
     #   already been performed in parse_byte_and_args().
     ##############################################################################
 
+    def match_kind(self, subject_type) -> int:
+        """Return MATCH_MAPPING_KIND or MATCH_SEQUENCE_KIND if instances
+        of `subject_type` match mapping or sequence patterns, or 0 when
+        they match neither. CPython 3.10 keeps this in tp_flags; here it
+        is worked out once for each type.
+        """
+        kind = self.match_kinds.get(subject_type)
+        if kind is None:
+            if len(self.match_kinds) >= METHOD_CACHE_TYPES:
+                self.match_kinds.clear()
+            if issubclass(subject_type, Mapping):
+                kind = MATCH_MAPPING_KIND
+            elif issubclass(subject_type, Sequence) and not issubclass(
+                subject_type, (str, bytes, bytearray)
+            ):
+                kind = MATCH_SEQUENCE_KIND
+            else:
+                kind = 0
+            self.match_kinds[subject_type] = kind
+        return kind
+
+    def match_args(self, cls):
+        """Return the positional attribute names of class pattern `cls`
+        as a tuple, or None if a positional sub-pattern matches the
+        subject itself, as for int(x). The result is kept until a class
+        is changed."""
+        if cls in self.match_args_cache:
+            return self.match_args_cache[cls]
+        names = getattr(cls, "__match_args__", NULL)
+        if names is NULL:
+            names = None if issubclass(cls, MATCH_SELF_TYPES) else ()
+        elif type(names) is not tuple:
+            raise TypeError(
+                f"{cls.__name__}.__match_args__ must be a tuple "
+                f"(got {type(names).__name__})"
+            )
+        if len(self.match_args_cache) >= METHOD_CACHE_TYPES:
+            self.match_args_cache.clear()
+        self.match_args_cache[cls] = names
+        return names
+
+    def class_changed(self):
+        super(ByteOp310, self).class_changed()
+        self.match_args_cache.clear()
+
     def COPY_DICT_WITHOUT_KEYS(self):
         """TOS is a tuple of mapping keys, and TOS1 is the match
         subject. Replace TOS with a dict formed from the items of TOS1, but
         without any of the keys in TOS."""
-        # FIXME
-        raise self.vm.PyVMError("MATCH_COPY_DICT_WITHOUT_KEYS not implemented")
+        stack = self.vm.frame.stack
+        rest = dict(stack[-2])
+        for key in stack[-1]:
+            del rest[key]
+        stack[-1] = rest
 
     def GET_LEN(self):
         """Push len(TOS) onto the stack."""
-        self.vm.push(len(self.vm.pop()))
+        self.vm.push(len(self.vm.top()))
 
     def MATCH_MAPPING(self):
         """If TOS is an instance of collections.abc.Mapping (or, more
         technically: if it has the Py_TPFLAGS_MAPPING flag set in its
         tp_flags), push True onto the stack. Otherwise, push False.
         """
-        # FIXME
-        raise self.vm.PyVMError("MATCH_MAPPING not implemented")
+        stack = self.vm.frame.stack
+        stack.append(self.match_kind(type(stack[-1])) == MATCH_MAPPING_KIND)
 
     def MATCH_SEQUENCE(self):
         """If TOS is an instance of collections.abc.Sequence and is not an
@@ -140,8 +216,8 @@ class ByteOp310(ByteOp39):
         has the Py_TPFLAGS_SEQUENCE flag set in its tp_flags), push
         True onto the stack. Otherwise, push False.
         """
-        # FIXME
-        raise self.vm.PyVMError("MATCH_SEQUENCE not implemented")
+        stack = self.vm.frame.stack
+        stack.append(self.match_kind(type(stack[-1])) == MATCH_SEQUENCE_KIND)
 
     def MATCH_KEYS(self):
         """TOS is a tuple of mapping keys, and TOS1 is the match subject. If
@@ -149,8 +225,34 @@ class ByteOp310(ByteOp39):
         the corresponding values, followed by True. Otherwise, push
         None, followed by False.
         """
-        # FIXME
-        raise self.vm.PyVMError("MATCH_KEYS not implemented")
+        stack = self.vm.frame.stack
+        values = self.match_keys(stack[-2], stack[-1])
+        stack.append(values)
+        stack.append(values is not None)
+
+    def match_keys(self, subject, keys: tuple):
+        """Return the values of `keys` in mapping `subject` as a tuple, or
+        None if any of them is missing."""
+        if len(keys) > 1 and len(set(keys)) < len(keys):
+            seen = set()
+            for key in keys:
+                if key in seen:
+                    raise ValueError(
+                        f"mapping pattern checks duplicate key ({key!r})"
+                    )
+                seen.add(key)
+        if type(subject) is dict:
+            # A plain dict has no __missing__() to consult.
+            try:
+                return tuple(map(subject.__getitem__, keys))
+            except KeyError:
+                return None
+        get = subject.get
+        values = tuple(map(get, keys, repeat(NULL)))
+        for value in values:
+            if value is NULL:
+                return None
+        return values
 
     def GEN_START(self, kind):
         """Pops TOS. If TOS was not None, raises an exception. The kind
@@ -168,10 +270,11 @@ class ByteOp310(ByteOp39):
         """Lift the top count stack items one position up, and move
         TOS down to position count.
         """
-        # FIXME
-        raise self.vm.PyVMError("ROT_N not implemented")
+        stack = self.vm.frame.stack
+        tos = stack.pop()
+        stack.insert(len(stack) - count + 1, tos)
 
-    def MATCH_CLASS(self):
+    def MATCH_CLASS(self, count: int):
         """TOS is a tuple of keyword attribute names, TOS1 is the class being
         matched against, and TOS2 is the match subject. count is the number of
         positional sub-patterns.
@@ -181,5 +284,52 @@ class ByteOp310(ByteOp39):
         True and TOS1 to a tuple of extracted attributes. Otherwise,
         set TOS to False.
         """
-        # FIXME
-        raise self.vm.PyVMError("MATCH_CLASS not implemented")
+        stack = self.vm.frame.stack
+        names = stack.pop()
+        attrs = self.match_class(stack[-2], stack[-1], count, names)
+        if attrs is not None:
+            stack[-2] = attrs
+        stack[-1] = attrs is not None
+
+    def match_class(self, subject, cls, count: int, names: tuple):
+        """Return the attributes of `subject` that class pattern `cls`, with
+        `count` positional sub-patterns and keyword sub-patterns for the
+        attributes `names`, extracts, as a tuple. None is returned if
+        `subject` does not match."""
+        if not isinstance(cls, type):
+            raise TypeError("called match pattern must be a type")
+        if not isinstance(subject, cls):
+            return None
+        attr_names = names
+        if count:
+            match_args = self.match_args(cls)
+            allowed = 1 if match_args is None else len(match_args)
+            if count > allowed:
+                raise TypeError(
+                    "%s() accepts %d positional sub-pattern%s (%d given)"
+                    % (cls.__name__, allowed, "" if allowed == 1 else "s", count)
+                )
+            if match_args is not None:
+                for name in match_args[:count]:
+                    if not isinstance(name, str):
+                        raise TypeError(
+                            "__match_args__ elements must be strings "
+                            f"(got {type(name).__name__})"
+                        )
+                attr_names = match_args[:count] + names
+        if len(set(attr_names)) < len(attr_names):
+            seen = set()
+            for name in attr_names:
+                if name in seen:
+                    raise TypeError(
+                        f"{cls.__name__}() got multiple sub-patterns "
+                        f"for attribute {name!r}"
+                    )
+                seen.add(name)
+        try:
+            attrs = tuple(map(getattr, repeat(subject), attr_names))
+        except AttributeError:
+            return None
+        if count and match_args is None:
+            attrs = (subject,) + attrs
+        return attrs
@@ -7,33 +7,88 @@
 """Bytecode Interpreter operations for Python 3.11
 """
 
-from typing import Any
+from xdis.opcodes.opcode_311 import _nb_ops
 
-from xpython.byteop.byteop24 import Version_info
+from xpython.byteop.byteop import NULL
+from xpython.byteop.byteop24 import ByteOp24, Version_info
 from xpython.byteop.byteop310 import ByteOp310
 from xpython.pyobj import traceback_from_frame
 
 
 class ByteOp311(ByteOp310):
     def __init__(self, vm):
-        super(ByteOp310, self).__init__(vm)
+        super(ByteOp311, self).__init__(vm)
         self.hexversion = 0x30A00F0
         self.version = "3.11.0 (default, Oct 27 1955, 00:00:00)\n[x-python]"
         self.version_info = Version_info(3, 11, 0, "final", 0)
 
-    def call_function38(self, argc: int) -> Any:
-        func = self.vm.peek(argc + 1)
-        named_args = self.vm.pop()
-        pos_args = self.vm.popn(argc - 1)
+        # Keyword names set by KW_NAMES for the CALL that follows it.
+        self.kw_names = ()
 
-        func = self.vm.pop()
-        return self.call_function_with_args_resolved(func, pos_args, named_args)
+        # BINARY_OP's argument is an index into _nb_ops, whose names
+        # ("NB_ADD", "NB_INPLACE_ADD", ...) match our BINARY_* and
+        # INPLACE_* instructions.
+        self.binary_op_fns = tuple(
+            getattr(self, name[3:] if "INPLACE" in name else "BINARY" + name[2:])
+            for name, _ in _nb_ops
+        )
 
     # Changed in 3.11...
 
+    def LOAD_GLOBAL(self, name, push_null=0):
+        """
+        Loads the global named co_names[namei>>1] onto the stack.
+
+        Changed in version 3.11: If the low bit of namei is set, then a NULL
+        is pushed to the stack before the global variable.
+
+        Note: name and the low bit have been split out in parse_byte_and_args()
+        """
+        if push_null:
+            self.vm.push(NULL)
+        ByteOp24.LOAD_GLOBAL(self, name)
+
+    def MATCH_CLASS(self, count: int):
+        """TOS is a tuple of keyword attribute names, TOS1 is the class being
+        matched against, and TOS2 is the match subject. count is the number of
+        positional sub-patterns.
+
+        Pop TOS, TOS1, and TOS2. If TOS2 is an instance of TOS1 and has the
+        positional and keyword attributes required by count and TOS, push a
+        tuple of extracted attributes. Otherwise, push None.
+
+        Changed in version 3.11: Previously, this instruction also pushed a
+        boolean value indicating success (True) or failure (False).
+        """
+        stack = self.vm.frame.stack
+        names = stack.pop()
+        cls = stack.pop()
+        stack[-1] = self.match_class(stack[-1], cls, count, names)
+
+    def MATCH_KEYS(self):
+        """TOS is a tuple of mapping keys, and TOS1 is the match subject. If
+        TOS1 contains all of the keys in TOS, push a tuple containing the
+        corresponding values. Otherwise, push None.
+
+        Changed in version 3.11: Previously, this instruction also pushed a
+        boolean value indicating success (True) or failure (False).
+        """
+        stack = self.vm.frame.stack
+        stack.append(self.match_keys(stack[-2], stack[-1]))
+
+    def MAKE_FUNCTION(self, argc: int):
+        """
+        Pushes a new function object on the stack. This is the same
+        as in 3.10, except that the qualified name is no longer on the
+        stack; it comes from the code object at TOS.
+        """
+        code = self.vm.top()
+        self.vm.push(getattr(code, "co_qualname", code.co_name))
+        ByteOp310.MAKE_FUNCTION(self, argc)
+
     # New in 3.11.  Note: below, when the parameter is "delta", the
-    # value has been adjusted from a relative number into and absolute
-    # one.
+    # value has been adjusted from a relative number into an absolute
+    # one, for both the forward and backward variants.
     def CACHE(self):
         """
         Rather than being an actual instruction, this opcode is
@@ -44,24 +99,17 @@ class ByteOp311(ByteOp310):
         """
         return
 
-    # This is handled by the caller.
-    # def BINARY_OP(self, op: int):
-    #     """
-    #       Implements the binary and in-place operators (depending on the value of op):
-
-    #       rhs = STACK.pop()
-    #       lhs = STACK.pop()
-    #       STACK.append(lhs op rhs)
-
-    #       New in version 3.11.
-    #       TOS is a tuple of mapping keys, and TOS1 is the match
-    #       subject. Replace TOS with a dict formed from the items of TOS1, but
-    #       without any of the keys in TOS.
-    #     """
-    #     rhs = self.vm.pop()
-    #     lhs = self.vm.pop()
-    #     self.vm.push(len(self.vm.pop()))
-    #     raise self.vm.PyVMError("MATCH_COPY_DICT_WITHOUT_KEYS not implemented")
+    def BINARY_OP(self, op: int):
+        """
+        Implements the binary and in-place operators (depending on the value of op):
+
+          rhs = STACK.pop()
+          lhs = STACK.pop()
+          STACK.append(lhs op rhs)
+
+        op indexes the handlers that binary_op_fns[] set up from _nb_ops.
+        """
+        self.binary_op_fns[op]()
 
     def CALL(self, argc: int):
         """Calls a callable object with the number of arguments
@@ -91,22 +139,25 @@ class ByteOp311(ByteOp310):
         Replaces CALL_FUNCTION
 
         """
+        kw_names = self.kw_names
+        self.kw_names = ()
         try:
-            return self.call_function38(argc)
+            return self.call_method_vector(argc, kw_names)
         except TypeError as exc:
             tb = self.vm.last_traceback = traceback_from_frame(self.vm.frame)
             self.vm.last_exception = (TypeError, exc, tb)
             return "exception"
 
-    def KW_NAMES(self, consti: int):
+    def KW_NAMES(self, kw_names: tuple):
         """
         Prefixes CALL. Stores a reference to co_consts[consti] into an internal variable
         for use by CALL. co_consts[consti] must be a tuple of strings.
 
         Replaces CALL_FUNCTION_KW
+
+        Note: consti has been turned into co_consts[consti] in parse_byte_and_args().
         """
-        # FIXME
-        raise self.vm.PyVMError("KW_NAMES not implemented")
+        self.kw_names = kw_names
 
     def PRECALL(self, argc: int):
         """
@@ -135,15 +186,17 @@ class ByteOp311(ByteOp310):
          We'll be passing `oparg + 1` to call_function, to
          make it accept the `self` as a first argument.
 
+        Since CALL handles both of these layouts, there is nothing to
+        do here.
         """
-        raise self.vm.PyVMError("PRECALL not implemented")
+        return
 
     def PUSH_NULL(self):
         """Pushes a NULL to the stack. Used in the call sequence to
         match the NULL pushed by LOAD_METHOD for non-method calls.
 
         """
-        self.vm.push(None)
+        self.vm.push(NULL)
 
     def COPY(self, i: int):
         """
@@ -157,10 +210,8 @@ class ByteOp311(ByteOp310):
         """
         Swap TOS with the item at position i.
         """
-        tos = self.vm.top()
-        stack_i = self.vm.peek(i)
-        self.vm.set(i, tos)
-        self.vm.set(0, stack_i)
+        stack = self.vm.frame.stack
+        stack[-i], stack[-1] = stack[-1], stack[-i]
 
     def CHECK_EXC_MATCH(self):
         """
@@ -174,20 +225,20 @@ class ByteOp311(ByteOp310):
         Decrements bytecode counter by delta. Checks for interrupts.
         """
         # FIXME: check for interrupts.
-        self.vm.jump(-delta)
+        self.vm.jump(delta)
 
     def POP_JUMP_BACKWARD_NO_INTERRUPT(self, delta: int):
         """
         Decrements bytecode counter by delta. Does not check for interrupts.
         """
-        self.vm.jump(-delta)
+        self.vm.jump(delta)
 
     def POP_JUMP_FORWARD_IF_TRUE(self, delta: int):
         """
         If TOS is true, increments the bytecode counter by delta. TOS is popped.
         """
         val = self.vm.pop()
-        if val == True:  # noqa
+        if val:
             self.vm.jump(delta)
 
     def POP_JUMP_BACKWARD_IF_TRUE(self, delta: int):
@@ -195,15 +246,15 @@ class ByteOp311(ByteOp310):
         If TOS is true, decrements the bytecode counter by delta. TOS is popped.
         """
         val = self.vm.pop()
-        if val == True:  # noqa
-            self.vm.jump(-delta)
+        if val:
+            self.vm.jump(delta)
 
     def POP_JUMP_FORWARD_IF_FALSE(self, delta: int):
         """
         If TOS is false, increments the bytecode counter by delta. TOS is popped.
         """
         val = self.vm.pop()
-        if val == False:  # noqa
+        if not val:
             self.vm.jump(delta)
 
     def POP_JUMP_BACKWARD_IF_FALSE(self, delta: int):
@@ -211,8 +262,8 @@ class ByteOp311(ByteOp310):
         If TOS is false, decrements the bytecode counter by delta. TOS is popped.
         """
         val = self.vm.pop()
-        if val == False:  # noqa
-            self.vm.jump(-delta)
+        if not val:
+            self.vm.jump(delta)
 
     def POP_JUMP_FORWARD_IF_NOT_NONE(self, delta: int):
         """
@@ -228,7 +279,7 @@ class ByteOp311(ByteOp310):
         """
         val = self.vm.pop()
         if val is not None:
-            self.vm.jump(-delta)
+            self.vm.jump(delta)
 
     def POP_JUMP_FORWARD_IF_NONE(self, delta: int):
         """
@@ -244,7 +295,7 @@ class ByteOp311(ByteOp310):
         """
         val = self.vm.pop()
         if val is None:
-            self.vm.jump(-delta)
+            self.vm.jump(delta)
 
     def JUMP_IF_TRUE_OR_POP(self, delta: int):
         """
@@ -256,9 +307,21 @@ class ByteOp311(ByteOp310):
         The oparg is now a relative delta rather than an absolute target.
         """
         val = self.vm.top()
-        if val == True:  # noqa
+        if val:
             self.vm.jump(delta)
-        self.vm.pop()
+        else:
+            self.vm.pop()
+
+    def RETURN_GENERATOR(self):
+        """
+        Create a generator, coroutine, or async generator from the
+        current frame. Clear the current frame and return the newly
+        created generator.
+
+        Function.__call__ already creates the generator for code with
+        the generator flags set, so there is nothing to do here.
+        """
+        return
 
     def RESUME(self, where: int):
         """
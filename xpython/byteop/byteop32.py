@@ -4,7 +4,7 @@
 import inspect
 
 from xdis.opcodes.opcode_3x import parse_fn_counts_30_35
-from xpython.byteop.byteop24 import ByteOp24, Version_info
+from xpython.byteop.byteop24 import ByteOp24, Version_info, unbound_cell_error
 from xpython.byteop.byteop27 import ByteOp27
 from xpython.pyobj import Function
 
@@ -20,6 +20,9 @@ del ByteOp24.PRINT_NEWLINE_TO
 del ByteOp24.BUILD_CLASS
 del ByteOp24.EXEC_STMT
 del ByteOp24.RAISE_VARARGS
+del ByteOp24.BINARY_DIVIDE
+del ByteOp24.INPLACE_DIVIDE
+del ByteOp24.UNARY_CONVERT
 
 # Gone since 3.2
 del ByteOp24.DUP_TOPX
@@ -48,8 +51,38 @@ class ByteOp32(ByteOp27):
 
     def DUP_TOP_TWO(self):
         """Duplicates the reference on top of the stack."""
-        a, b = self.vm.popn(2)
-        self.vm.push(a, b, a, b)
+        stack = self.vm.frame.stack
+        stack.extend(stack[-2:])
+
+    def DELETE_DEREF(self, i):
+        """Empties the cell contained in slot i of the cell and free
+        variable storage. Used by the del statement.
+        """
+        try:
+            del self.vm.frame.cells[i].cell_contents
+        except ValueError:
+            raise unbound_cell_error(self.vm, i)
+
+    def UNPACK_EX(self, counts: int):
+        """Implements assignment with a starred target: Unpacks an
+        iterable in TOS into individual values, where the total number
+        of values can be smaller than the number of items in the
+        iterable: one of the new values will be a list of all leftover
+        items.
+
+        The low byte of counts is the number of values before the list
+        value, the high byte of counts the number of values after
+        it. The resulting values are put onto the stack right-to-left.
+        """
+        before, after = counts & 0xFF, counts >> 8
+        seq = list(self.vm.pop())
+        n = len(seq)
+        if n < before + after:
+            raise ValueError(
+                f"not enough values to unpack (expected at least {before + after}, got {n})"
+            )
+        seq[before : n - after] = [seq[before : n - after]]
+        self.vm.pushn(reversed(seq))
 
     def POP_EXCEPT(self):
         """
@@ -107,6 +140,10 @@ class ByteOp32(ByteOp27):
         # FIXME: DRY with code in MAKE_FUNCTION
 
         globs = self.vm.frame.f_globals
+        comprehension = self.make_comprehension(code, closure)
+        if comprehension:
+            self.vm.push(comprehension)
+            return
 
         fn = Function(
             name=code.co_name,
@@ -169,6 +206,10 @@ class ByteOp32(ByteOp27):
         # FIXME: DRY with code in byteop3{2,6}.py
 
         globs = self.vm.frame.f_globals
+        comprehension = self.make_comprehension(code, None)
+        if comprehension:
+            self.vm.push(comprehension)
+            return
 
         fn = Function(
             name=name,
@@ -1,11 +1,12 @@
 # -*- coding: utf-8 -*-
 """Byte Interpreter operations for Python 3.3
 """
+from types import CoroutineType
 
 from xdis.opcodes.opcode_3x import parse_fn_counts_30_35
 from xpython.byteop.byteop24 import Version_info
 from xpython.byteop.byteop32 import ByteOp32
-from xpython.pyobj import Function, Generator
+from xpython.pyobj import DelegateResult, Function, Generator
 
 
 class ByteOp33(ByteOp32):
@@ -52,6 +53,10 @@ class ByteOp33(ByteOp32):
         # FIXME: DRY with code in MAKE_FUNCTION
 
         globs = self.vm.frame.f_globals
+        comprehension = self.make_comprehension(code, closure)
+        if comprehension:
+            self.vm.push(comprehension)
+            return
 
         fn = Function(
             name=name,
@@ -115,6 +120,10 @@ class ByteOp33(ByteOp32):
         # FIXME: DRY with code in byteop3{2,6}.py
 
         globs = self.vm.frame.f_globals
+        comprehension = self.make_comprehension(code, None)
+        if comprehension:
+            self.vm.push(comprehension)
+            return
 
         fn = Function(
             name=name,
@@ -136,17 +145,46 @@ class ByteOp33(ByteOp32):
         u = self.vm.pop()
         x = self.vm.top()
 
-        try:
-            if not isinstance(x, Generator) or u is None:
-                # Call next on iterators.
-                retval = next(x)
+        if type(u) is DelegateResult:
+            if u.exception is None:
+                # Generator.resume() has been sending values straight
+                # to x, and x has now finished.
+                retval, finished = u.value, True
+            elif isinstance(x, Generator) or not hasattr(x, "throw"):
+                # Either x raised this, or there is nowhere else to
+                # throw it.
+                self.vm.pop()
+                raise u.exception
             else:
-                retval = x.send(u)
-            self.vm.return_value = retval
-        except StopIteration as e:
+                # Generator.throw() into a native delegate.
+                try:
+                    retval, finished = x.throw(u.exception), False
+                except StopIteration as e:
+                    retval, finished = e.value, True
+        elif isinstance(x, Generator):
+            # Resume interpreted generators and coroutines directly,
+            # without a StopIteration round trip.
+            retval, finished = x.resume(u)
+            generator = self.vm.frame.generator
+            if not finished and generator is not None:
+                # Until x finishes, our generator can resume x itself.
+                generator.gi_yieldfrom = x
+        else:
+            try:
+                if u is None and type(x) is not CoroutineType:
+                    # Call next on iterators.
+                    retval = next(x)
+                else:
+                    retval = x.send(u)
+                finished = False
+            except StopIteration as e:
+                retval, finished = e.value, True
+
+        if finished:
             self.vm.pop()
-            self.vm.push(e.value)
+            self.vm.push(retval)
         else:
+            self.vm.return_value = retval
             # FIXME: The code has the effect of rerunning the last instruction.
             # I'm not sure if or why it is correct.
             if self.vm.version >= (3, 6):
@@ -1,13 +1,9 @@
 # -*- coding: utf-8 -*-
 """Bytecode Interpreter operations for Python 3.4
 """
-import inspect
-import types
-
 from xdis.opcodes.opcode_3x import parse_fn_counts_30_35
-from xdis.version_info import IS_PYPY, PYTHON_VERSION_TRIPLE
 
-from xpython.byteop.byteop24 import Version_info
+from xpython.byteop.byteop24 import Version_info, get_cell_name
 from xpython.byteop.byteop32 import ByteOp32
 from xpython.byteop.byteop33 import ByteOp33
 from xpython.pyobj import Function
@@ -25,13 +21,18 @@ class ByteOp34(ByteOp33):
 
     # New in 3.4
 
-    def LOAD_CLASSDEREF(self, count):
+    def LOAD_CLASSDEREF(self, i):
         """
         Much like LOAD_DEREF but first checks the locals dictionary before
         consulting the cell. This is used for loading free variables in class
         bodies.
         """
-        self.vm.push(self.vm.frame.cells[count].get())
+        f_locals = self.vm.frame.f_locals
+        name = get_cell_name(self.vm, i)
+        if name in f_locals:
+            self.vm.push(f_locals[name])
+        else:
+            self.LOAD_DEREF(i)
 
     ##############################################################################
     # Order of function here is the same as in:
@@ -93,6 +94,10 @@ class ByteOp34(ByteOp33):
         # FIXME: DRY with code in byteop3{2,6}.py
 
         globs = self.vm.frame.f_globals
+        comprehension = self.make_comprehension(code, None)
+        if comprehension:
+            self.vm.push(comprehension)
+            return
 
         fn = Function(
             name=name,
@@ -106,18 +111,4 @@ class ByteOp34(ByteOp33):
             # FIXME: figure out qualname
         )
 
-        if (
-            inspect.iscode(code)
-            and self.version[:2] == PYTHON_VERSION_TRIPLE[:2]
-            and self.is_pypy == IS_PYPY
-        ):
-            # Python 3.4 __build_class__ is more strict about what can be a
-            # function type whereas in earlier version we could get away with
-            # our own kind of xpython.pyobj.Function object.
-
-            native_fn = types.FunctionType(code, globs, name, tuple(defaults))
-            native_fn.__kwdefaults__ = kwdefaults
-            native_fn.__annonations__ = annotations
-            self.vm.fn2native[fn] = native_fn
-
         self.vm.push(fn)
@@ -1,8 +1,15 @@
 """Bytecode Interpreter operations for Python 3.5
 """
+import types
+from itertools import chain
+
+from xdis import CO_ITERABLE_COROUTINE
+
+from xpython.byteop.byteop import dict_from_pairs, merge_dicts, merge_kwargs
 from xpython.byteop.byteop24 import ByteOp24, Version_info
 from xpython.byteop.byteop32 import ByteOp32
 from xpython.byteop.byteop34 import ByteOp34
+from xpython.pyobj import Coroutine, Generator
 from xpython.stdlib.inspect3 import iscoroutinefunction, isgeneratorfunction
 
 # Gone in 3.5
@@ -32,34 +39,35 @@ class ByteOp35(ByteOp34):
         self.version_info = Version_info(3, 5, 10, "final", 0)
 
     def build_container_flat(self, count, container_fn):
-        elts = self.vm.popn(count)
-        self.vm.push(container_fn(e for elt in elts for e in elt))
+        self.vm.push(container_fn(chain.from_iterable(self.vm.popn(count))))
 
     def get_awaitable_iter(self, o):
-        # This helper function returns an awaitable for `o`:
-        #    - `o` if `o` is a coroutine-object;
-        #    - otherwise, o.__await__()
-
-        if iscoroutinefunction(o) or isgeneratorfunction(o):
+        """Return what `await o` delegates to: `o` itself if it is a
+        coroutine, or a generator with CO_ITERABLE_COROUTINE set;
+        otherwise the iterator that o.__await__() returns.
+        """
+        if isinstance(o, (Coroutine, types.CoroutineType)):
+            return o
+        if (
+            isinstance(o, (Generator, types.GeneratorType))
+            and o.gi_code.co_flags & CO_ITERABLE_COROUTINE
+        ):
             return o
-        return o
-
-        if not hasattr(o, "__await__"):
-            raise TypeError("object %s can't be used in 'await' expression", o)
-
-        # FIXME: start here
-        raise self.vm.PyVMError("get_awaitable_iter() not fully implemented")
-        await_fn = None
-        result = self.call_function(await_fn, [o])
 
-        if not iscoroutinefunction(o):
+        await_fn = getattr(o, "__await__", None)
+        if await_fn is None:
+            raise TypeError(
+                f"object {type(o).__name__} can't be used in 'await' expression"
+            )
+        result = await_fn()
+        if isinstance(result, (Coroutine, types.CoroutineType)):
             raise TypeError(
                 "__await__() returned a coroutine (it must return an "
                 "iterator instead, see PEP 492)"
             )
-        elif not hasattr(result, "__next__") or result.__next__ is None:
+        if not hasattr(result, "__next__"):
             raise TypeError(
-                "__await__() returned non-iterator " "of type '%s'", type(result)
+                f"__await__() returned non-iterator of type '{type(result).__name__}'"
             )
         return result
 
@@ -75,19 +83,35 @@ class ByteOp35(ByteOp34):
         items instead of creating an empty dictionary pre-sized to
         hold count items.
         """
-        kvs = self.vm.popn(count * 2)
-        self.vm.push(dict(kvs[i : i + 2] for i in range(0, len(kvs), 2)))
+        self.vm.build(count * 2, dict_from_pairs)
 
     # New in 3.5
 
+    def BINARY_MATRIX_MULTIPLY(self):
+        """Implements TOS = TOS1 @ TOS."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] = stack[-1] @ rhs
+
+    def INPLACE_MATRIX_MULTIPLY(self):
+        """Implements in-place TOS = TOS1 @ TOS."""
+        stack = self.vm.frame.stack
+        rhs = stack.pop()
+        stack[-1] @= rhs
+
     def GET_YIELD_FROM_ITER(self):
         """
         If TOS is a generator iterator or coroutine object it is left as
         is. Otherwise, implements TOS = iter(TOS).
         """
         TOS = self.vm.top()
+        if type(TOS) is Generator:
+            # YIELD_FROM resumes these directly.
+            return
         if isgeneratorfunction(TOS) or iscoroutinefunction(TOS):
             return
+        if isinstance(TOS, (types.GeneratorType, types.CoroutineType)):
+            return
         TOS = self.vm.pop()
         self.vm.push(iter(TOS))
 
@@ -100,38 +124,48 @@ class ByteOp35(ByteOp34):
         with the CO_ITERABLE_COROUTINE flag, or resolves
         o.__await__.
         """
-        raise self.vm.PyVMError("GET_AWAITABLE not implemented yet")
-        iterable = self.vm.pop()
-        iter = self.get_awaitable_iter(iterable)
-        if iscoroutinefunction(iter):
-            # if iter.get_delegate() is not None:
-            #     # 'w_iter' is a coroutine object that is being awaited,
-            #     # '.w_yielded_from' is the current awaitable being awaited on.
-            #     raise RuntimeError("coroutine is being awaited already")
-            pass
-        self.vm.push(iter)
+        self.vm.push(self.get_awaitable_iter(self.vm.pop()))
 
     def GET_AITER(self):
         """
         Implements TOS = get_awaitable(TOS.__aiter__()). See GET_AWAITABLE
         for details about get_awaitable
+
+        Changed in version 3.5.2: __aiter__() returning an awaitable
+        is no longer supported, so its result is used as is.
         """
-        # raise self.vm.PyVMError("GET_AITER not implemented yet")
-        anext_fn = getattr(self.vm.pop(), "__aiter__")
-        return self.call_function(anext_fn, [])
+        TOS = self.vm.pop()
+        self.call_function_with_args_resolved(TOS.__aiter__, [], {})
 
     def GET_ANEXT(self):
         """
         Implements PUSH(get_awaitable(TOS.__anext__())). See GET_AWAITABLE
         for details about get_awaitable
         """
-        # raise self.vm.PyVMError("GET_ANEXT not implemented yet")
-        anext_fn = getattr(self.vm.pop(), "__anext__")
-        return self.call_function(anext_fn, [])
+        anext = self.vm.top().__anext__()
+        self.vm.push(self.get_awaitable_iter(anext))
 
     def BEFORE_ASYNC_WITH(self):
-        raise self.vm.PyVMError("BEFORE_ASYNC_WITH not implemented yet")
-        return
+        """
+        Resolves __aenter__ and __aexit__ from the object on top of the
+        stack. Pushes __aexit__ and result of __aenter__() to the stack.
+        """
+        context_manager = self.vm.pop()
+        enter_method = context_manager.__aenter__
+        self.vm.push(context_manager.__aexit__)
+        self.vm.push(enter_method())
+
+    def SETUP_ASYNC_WITH(self, delta):
+        """
+        Creates a new frame object.
+
+        That is, a "finally" block pointing to delta is pushed below
+        the awaited result of __aenter__(), which stays on the stack
+        for the STORE or POP_TOP that follows.
+        """
+        enter_result = self.vm.pop()
+        self.vm.push_block("finally", delta)
+        self.vm.push(enter_result)
 
     def WITH_CLEANUP_START(self):
         """Cleans up the stack when a with statement block exits.
@@ -232,11 +266,7 @@ class ByteOp35(ByteOp34):
         tuple displays (*x, *y, *z).
         """
         # Note: this isn't the same thing as build_container_flat
-        elts = self.vm.popn(count)
-        result = {}
-        for d in elts:
-            result.update(d)
-        self.vm.push(result)
+        self.vm.build(count, merge_dicts)
 
     def BUILD_MAP_UNPACK_WITH_CALL(self, oparg):
         """
@@ -252,11 +282,8 @@ class ByteOp35(ByteOp34):
         fn_pos -= 1
 
         elts = self.vm.popn(count)
-        if elts:
-            kwargs = {k: v for m in elts for k, v in m.items()}
-        else:
-            kwargs = None
         func = self.vm.pop(fn_pos)
+        kwargs = merge_kwargs(elts, func, self.version_info) if elts else None
 
         # Put everything in the right order for CALL_FUNCTION_KW
         self.vm.push(func)
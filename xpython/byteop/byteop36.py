@@ -9,6 +9,14 @@ import inspect
 
 from xdis.version_info import PYTHON_VERSION_TRIPLE
 
+from xpython.byteop.byteop import (
+    FSTRING_BUILD_STRING,
+    FSTRING_LOAD_ATTR,
+    FSTRING_LOAD_CONST,
+    FSTRING_LOAD_FAST,
+    merge_kwargs,
+    update_kwargs,
+)
 from xpython.byteop.byteop24 import ByteOp24, Version_info
 from xpython.byteop.byteop35 import ByteOp35
 from xpython.pyobj import Function
@@ -22,10 +30,6 @@ del ByteOp24.CALL_FUNCTION_VAR
 # would be needed if we were doing strictly CPython 3.6
 # del ByteOp24.CALL_FUNCTION_VAR_KW
 
-# Note the order is important. The TOS is listed *last*.
-MAKE_FUNCTION_SLOT_NAMES = ("closure", "annotations", "kwdefaults", "defaults")
-MAKE_FUNCTION_SLOTS = len(MAKE_FUNCTION_SLOT_NAMES)
-
 
 def identity(x):
     return x
@@ -36,6 +40,21 @@ FSTRING_CONVERSION_MAP = {0: identity, 1: str, 2: repr}
 if PYTHON_VERSION_TRIPLE >= (3, 0):
     FSTRING_CONVERSION_MAP[3] = ascii
 
+
+def format_value(value, flags: int, format_spec=""):
+    """FORMAT_VALUE's formatting of `value`, where `flags` & 0x03 gives
+    the conversion to apply first."""
+    conversion = flags & 0x03
+    if conversion:
+        value = FSTRING_CONVERSION_MAP[conversion](value)
+    if not format_spec:
+        value_type = type(value)
+        if value_type is str:
+            return value
+        elif value_type is int:
+            return str(value)
+    return format(value, format_spec)
+
 # Code with these co_names have an implicit .0 in them
 COMPREHENSION_FN_NAMES = frozenset(
     ("<setcomp>", "<dictcomp>", "<genexpr>", "<listcomp>")
@@ -114,7 +133,7 @@ class ByteOp36(ByteOp35):
 
         elts = self.vm.popn(count)
         if elts:
-            kwargs = {k: v for m in elts for k, v in m.items()}
+            kwargs = merge_kwargs(elts, self.vm.peek(2), self.version_info)
         else:
             kwargs = None
 
@@ -167,23 +186,20 @@ class ByteOp36(ByteOp35):
         name = qualname.split(".")[-1]
         code = self.vm.pop()
 
-        slot = {
-            "defaults": tuple(),
-            "kwdefaults": {},
-            "annotations": {},
-            "closure": tuple(),
-        }
-        assert 0 <= argc < (1 << MAKE_FUNCTION_SLOTS)
-        have_param = list(
-            reversed([True if 1 << i & argc else False for i in range(4)])
-        )
-        for i in range(MAKE_FUNCTION_SLOTS):
-            if have_param[i]:
-                slot[MAKE_FUNCTION_SLOT_NAMES[i]] = self.vm.pop()
+        assert 0 <= argc < 0x10
+        stack = self.vm.frame.stack
+        closure = stack.pop() if argc & 0x08 else ()
+        annotations = stack.pop() if argc & 0x04 else {}
+        kwdefaults = stack.pop() if argc & 0x02 else {}
+        defaults = stack.pop() if argc & 0x01 else ()
 
         # FIXME: DRY with code in byteop3{2,4}.py
 
         globs = self.vm.frame.f_globals
+        comprehension = self.make_comprehension(code, closure)
+        if comprehension:
+            self.vm.push(comprehension)
+            return
 
         if (
             not inspect.iscode(code)
@@ -196,20 +212,17 @@ class ByteOp36(ByteOp35):
             name=name,
             code=code,
             globs=globs,
-            argdefs=slot["defaults"],
-            closure=slot["closure"],
+            argdefs=defaults,
+            closure=closure,
             vm=self.vm,
-            kwdefaults=slot["kwdefaults"],
-            annotations=slot["annotations"],
+            kwdefaults=kwdefaults,
+            annotations=annotations,
             qualname=qualname,
         )
 
         if argc == 0 and code.co_name in COMPREHENSION_FN_NAMES:
             fn_vm.has_dot_zero = True
 
-        if fn_vm._func:
-            self.vm.fn2native[fn_vm] = fn_vm._func
-
         self.vm.push(fn_vm)
 
     # New in 3.6...
@@ -221,10 +234,6 @@ class ByteOp36(ByteOp35):
         """
         self.vm.frame.f_locals["__annotations__"][name] = self.vm.pop()
 
-    def SETUP_ASYNC_WITH(self):
-        """Creates a new frame object."""
-        raise self.vm.PyVMError("SETUP_ASYNC_WITH not implemented yet")
-
     def FORMAT_VALUE(self, flags):
         """Used for implementing formatted literal strings (f-strings). Pops
         an optional fmt_spec from the stack, then a required value. flags is
@@ -241,18 +250,48 @@ class ByteOp36(ByteOp35):
         pushed on the stack.
         """
         assert isinstance(flags, int)
+        vm = self.vm
         if flags & 0x04 == 0x04:
-            format_spec = self.vm.pop()
+            format_spec = vm.pop()
         else:
             format_spec = ""
 
-        value = self.vm.pop()
-        attr_flags = flags & 0x03
-        if attr_flags:
-            value = FSTRING_CONVERSION_MAP.get(attr_flags, identity)(value)
-
-        result = format(value, format_spec)
-        self.vm.push(result)
+        result = format_value(vm.pop(), flags, format_spec)
+
+        frame = vm.frame
+        if frame.f_trace is None and not frame.brkpt:
+            run = self.fstring_run(frame, frame.f_lasti)
+            if run is not None:
+                # Run the rest of the f-string up to and including its
+                # BUILD_STRING here.
+                steps, count, end_offset = run
+                values = [result]
+                for kind, arg in steps:
+                    if kind == FSTRING_LOAD_CONST:
+                        values.append(arg)
+                    elif kind == FSTRING_LOAD_FAST:
+                        if arg not in frame.f_locals:
+                            raise UnboundLocalError(
+                                f"local variable '{arg}' referenced before assignment"
+                            )
+                        values.append(frame.f_locals[arg])
+                    elif kind == FSTRING_LOAD_ATTR:
+                        values[-1] = getattr(values[-1], arg)
+                    elif kind == FSTRING_BUILD_STRING:
+                        values[-arg:] = ["".join(values[-arg:])]
+                    elif arg & 0x04:
+                        format_spec = values.pop()
+                        values[-1] = format_value(values[-1], arg, format_spec)
+                    else:
+                        values[-1] = format_value(values[-1], arg)
+                before = count - len(values)
+                if before:
+                    values[0:0] = vm.popn(before)
+                frame.f_lasti = end_offset
+                vm.push("".join(values))
+                return
+
+        vm.push(result)
 
     def BUILD_CONST_KEY_MAP(self, count):
         """
@@ -261,9 +300,7 @@ class ByteOp36(ByteOp35):
         stack contains a tuple of keys.
         """
         keys = self.vm.pop()
-        values = self.vm.popn(count)
-        kvs = dict(zip(keys, values))
-        self.vm.push(kvs)
+        self.vm.push(dict(zip(keys, self.vm.popn(count))))
 
     def CALL_FUNCTION_EX(self, flags):
         """
@@ -286,6 +323,10 @@ class ByteOp36(ByteOp35):
         namedargs = self.vm.pop() if flags & 1 else {}
         posargs = self.vm.pop()
         func = self.vm.pop()
+        if type(namedargs) is not dict:
+            # f(**mapping) passes the mapping as it is.
+            mapping, namedargs = namedargs, {}
+            update_kwargs(namedargs, mapping, func, self.version_info)
         self.call_function_with_args_resolved(func, posargs, namedargs)
 
     def SETUP_ANNOTATIONS(self):
@@ -300,9 +341,10 @@ class ByteOp36(ByteOp35):
 
     def BUILD_STRING(self, count):
         """
-        The version of BUILD_MAP specialized for constant keys. count
-        values are consumed from the stack. The top element on the
-        stack contains a tuple of keys.
+        Concatenates count strings from the stack and pushes the
+        resulting string onto the stack.
+
+        Most f-strings are finished off by FORMAT_VALUE instead.
         """
         assert isinstance(count, int) and count >= 0
         values = self.vm.popn(count)
@@ -315,8 +357,4 @@ class ByteOp36(ByteOp35):
         corresponding callable f.
         """
         assert isinstance(count, int) and count >= 0
-        parameter_tuples = self.vm.popn(count)
-        parameters = [
-            parameter for sublist in parameter_tuples for parameter in sublist
-        ]
-        self.vm.push(parameters)
+        self.build_container_flat(count, tuple)
@@ -1,5 +1,6 @@
 """Bytecode Interpreter operations for Python 3.7
 """
+from xpython.byteop.byteop import NULL
 from xpython.byteop.byteop24 import ByteOp24, Version_info
 from xpython.byteop.byteop36 import ByteOp36
 
@@ -57,20 +58,16 @@ class ByteOp37(ByteOp36):
         by CALL_METHOD when calling the unbound method. Otherwise,
         NULL and the object return by the attribute lookup are pushed.
 
-        rocky: In our implementation in Python we don't have NULL: all
-        stack entries have *some* value. So instead we'll push another
-        item: the status. Also, instead of pushing the unbound method
-        and self, we will pass the bound method, since that is what we
-        have here. So TOS (self) is not pushed back onto the stack.
+        rocky: In our implementation in Python we don't have C's NULL,
+        so a private sentinel object, NULL, stands in for it. As in C,
+        no bound method object is created for the method case.
         """
         TOS = self.vm.pop()
-        if hasattr(TOS, name):
-            # FIXME: check that gettr(TO, name) is a method
-            self.vm.push(getattr(TOS, name))
-            self.vm.push("LOAD_METHOD lookup success")
+        meth = self.lookup_method(TOS, name)
+        if meth is NULL:
+            self.vm.push(NULL, getattr(TOS, name))
         else:
-            self.vm.push("fill in attribute method lookup")
-            self.vm.push(None)
+            self.vm.push(meth, TOS)
 
     def CALL_METHOD(self, count):
         """Calls a method. argc is the number of positional
@@ -80,18 +77,5 @@ class ByteOp37(ByteOp36):
         LOAD_METHOD are on the stack (either self and an unbound
         method object or NULL and an arbitrary callable). All of them
         are popped and the return value is pushed.
-
-        rocky: In our setting, before "self" we have an additional
-        item which is the status of the LOAD_METHOD. In contrast to what can
-        be done in the C implementation, there is no way
-        in Python to represent a value outside what Python offers.
-        In effect, this is what NULL in C is.
         """
-        posargs = self.vm.popn(count)
-        is_success = self.vm.pop()
-        if is_success:
-            func = self.vm.pop()
-            self.call_function_with_args_resolved(func, posargs, {})
-        else:
-            # FIXME: do something else
-            raise self.vm.PyVMError("CALL_METHOD not implemented yet")
+        return self.call_method_vector(count)
@@ -5,17 +5,29 @@
 # See the documentation for the full license.
 """Bytecode Interpreter operations for PyPy 3.7
 """
+from xpython.byteop.byteop import NULL
 from xpython.byteop.byteop37 import ByteOp37
 from xpython.byteop.byteoppypy import ByteOpPyPy
 
 
+def method_name(vm, i: int) -> str:
+    """
+    Returns the name of the function that LOOKUP_METHOD left at peek(i)
+    and peek(i - 1).
+    """
+    func = vm.peek(i)
+    if func is NULL:
+        func = vm.peek(i - 1)
+    return getattr(func, "__name__", repr(func))
+
+
 def fmt_call_method(vm, argc: int, repr_fn=repr) -> str:
     """
     formats function name (without enclosing object), and positional args.
     """
     pos_args = [vm.peek(i + 1) for i in range(argc)]
 
-    fn_name = vm.peek(argc + 2).__name__
+    fn_name = method_name(vm, argc + 2)
     return f""" {fn_name}({", ".join((repr_fn(a) for a in pos_args))})"""
 
 
@@ -34,7 +46,7 @@ def fmt_call_method_kw(vm, argc: int, repr=repr) -> str:
     for i in range(argc - kwargs_count):
         pos_args.append(vm.peek(i + j))
 
-    fn_name = vm.peek(argc + 3).__name__
+    fn_name = method_name(vm, argc + 3)
     return f""" {fn_name}({", ".join((repr(a) for a in pos_args + kwargs_list))})"""
 
 
@@ -52,32 +64,11 @@ class ByteOp37PyPy(ByteOp37, ByteOpPyPy):
         """
         argc has a count of the number of keyword parameters.
         TOS has a tuple of keyword parameter names. Below that are the
-        keyword values. After that is the cached method which in our
-        case is garbage. After that is the method to call.
+        keyword values, and below those the positional values. After
+        that are the two items described in LOOKUP_METHOD.
         """
 
-        # We are going to access parameter off of the stack which is
-        # has the last parameter closest to the top.
-        # Reverse keyword names in the tuple match our access pattern.
         kw_names = self.vm.pop()
         assert isinstance(kw_names, tuple)
-        kw_names = list(reversed(kw_names))
-        kwarg_count = len(kw_names)
-
-        assert argc >= kwarg_count
-        pos_argc = argc - kwarg_count
-        keyword_args = {}
-
-        for i in range(kwarg_count):
-            param_value = self.vm.pop()
-            keyword_args[kw_names[i]] = param_value
-
-        pos_args = []
-        for i in range(pos_argc):
-            pos_args.append(self.vm.pop())
-
-        pos_args = list(reversed(pos_args))
-
-        self.vm.pop()  # cached method slot is not used here.
-        func = self.vm.pop()
-        return self.call_function_with_args_resolved(func, pos_args, keyword_args)
+        assert argc >= len(kw_names)
+        return self.call_method_vector(argc, kw_names)
@@ -26,6 +26,55 @@ class ByteOp38(ByteOp37):
 
     # Changed in 3.8...
 
+    def WITH_CLEANUP_START(self):
+        """Starts cleaning up the stack when a with statement block
+        exits.
+
+        At the top of the stack are either NULL (pushed by
+        BEGIN_FINALLY) or 6 values pushed if an exception has been
+        raised in the with block. Below is the context manager's
+        __exit__() or __aexit__() bound method.
+
+        If TOS is NULL, calls SECOND(None, None, None), removes the
+        function from the stack, leaving TOS, and pushes None to the
+        stack. Otherwise calls SEVENTH(TOP, SECOND, THIRD), shifts the
+        bottom 3 values of the stack down, replaces the empty spot
+        with NULL and pushes TOS. Finally pushes the result of the
+        call.
+        """
+        TOS = self.vm.top()
+        if TOS is None:
+            exit_method = self.vm.pop(1)
+            exctype = val = tb = None
+        else:
+            exctype, val, tb = TOS, self.vm.peek(2), self.vm.peek(3)
+            exit_method = self.vm.peek(7)
+            stack = self.vm.frame.stack
+            stack[-7:-3] = stack[-6:-3] + [None]
+            # The except-handler block's values are now one lower.
+            self.vm.frame.block_stack[-1].level -= 1
+        self.vm.push(exctype, exit_method(exctype, val, tb))
+
+    def WITH_CLEANUP_FINISH(self):
+        """Finishes cleaning up the stack when a with statement block
+        exits.
+
+        TOS is result of __exit__() or __aexit__() function call
+        pushed by WITH_CLEANUP_START. SECOND is None or an exception
+        type (pushed when an exception has been raised).
+
+        Pops two values from the stack. If SECOND is not None and TOS
+        is true unwinds the EXCEPT_HANDLER block which was created
+        when the exception was caught and pushes NULL to the stack.
+        """
+        exit_result = self.vm.pop()
+        exctype = self.vm.pop()
+        if exctype is not None and exit_result:
+            block = self.vm.pop_block()
+            assert block.type == "except-handler"
+            self.vm.unwind_block(block)
+            self.vm.push(None)
+
     # New in 3.8
 
     ##############################################################################
@@ -52,8 +101,17 @@ class ByteOp38(ByteOp37):
         the stack and restore the exception state using the second three of
         them. Otherwise, re-raise the exception using the three values from the
         stack. An exception handler block is removed from the block stack."""
-
-        raise self.vm.PyVMError("END_ASYNC_FOR not implemented yet")
+        exctype = self.vm.pop()
+        if issubclass(exctype, StopAsyncIteration):
+            block = self.vm.pop_block()
+            assert block.type == "except-handler"
+            self.vm.unwind_block(block)
+            # The asynchronous iterator.
+            self.vm.pop()
+            return
+        val, tb = self.vm.popn(2)[::-1]
+        self.vm.last_exception = (exctype, val, tb)
+        return "reraise"
 
     def END_FINALLY(self):
         """Terminates a "finally" clause. The interpreter recalls whether the
@@ -147,7 +205,7 @@ class ByteOp38(ByteOp37):
         container object remains on the stack so that it is available
         for further iterations of the loop.
         """
-        # FIXME: the below seems fishy.
-        key, val = self.vm.popn(2)
-        the_map = self.vm.peek(count)
-        the_map[key] = val
+        stack = self.vm.frame.stack
+        val = stack.pop()
+        key = stack.pop()
+        stack[-count][key] = val
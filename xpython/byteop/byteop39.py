@@ -7,6 +7,7 @@
 
 """Bytecode Interpreter operations for Python 3.9
 """
+from xpython.byteop.byteop import update_kwargs
 from xpython.byteop.byteop24 import ByteOp24, Version_info
 from xpython.byteop.byteop35 import ByteOp35
 from xpython.byteop.byteop36 import ByteOp36
@@ -49,14 +50,20 @@ class ByteOp39(ByteOp38):
     ##############################################################################
 
     def RERAISE(self):
-        # FIXME
-        raise RuntimeError("RERAISE not implemented yet")
-        pass
+        """Re-raises the exception currently on top of the stack."""
+        exctype, val, tb = self.vm.popn(3)[::-1]
+        self.vm.last_exception = (exctype, val, tb)
+        return "reraise"
 
     def WITH_EXCEPT_START(self):
-        # FIXME
-        raise RuntimeError("WITH_EXCEPT_START not implemented yet")
-        pass
+        """Calls the function in position 7 on the stack with the top
+        three items on the stack as arguments. Used to implement the
+        call context_manager.__exit__(*exc_info()) when an exception
+        has occurred in a with statement.
+        """
+        exit_method = self.vm.peek(7)
+        exctype, val, tb = self.vm.peek(1), self.vm.peek(2), self.vm.peek(3)
+        self.vm.push(exit_method(exctype, val, tb))
 
     def LOAD_ASSERTION_ERROR(self):
         """
@@ -101,33 +108,26 @@ class ByteOp39(ByteOp38):
 
     def LIST_EXTEND(self, i):
         """Calls list.extend(TOS1[-i], TOS). Used to build lists."""
-        TOS = self.vm.pop()
-        destination = self.vm.peek(i)
-        assert isinstance(destination, list)
-        destination.extend(TOS)
+        stack = self.vm.frame.stack
+        TOS = stack.pop()
+        stack[-i].extend(TOS)
 
     def SET_UPDATE(self, i):
         """Calls set.update(TOS1[-i], TOS). Used to build sets."""
-        TOS = self.vm.pop()
-        destination = self.vm.peek(i)
-        assert isinstance(destination, set)
-        destination.update(TOS)
+        stack = self.vm.frame.stack
+        TOS = stack.pop()
+        stack[-i].update(TOS)
 
     def DICT_MERGE(self, i):
-        """Like DICT_UPDATE but raises an exception for duplicate keys."""
-        TOS = self.vm.pop()
-        assert isinstance(TOS, dict)
-        destination = self.vm.peek(i)
-        assert isinstance(destination, dict)
-        dups = set(destination.keys()) & set(TOS.keys())
-        if bool(dups):
-            raise RuntimeError(f"Duplicate keys '{dups}' in DICT_MERGE")
-        destination.update(TOS)
+        """Like DICT_UPDATE but raises an exception for duplicate keys.
+        Used to build the keyword arguments of f(**x, **y).
+        """
+        stack = self.vm.frame.stack
+        TOS = stack.pop()
+        update_kwargs(stack[-i], TOS, stack[-i - 2], self.version_info)
 
     def DICT_UPDATE(self, i):
         """Calls dict.update(TOS1[-i], TOS). Used to build dicts."""
-        TOS = self.vm.pop()
-        assert isinstance(TOS, dict)
-        destination = self.vm.peek(i)
-        assert isinstance(destination, dict)
-        destination.update(TOS)
+        stack = self.vm.frame.stack
+        TOS = stack.pop()
+        stack[-i].update(TOS)
@@ -2,7 +2,7 @@
 
 Specific PyPy versions i.e. PyPy 2.7, 3.2, 3.5-3.7 inherit this.
 """
-import inspect
+from xpython.byteop.byteop import NULL
 
 
 class ByteOpPyPy(object):
@@ -19,30 +19,34 @@ class ByteOpPyPy(object):
         """
         self.vm.jump(jump_offset)
 
-    # For Python 3.7 this is not correct
     def LOOKUP_METHOD(self, name):
         """
-        For now, we'll assume this is the same as LOAD_ATTR:
+        PyPy's equivalent of LOAD_METHOD: if TOS has a method with the
+        correct name, the unbound method and TOS are pushed. Otherwise
+        NULL and the object returned by the attribute lookup are pushed.
 
-        Replaces TOS with getattr(TOS, co_names[namei]).
         Note: name = co_names[namei] set in parse_byte_and_args()
         """
         obj = self.vm.pop()
-        val = getattr(obj, name)
-        self.vm.push(val)
-        if self.version_info[:2] >= (3, 7):
-            if inspect.isfunction(val) or inspect.isbuiltin(val):
-                self.vm.push("LOAD_METHOD lookup success")
-            else:
-                self.vm.push("fill in attribute method lookup")
+        meth = self.lookup_method(obj, name)
+        if meth is NULL:
+            self.vm.push(NULL, getattr(obj, name))
+        else:
+            self.vm.push(meth, obj)
 
     def CALL_METHOD(self, argc: int):
         """
-        For now, we'll assume this is like CALL_FUNCTION:
-
-        Calls a callable object.
+        Calls what LOOKUP_METHOD left on the stack.
         The low byte of argc indicates the number of positional
         arguments, the high byte the number of keyword arguments.
-        ...
+        Keyword arguments are pushed as key, value pairs after the
+        positional arguments.
         """
-        return self.call_function(argc, [], {})
+        len_kw, len_pos = divmod(argc, 256)
+        if len_kw:
+            kw_pairs = self.vm.popn(2 * len_kw)
+            kw_names = tuple(kw_pairs[0::2])
+            self.vm.push(*kw_pairs[1::2])
+        else:
+            kw_names = ()
+        return self.call_method_vector(len_pos + len_kw, kw_names)
@@ -0,0 +1,141 @@
+"""A registry of the code objects a VM has seen, indexed by line.
+
+A debugger that is asked to stop at "file.py:123", or to run up to that
+line, needs the code objects and offsets of the instructions that start
+line 123 of file.py. Rather than searching for them, it can look them up
+here. Code objects are added as the VM first runs them, along with the
+code objects nested in their constants, such as those of functions that
+have not been called yet.
+"""
+
+import weakref
+from bisect import bisect_left, insort
+from typing import Any, Dict, List, Optional, Tuple
+
+from xdis import iscode
+from xdis.cross_dis import findlinestarts
+
+
+class CodeMap:
+    """A mapping from code objects, held weakly and told apart by identity,
+    to values.
+
+    Code objects compare equal when their bytecode, constants and names
+    are, even if they come from different files; before 3.11, their line
+    tables are not compared either. A WeakKeyDictionary would so give
+    the entry of one code object to another. Here an entry is found only
+    by the code object it was set for, and is dropped when that is freed.
+    """
+
+    __slots__ = ("entries",)
+
+    def __init__(self):
+        # id(code) -> (weak reference to code, value)
+        self.entries: Dict[int, Tuple[weakref.ref, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, code) -> bool:
+        return id(code) in self.entries
+
+    def __getitem__(self, code):
+        return self.entries[id(code)][1]
+
+    def __setitem__(self, code, value):
+        key = id(code)
+        entries = self.entries
+        entry = entries.get(key)
+        if entry is not None:
+            ref = entry[0]
+        else:
+
+            def forget(ref):
+                # The entry may have been replaced since `ref` was made.
+                if entries.get(key, (None,))[0] is ref:
+                    del entries[key]
+
+            ref = weakref.ref(code, forget)
+        entries[key] = (ref, value)
+
+    def get(self, code, default=None):
+        entry = self.entries.get(id(code))
+        return default if entry is None else entry[1]
+
+
+class CodeRegistry:
+    """Code objects, held weakly, and an index from (co_filename, line) to
+    the offsets of the instructions that start that line in each of them.
+    """
+
+    def __init__(self):
+        # The code objects added, held weakly and compared by identity.
+        self.codes = CodeMap()
+        # (co_filename, line) -> [(weak reference to a code object, offset)]
+        self.locations: Dict[Tuple[str, int], list] = {}
+        # co_filename -> the lines in `locations`, in order
+        self.file_lines: Dict[str, List[int]] = {}
+
+    def add(self, code):
+        """Add `code` and the code objects nested in it, if they are not
+        in the registry already."""
+        todo = [code]
+        while todo:
+            code = todo.pop()
+            if code in self.codes:
+                continue
+            self.codes[code] = None
+            ref = weakref.ref(code)
+            filename = code.co_filename
+            lines = self.file_lines.setdefault(filename, [])
+            for offset, line in findlinestarts(code):
+                if not line:
+                    # Like the RESUME that starts 3.11 module code, which
+                    # is on no line of the file.
+                    continue
+                key = (filename, line)
+                entries = self.locations.get(key)
+                if entries is None:
+                    entries = self.locations[key] = []
+                    insort(lines, line)
+                entries.append((ref, offset))
+            todo.extend(const for const in code.co_consts if iscode(const))
+
+    def lookup(self, filename: str, line: int) -> list:
+        """Return (code, offset) pairs for the instructions that start line
+        `line` of `filename`. There can be more than one, as when the line
+        is the head of a loop or has a lambda on it."""
+        key = (filename, line)
+        entries = self.locations.get(key)
+        if entries is None:
+            return []
+        found = []
+        for ref, offset in entries:
+            code = ref()
+            if code is not None:
+                found.append((code, offset))
+        if len(found) < len(entries):
+            # Forget code objects that have been freed.
+            if found:
+                self.locations[key] = [
+                    entry for entry in entries if entry[0]() is not None
+                ]
+            else:
+                del self.locations[key]
+                lines = self.file_lines[filename]
+                del lines[bisect_left(lines, line)]
+        return found
+
+    def find(self, filename: str, line: int) -> Tuple[Optional[int], list]:
+        """Return the first line of `filename`, from `line` on, that starts an
+        instruction, and lookup() of that line. The line is None if there
+        is none."""
+        lines = self.file_lines.get(filename, [])
+        i = bisect_left(lines, line)
+        while i < len(lines):
+            found_line = lines[i]
+            found = self.lookup(filename, found_line)
+            if found:
+                return found_line, found
+            # lookup() dropped that line.
+        return None, []
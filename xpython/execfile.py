@@ -1,5 +1,6 @@
 """Execute files of Python code."""
 
+import ast
 import mimetypes
 import os
 import os.path as osp
@@ -16,6 +17,10 @@ from xdis.version_info import IS_PYPY, PYTHON_VERSION_TRIPLE, version_tuple_to_s
 from xpython.stdlib.builtins import make_compatible_builtins
 from xpython.version_info import SUPPORTED_BYTECODE, SUPPORTED_PYPY, SUPPORTED_PYTHON
 from xpython.vm import PyVM, PyVMUncaughtException, format_instruction
+from xpython.vmcoverage import PyVMCoverage
+from xpython.vmprofile import PyVMProfiled
+from xpython.vmsample import PyVMSampled
+from xpython.vmstats import PyVMOpStats
 from xpython.vmtrace import PyVMTraced
 
 if PYTHON_VERSION_TRIPLE >= (3, 4):
@@ -26,6 +31,10 @@ else:
 
 warnings.filterwarnings("ignore")
 
+# Compile flag allowing `await`, `async for` and `async with` at the top
+# level of a program, for running it on an asyncio event loop. New in 3.8.
+ALLOW_TOP_LEVEL_AWAIT = getattr(ast, "PyCF_ALLOW_TOP_LEVEL_AWAIT", 0)
+
 # This code is ripped off from coverage.py.  Define things it expects.
 try:
     open_source = tokenize.open  # pylint: disable=E1101
@@ -72,6 +81,10 @@ def exec_code_object(
     is_pypy=IS_PYPY,
     callback=None,
     format_instruction=format_instruction,
+    opstats=None,
+    sampler=None,
+    profiler=None,
+    coverage=None,
 ):
     if callback:
         vm = PyVMTraced(
@@ -92,7 +105,38 @@ def exec_code_object(
     else:
         if python_version != PYTHON_VERSION_TRIPLE[:2]:
             make_compatible_builtins(BUILTINS.__dict__, python_version)
-        vm = PyVM(python_version, is_pypy, format_instruction_func=format_instruction)
+        if opstats is not None:
+            vm = PyVMOpStats(
+                opstats,
+                python_version,
+                is_pypy,
+                format_instruction_func=format_instruction,
+            )
+        elif sampler is not None:
+            vm = PyVMSampled(
+                sampler,
+                python_version,
+                is_pypy,
+                format_instruction_func=format_instruction,
+            )
+        elif profiler is not None:
+            vm = PyVMProfiled(
+                profiler,
+                python_version,
+                is_pypy,
+                format_instruction_func=format_instruction,
+            )
+        elif coverage is not None:
+            vm = PyVMCoverage(
+                coverage,
+                python_version,
+                is_pypy,
+                format_instruction_func=format_instruction,
+            )
+        else:
+            vm = PyVM(
+                python_version, is_pypy, format_instruction_func=format_instruction
+            )
         try:
             vm.run_code(code, f_globals=env)
         except PyVMUncaughtException:
@@ -125,7 +169,15 @@ def rsplit1(s, sep):
     return sep.join(parts[:-1]), parts[-1]
 
 
-def run_python_module(modulename, args):
+def run_python_module(
+    modulename,
+    args,
+    use_asyncio=False,
+    opstats=None,
+    sampler=None,
+    profiler=None,
+    coverage=None,
+):
     """Run a python module, as though with ``python -m name args...``.
 
     `modulename` is the name of the module, possibly a dot-separated name.
@@ -169,11 +221,29 @@ def run_python_module(modulename, args):
 
     # Finally, hand the file off to run_python_file for execution.
     args[0] = pathname
-    run_python_file(pathname, args, package=packagename)
+    run_python_file(
+        pathname,
+        args,
+        package=packagename,
+        use_asyncio=use_asyncio,
+        opstats=opstats,
+        sampler=sampler,
+        profiler=profiler,
+        coverage=coverage,
+    )
 
 
 def run_python_file(
-    filename, args, package=None, callback=None, format_instruction=format_instruction
+    filename,
+    args,
+    package=None,
+    callback=None,
+    format_instruction=format_instruction,
+    use_asyncio=False,
+    opstats=None,
+    sampler=None,
+    profiler=None,
+    coverage=None,
 ):
     """Run a python file as if it were the main program on the command line.
 
@@ -185,6 +255,17 @@ def run_python_file(
     If `callback` is not None, it is a function which is called back as the
     execution progresses. This can be used for example in a debugger, or
     for custom tracing or statistics gathering.
+
+    If `use_asyncio` is True, source code may use `await` at the top
+    level, and is then run on an asyncio event loop.
+
+    If `opstats` is not None, it is an xpython.vmstats.OpStats object in
+    which each instruction run is counted and timed. Likewise `sampler`
+    can be an xpython.vmsample.StackSampler in which to sample the stack
+    of interpreted frames, and `profiler` an
+    xpython.vmprofile.FunctionProfiler in which to time each call, and
+    `coverage` an xpython.vmcoverage.CoverageCollector in which to record
+    the lines run.
     """
     # Create a module to serve as __main__
     old_main_mod = sys.modules["__main__"]
@@ -264,7 +345,8 @@ def run_python_file(
                 # so make sure it is, then compile a code object from it.
                 if not source or source[-1] != "\n":
                     source += "\n"
-                code = compile(source, filename, "exec")
+                flags = ALLOW_TOP_LEVEL_AWAIT if use_asyncio else 0
+                code = compile(source, filename, "exec", flags)
                 python_version = PYTHON_VERSION_TRIPLE
 
         except (IOError, ImportError):
@@ -278,6 +360,10 @@ def run_python_file(
             is_pypy,
             callback,
             format_instruction=format_instruction,
+            opstats=opstats,
+            sampler=sampler,
+            profiler=profiler,
+            coverage=coverage,
         )
 
     finally:
@@ -290,7 +376,16 @@ def run_python_file(
 
 
 def run_python_string(
-    source, args, package=None, callback=None, format_instruction=format_instruction
+    source,
+    args,
+    package=None,
+    callback=None,
+    format_instruction=format_instruction,
+    use_asyncio=False,
+    opstats=None,
+    sampler=None,
+    profiler=None,
+    coverage=None,
 ):
     """Run a python string as if it were the main program on the command line."""
     # Create a module to serve as __main__
@@ -318,7 +413,8 @@ def run_python_string(
         # so make sure it is, then compile a code object from it.
         if not source or source[-1] != "\n":
             source += "\n"
-        code = compile(source, fake_path, "exec")
+        flags = ALLOW_TOP_LEVEL_AWAIT if use_asyncio else 0
+        code = compile(source, fake_path, "exec", flags)
         python_version = PYTHON_VERSION_TRIPLE
 
         # Execute the source string.
@@ -329,6 +425,10 @@ def run_python_string(
             IS_PYPY,
             callback,
             format_instruction=format_instruction,
+            opstats=opstats,
+            sampler=sampler,
+            profiler=profiler,
+            coverage=coverage,
         )
 
     finally:
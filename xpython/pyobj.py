@@ -6,7 +6,8 @@ import types
 from copy import copy
 from sys import stderr
 
-from xdis import CO_GENERATOR, CO_ITERABLE_COROUTINE, iscode
+from xdis import (CO_COROUTINE, CO_GENERATOR, CO_ITERABLE_COROUTINE,
+                  CO_VARARGS, CO_VARKEYWORDS, iscode)
 from xdis.cross_dis import findlinestarts
 from xdis.version_info import PYTHON3, PYTHON_VERSION_TRIPLE
 
@@ -24,15 +25,26 @@ import xpython.stdlib.inspect3 as inspect3
 PY2 = not PYTHON3
 
 
-def make_cell(value):
-    # Thanks to Alex Gaynor for help with this bit of twistiness.
-    # Construct an actual cell object by creating a closure right here,
-    # and grabbing the cell object out of the function we create.
-    fn = (lambda x: lambda: x)(value)
-    if PYTHON3:
-        return fn.__closure__[0]
-    else:
-        return fn.func_closure[0]
+# Closures use native cell objects, so that the cells of our frames can
+# be handed to native functions and to type() as they are.
+if PYTHON_VERSION_TRIPLE >= (3, 8):
+    Cell = types.CellType
+    make_cell = Cell
+else:
+
+    def make_cell(*value):
+        """Return a new cell holding `value`, or an empty cell when no
+        value is given."""
+        # Thanks to Alex Gaynor for help with this bit of twistiness.
+        # Construct an actual cell object by creating a closure right here,
+        # and grabbing the cell object out of the function we create.
+        if value:
+            return (lambda x: lambda: x)(value[0]).__closure__[0]
+        if False:
+            x = None
+        return (lambda: x).__closure__[0]
+
+    Cell = type(make_cell())
 
 
 # It might be the case that this is more useful in Python 2.x
@@ -47,12 +59,33 @@ try:
 except Exception:
     pass
 
+# The state of a frame that PyVM.enter_comprehension() saves in
+# Frame.inlined while a comprehension runs inline in the frame, made of
+# the Frame fields of these names. f_lasti is where the frame resumes,
+# after the instruction that called the comprehension.
+InlinedState = collections.namedtuple(
+    "InlinedState",
+    "f_code f_locals cells block_stack linestarts line_starts f_lineno f_lasti",
+)
+
 
 # Code with these names have an implicit .0 in them
 COMPREHENSION_FN_NAMES = frozenset(
     ("<setcomp>", "<dictcomp>", "<listcomp>", "<genexpr>")
 )
 
+# Of the above, these are run to completion as soon as they are called, so
+# they can be run inline in the calling frame. See Comprehension below.
+INLINE_COMPREHENSION_NAMES = frozenset(("<setcomp>", "<dictcomp>", "<listcomp>"))
+
+
+def attribute_alias(name: str) -> property:
+    """Return a property that gets and sets the attribute `name`."""
+    return property(
+        lambda self: getattr(self, name),
+        lambda self, value: setattr(self, name, value),
+    )
+
 
 class Function:
     """Function(name, code, globals, argdefs, closure, vm,  kwdefaults={},
@@ -75,25 +108,43 @@ class Function:
     """
 
     __slots__ = [
-        "func_code",  # Python 2.x
-        "func_name",
-        "func_defaults",
-        "func_closure",
-        "__code__",  # Python 3.x
+        "__code__",
         "__name__",
         "__defaults__",
         "__kwdefaults__",
         "__closure__",
-        # rest
+        "__annotations__",
+        "__qualname__",
         "func_globals",
-        "func_locals",
-        "func_dict",
-        "__dict__",
-        # "__doc__" is filled in by the doc comment above.
+        "version",
+        "has_dot_zero",
+        "_positional_params",
+        "_native",
         "_vm",
-        "_func",
+        "_doc",
+        # Holds any attributes set on the function. Like that of a native
+        # function, it is only made when the first one is set.
+        "__dict__",
     ]
 
+    # Function field names change between Python 2.7 and 3.x. These
+    # are the 2.7 names. Other code in this file uses them, while
+    # bytecode for 3.x will use the 3.x names.
+    func_code = attribute_alias("__code__")
+    func_name = attribute_alias("__name__")
+    func_defaults = attribute_alias("__defaults__")
+    func_closure = attribute_alias("__closure__")
+
+    # The docstring is kept in a slot rather than in __dict__, so that
+    # making a Function doesn't also make a dictionary for it.
+    @property
+    def __doc__(self):
+        return self._doc
+
+    @__doc__.setter
+    def __doc__(self, doc):
+        self._doc = doc
+
     def __init__(
         self,
         name,
@@ -107,10 +158,6 @@ class Function:
         doc=None,
         qualname=None,
     ):
-        self._vm = vm
-        self.version = vm.version
-        self.__doc__ = doc
-
         if name is not None and not isinstance(name, str):
             raise TypeError(
                 f"Function() argument 1 (name) must None or string, not {type(name)}"
@@ -135,22 +182,20 @@ class Function:
         if not vm:
             raise TypeError("Function() argument 6 (vm) must be passed")
 
-        # Function field names below change between Python 2.7 and 3.x.
-        # We create attributes for both names. Other code in this file assumes
-        # 2.7ish names, while bytecode for 3.x will use 3.x names.
-        # TODO: be more stringent based on vm version.
-        self.func_code = self.__code__ = code
-        self.func_name = self.__name__ = name or code.co_name
-        self.func_defaults = self.__defaults__ = tuple(argdefs) if argdefs else tuple()
-        self.func_closure = self.__closure__ = closure
+        self._vm = vm
+        self.version = vm.version
 
+        self.__code__ = code
+        self.__name__ = name or code.co_name
+        self.__defaults__ = tuple(argdefs) if argdefs else ()
+        self.__closure__ = closure
         self.func_globals = globs
-        self.func_locals = vm.frame.f_locals
-        self.__dict__ = {"version": vm.version, "_vm": vm}
 
-        self.__doc__ = (
-            code.co_consts[0] if hasattr(code, "co_consts") and code.co_consts else None
-        )
+        # (code, positional parameter names) cached by positional_callargs().
+        self._positional_params = None
+
+        co_consts = code.co_consts
+        self._doc = co_consts[0] if co_consts else None
 
         if vm.version >= (3, 0):
             self.__annotations__ = annotations
@@ -166,15 +211,14 @@ class Function:
         # In Python 3.x is various generators and list comprehensions have a .0 arg
         # but inspect doesn't show that. In the various MAKE_FUNCTION routines,
         # we will detect this and store True in this field when appropriate.
-        if (
-            not argdefs
-            and hasattr(self, "__name")
-            and self.__name__.split(".")[-1] in COMPREHENSION_FN_NAMES
-        ):
-            self.has_dot_zero = True
-        else:
-            self.has_dot_zero = False
-
+        self.has_dot_zero = False
+
+    @property
+    def _func(self):
+        """A native types.FunctionType for this function, or None when
+        the code can't be turned into a native code object. It is built
+        the first time it is asked for and kept after that.
+        """
         # From byterun.py:
         #   Sometimes, we need a real Python function. This is for that.
         #
@@ -193,53 +237,60 @@ class Function:
         # The intent in providing native functions is for use in type
         # testing, mostly. The functions should not be run, since that defeats our
         # ability to trace functions.
-        if hasattr(self, "func_defaults"):
-            kw = {"argdefs": self.func_defaults}
-        else:
-            kw = {}
-
-        if closure:
-            kw["closure"] = tuple(make_cell(0) for _ in closure)
+        #
+        # Most functions never need this, so it isn't made along with
+        # the Function.
+        try:
+            return self._native
+        except AttributeError:
+            pass
 
+        code = self.__code__
         if not isinstance(code, types.CodeType) and hasattr(code, "to_native"):
             try:
                 code = code.to_native()
             except Exception:
                 pass
 
+        native = None
         if isinstance(code, types.CodeType):
+            kw = {"argdefs": self.__defaults__}
+            if self.__closure__:
+                kw["closure"] = self.__closure__
             try:
-                self._func = types.FunctionType(code, globs, **kw)
-                if vm.version >= 3.0:
+                native = types.FunctionType(code, self.func_globals, **kw)
+                if self.version >= (3, 0):
                     # Above, types.FunctionType() above doesn't allow passing
                     # in the following attributes, so we set them as
                     # assignments below.
-                    self._func.__kwdefaults__ = kwdefaults
-                    self._func.__annotations__ = annotations
-                    pass
+                    native.__kwdefaults__ = self.__kwdefaults__
+                    native.__annotations__ = self.__annotations__
             except Exception:
-                self._func = None
-        else:
-            # cross version interpreting... FIXME: fix this up
-            self._func = None
+                native = None
+        # else: cross version interpreting... FIXME: fix this up
+
+        self._native = native
+        return native
 
     def __repr__(self):  # pragma: no cover
-        if hasattr(self, "func_name"):
-            return f"<Function {self.func_name} at 0x{id(self):08x}>"
-        elif hasattr(self, "_func"):
-            return str(self._func)
-        return f"<Function at 0x{id(self):08x}>"
+        return f"<Function {self.__name__} at 0x{id(self):08x}>"
 
     def __get__(self, instance, owner):
         if instance is not None:
             return Method(instance, owner, self)
-        version = self.version if hasattr(self, "version") else PYTHON_VERSION_TRIPLE
-        if version < (3, 0):
+        if self.version < (3, 0):
             return Method(None, owner, self)
         else:
             return self
 
     def __call__(self, *args, **kwargs):
+        if kwargs:
+            callargs = self.keyword_callargs(args, kwargs)
+        else:
+            callargs = self.positional_callargs(args)
+        if callargs is not None:
+            return self.call_with_callargs(callargs)
+
         if self.has_dot_zero:
             # D'oh! http://bugs.python.org/issue19611 Py2 doesn't know how to
             # inspect set comprehensions, dict comprehensions, or generator
@@ -247,7 +298,7 @@ class Function:
             # so just do the right thing.
             assert len(args) == 1 and not kwargs, "Surprising comprehension!"
             callargs = {".0": args[0]}
-        elif self._func and self.version[:2] == PYTHON_VERSION_TRIPLE[:2]:
+        elif self.version[:2] == PYTHON_VERSION_TRIPLE[:2] and self._func:
             # Perhaps this branch can go and we just use the others.
             # It will require a *lot* more code from inspect.py to be added:
             # classes Signature, Parameter, etc.
@@ -268,28 +319,141 @@ class Function:
             else:
                 callargs = inspect2.getcallargs(self, *args, **kwargs)
 
+        return self.call_with_callargs(callargs)
+
+    def call_with_callargs(self, callargs: dict):
+        """Run the function with its parameters already bound in the
+        dictionary `callargs`."""
         frame = self._vm.make_frame(
             self.func_code, callargs, self.func_globals, {}, self.__closure__
         )
-        if self.__code__.co_flags & CO_GENERATOR:
+        co_flags = self.__code__.co_flags
+        if co_flags & CO_GENERATOR or (
+            co_flags & CO_COROUTINE and self._vm.version >= (3, 5)
+        ):
             qualname = self.__qualname__ if self._vm.version >= (3, 4) else None
-            gen = Generator(
+            gen_class = Generator if co_flags & CO_GENERATOR else Coroutine
+            gen = gen_class(
                 g_frame=frame, name=self.__name__, qualname=qualname, vm=self._vm
             )
-            if self.__code__.co_flags & CO_ITERABLE_COROUTINE:
-                gen = _AsyncGeneratorWrapper(gen)
-                frame.generator = gen
-                return gen
-
             frame.generator = gen
+            if co_flags & CO_ITERABLE_COROUTINE:
+                return _AsyncGeneratorWrapper(gen)
             retval = gen
         else:
             retval = self._vm.eval_frame(frame)
         return retval
 
+    def positional_params(self):
+        """Return the tuple of parameter names when the function takes
+        only positional-or-keyword parameters, or None otherwise."""
+        code = self.__code__
+        params = self._positional_params
+        if params is None or params[0] is not code:
+            if code.co_flags & (CO_VARARGS | CO_VARKEYWORDS) or getattr(
+                code, "co_kwonlyargcount", 0
+            ):
+                names = None
+            else:
+                names = tuple(code.co_varnames[: code.co_argcount])
+            params = self._positional_params = (code, names)
+        return params[1]
+
+    def positional_callargs(self, args):
+        """Bind the positional arguments `args` to the function's
+        parameters, filling in defaults. This handles the common case of a
+        function with only positional parameters without going through
+        getcallargs(). None is returned when `args` doesn't fit the
+        parameters this simply; __call__() then does the full binding and
+        error reporting.
+        """
+        names = self.positional_params()
+        if names is None:
+            return None
+        nargs, argcount = len(args), len(names)
+        if nargs == argcount:
+            return dict(zip(names, args))
+        if nargs > argcount:
+            return None
+        defaults = self.__defaults__ or ()
+        missing = argcount - nargs
+        if missing > len(defaults):
+            return None
+        callargs = dict(zip(names, args))
+        callargs.update(zip(names[nargs:], defaults[len(defaults) - missing :]))
+        return callargs
+
+    def keyword_callargs(self, args, kwargs: dict):
+        """Like positional_callargs(), but some of the parameters are
+        passed by keyword in `kwargs`."""
+        names = self.positional_params()
+        if names is None:
+            return None
+        nargs, argcount = len(args), len(names)
+        if nargs > argcount:
+            return None
+        callargs = dict(zip(names, args))
+        posonly = getattr(self.__code__, "co_posonlyargcount", 0)
+        for name, value in kwargs.items():
+            if name in callargs or name not in names[posonly:]:
+                return None
+            callargs[name] = value
+        if len(callargs) < argcount:
+            defaults = self.__defaults__ or ()
+            first_default = argcount - len(defaults)
+            for i in range(nargs, argcount):
+                name = names[i]
+                if name not in callargs:
+                    if i < first_default:
+                        return None
+                    callargs[name] = defaults[i - first_default]
+        return callargs
+
+    def vectorcall(self, args, kw_names=()):
+        """Call the function with CPython's vectorcall argument layout:
+        `args` holds the positional arguments followed by the values of
+        the keyword arguments named in `kw_names`.
+        """
+        if not kw_names:
+            callargs = self.positional_callargs(args)
+            if callargs is not None:
+                return self.call_with_callargs(callargs)
+            return self(*args)
+        nargs = len(args) - len(kw_names)
+        return self(*args[:nargs], **dict(zip(kw_names, args[nargs:])))
+
 
 # FIXME: go over. Not sure how close This is supposed to be
 # like type.MethodType
+class Comprehension(object):
+    """Comprehension(code, globs, closure, vm)
+
+    What MAKE_FUNCTION pushes for a list, set or dict comprehension
+    instead of a Function. When this is called with its iterator, the
+    VM runs `code` inline in the calling frame with its own scope for
+    locals, much as PEP 709 does for CPython 3.12. This saves creating a
+    Function and a Frame, and a recursive call to eval_frame().
+
+    Calling this from outside the VM falls back to a Function.
+    """
+
+    __slots__ = ("code", "globs", "closure", "vm")
+
+    def __init__(self, code, globs, closure, vm):
+        self.code = code
+        self.globs = globs
+        self.closure = closure
+        self.vm = vm
+
+    def __repr__(self):  # pragma: no cover
+        return f"<Comprehension {self.code.co_name} at 0x{id(self):08x}>"
+
+    def __call__(self, iterator):
+        fn = Function(None, self.code, self.globs, (), self.closure, self.vm)
+        fn.has_dot_zero = True
+        return fn(iterator)
+
+
 class Method(object):
     """Create a bound instance method object."""
 
@@ -323,36 +487,6 @@ class Method(object):
             return self.im_func(*args, **kwargs)
 
 
-class Cell(object):
-    """A fake cell for closures.
-
-    Closures keep names in scope by storing them not in a frame, but in a
-    separate object called a cell.  Frames share references to cells, and
-    the LOAD_DEREF and STORE_DEREF opcodes get and set the value from cells.
-
-    This class acts as a cell, though it has to jump through two hoops to make
-    the simulation complete:
-
-        1. In order to create actual FunctionType functions, we have to have
-           actual cell objects, which are difficult to make. See the twisty
-           double-lambda in __init__.
-
-        2. Actual cell objects can't be modified, so to implement STORE_DEREF,
-           we store a one-element list in our cell, and then use [0] as the
-           actual value.
-
-    """
-
-    def __init__(self, value):
-        self.contents = value
-
-    def get(self):
-        return self.contents
-
-    def set(self, value):
-        self.contents = value
-
-
 class Block(object):
     """
     Block(type, handler, level)
@@ -396,6 +530,7 @@ class Frame(object):
         f_back,
         version=PYTHON_VERSION_TRIPLE,
         closure=None,
+        line_starts=None,
     ):
         self.f_code = f_code
         self.f_globals = f_globals
@@ -431,42 +566,33 @@ class Frame(object):
         # and other places which is why we don't set it to the more correct -1.
         self.f_lasti = -1
 
-        if f_code.co_cellvars:
-            self.cells = {}
-            if not f_back.cells:
-                f_back.cells = {}
-            for var in f_code.co_cellvars:
-                # Make a cell for the variable in our locals, or None.
-                cell = Cell(self.f_locals.get(var))
-                f_back.cells[var] = self.cells[var] = cell
+        # Cells are kept in a list in the order that LOAD_CLOSURE and
+        # LOAD_DEREF index them: co_cellvars followed by co_freevars.
+        # The cell of a parameter starts out holding the argument.
+        cellvars = f_code.co_cellvars
+        if cellvars or f_code.co_freevars:
+            self.cells = [
+                make_cell(f_locals[var]) if var in f_locals else make_cell()
+                for var in cellvars
+            ]
+            if f_code.co_freevars:
+                if closure is None:
+                    raise TypeError(
+                        f"code object {f_code.co_name} has free variables"
+                        " but no closure"
+                    )
+                self.cells.extend(closure)
         else:
             self.cells = None
 
-        if f_code.co_freevars:
-            if not self.cells:
-                self.cells = {}
-            for i, var in enumerate(f_code.co_freevars):
-                if closure:
-                    # print("XXX", f_code.co_freevars[i], closure[i].get())
-                    # if f_code.co_freevars[i] == "c" and  closure[i].get() == 5:
-                    #     from trepan.api import debug; debug()
-                    self.cells[var] = closure[i]
-                else:
-                    # FIXME: this branch is probably wrong.
-                    # Also check all calls of Frame and make_frame() in vm to ensure we
-                    # pass a function's closure attribute.
-                    assert isinstance(f_back.cells[i], Cell), "f_back.cells[%d]: %r" % (
-                        i,
-                        f_back.cells[i],
-                    )
-                    self.cells[var] = f_back.cells[var]
-                pass
-            pass
-
         self.block_stack = []
         self.generator = None
         self.version = version
 
+        # An InlinedState of this frame for each comprehension that is
+        # running inline in it. See PyVM.enter_comprehension().
+        self.inlined = []
+
         # These are sentinel or bogus values to start out.
         # eval_frame will adjust inst_index.
         self.inst_index = -1
@@ -474,7 +600,9 @@ class Frame(object):
         self.last_op = None
 
         # Keep a cache of line starts for this frame
-        self.line_starts = list(findlinestarts(self.f_code))
+        if line_starts is None:
+            line_starts = list(findlinestarts(self.f_code))
+        self.line_starts = line_starts
         return
 
     def __repr__(self):  # pragma: no cover
@@ -535,15 +663,65 @@ def traceback_from_frame(frame):
     return tb
 
 
+class DelegateResult(object):
+    """DelegateResult(value, exception)
+
+    What Generator.resume() sends into a frame suspended in YIELD_FROM,
+    once the delegate that values were passed straight to has finished.
+    `value` is the delegate's return value, or if the delegate raised,
+    `exception` is what YIELD_FROM should raise.
+    """
+
+    __slots__ = ("value", "exception")
+
+    def __init__(self, value, exception=None):
+        self.value = value
+        self.exception = exception
+
+
+def extend_yieldfrom_chain(chain: list):
+    """Add the generators that the last generator of `chain` delegates to,
+    directly or not, to `chain`."""
+    delegate = chain[-1].gi_yieldfrom
+    while delegate is not None:
+        chain.append(delegate)
+        delegate = delegate.gi_yieldfrom
+
+
 class Generator(object):
+    __slots__ = (
+        "gi_frame",
+        "gi_yieldfrom",
+        "yieldfrom_chain",
+        "vm",
+        "name",
+        "started",
+        "finished",
+        "gi_running",
+        "gi_code",
+        "__name__",
+        "__qualname__",
+        "__weakref__",
+    )
+
     def __init__(self, g_frame, name, qualname, vm):
         self.gi_frame = g_frame
         self.vm = vm
-        self.name = vm
+        self.name = name
         self.started = False
         self.finished = False
         self.gi_running = False
         self.gi_code = g_frame.f_code
+
+        # The interpreted Generator that YIELD_FROM in our frame is
+        # delegating to, if any. Values are then passed straight to
+        # the innermost generator of the yield-from chain, without
+        # running the frames in between.
+        self.gi_yieldfrom = None
+
+        # The chain as resume() last found it: this generator, its
+        # gi_yieldfrom, and so on down to the innermost generator.
+        self.yieldfrom_chain = None
         self.__name__ = g_frame.f_code.co_name
         self.__qualname__ = qualname if g_frame.version >= (3, 4) else None
 
@@ -553,21 +731,145 @@ class Generator(object):
     def next(self):
         return self.send(None)
 
-    def send(self, value=None):
+    def resume(self, value=None):
+        """Run the generator until it yields or finishes, sending in
+        `value`. A (value, finished) tuple is returned, where value is
+        the yielded value, or the return value when finished is True.
+
+        In contrast to send(), the end of the generator is not signaled
+        by raising StopIteration. The VM uses this for FOR_ITER and
+        YIELD_FROM on interpreted generators.
+        """
+        if self.finished:
+            return None, True
         if not self.started and value is not None:
             raise TypeError("Can't send non-None value to a just-started generator")
-        self.gi_frame.stack.append(value)
-        self.started = True
-        self.running = True
-        val = self.vm.resume_frame(self.gi_frame)
+
+        if self.gi_yieldfrom is None:
+            return self.resume_frame(value)
+
+        # Resume the innermost generator of the chain directly. The frames
+        # above it run again only as the generators below them finish.
+        chain = self.yieldfrom_chain
+        if chain is None or chain[-1].finished or chain[-1].gi_yieldfrom is not None:
+            # The chain has changed since, as when a generator in it was
+            # resumed by itself.
+            chain = self.yieldfrom_chain = [self]
+            extend_yieldfrom_chain(chain)
+        i = len(chain) - 1
+        while True:
+            try:
+                val, finished = chain[i].resume_frame(value)
+            except BaseException as exc:
+                if i == 0:
+                    self.yieldfrom_chain = None
+                    raise
+                value = DelegateResult(None, exc)
+            else:
+                if not finished:
+                    # A generator that was resumed with the result of its
+                    # delegate may have started delegating to another.
+                    del chain[i + 1 :]
+                    extend_yieldfrom_chain(chain)
+                    return val, False
+                if i == 0:
+                    self.yieldfrom_chain = None
+                    return val, True
+                value = DelegateResult(val)
+            i -= 1
+            chain[i].gi_yieldfrom = None
+
+    def resume_frame(self, value):
+        """Run our own frame until it yields or finishes, sending in
+        `value`, as resume() does when we are not delegating."""
         if self.finished:
-            self.running = False
+            return None, True
+        frame = self.gi_frame
+        frame.stack.append(value)
+        # When throwing into a frame suspended at YIELD_VALUE, run that
+        # instruction again so that it raises the exception.
+        reexecute = (
+            type(value) is DelegateResult
+            and frame.f_code.co_code[frame.f_lasti] == self.vm.opc.YIELD_VALUE
+        )
+        self.started = True
+        self.gi_running = True
+        try:
+            val = self.vm.resume_frame(frame, reexecute)
+        except BaseException:
+            self.finished = True
+            raise
+        finally:
+            self.gi_running = False
+        return val, self.finished
+
+    def send(self, value=None):
+        val, finished = self.resume(value)
+        if finished:
             raise StopIteration(val)
         return val
 
+    def throw(self, typ, val=None, tb=None):
+        """Raise an exception in the generator at the point where it
+        is suspended, and return the next value it yields."""
+        if isinstance(typ, BaseException):
+            exc = typ
+        elif isinstance(val, typ):
+            exc = val
+        else:
+            exc = typ() if val is None else typ(val)
+        if tb is not None:
+            exc = exc.with_traceback(tb)
+        if not self.started or self.finished:
+            self.finished = True
+            raise exc
+        return self.send(DelegateResult(None, exc))
+
+    def close(self):
+        if not self.started or self.finished:
+            self.finished = True
+            return
+        try:
+            self.throw(GeneratorExit)
+        except (GeneratorExit, StopIteration):
+            return
+        raise RuntimeError("generator ignored GeneratorExit")
+
     __next__ = next
 
 
+class Coroutine(Generator):
+    """What calling an `async def` function returns.
+
+    Like a native coroutine, this can be awaited, and a native asyncio
+    event loop can drive it through send() and throw().
+    """
+
+    __slots__ = ()
+
+    # Coroutines are awaited, not iterated over.
+    __iter__ = None
+
+    def __await__(self):
+        return self
+
+    @property
+    def cr_await(self):
+        return self.gi_yieldfrom
+
+    @property
+    def cr_code(self):
+        return self.gi_code
+
+    @property
+    def cr_frame(self):
+        return self.gi_frame
+
+    @property
+    def cr_running(self):
+        return self.gi_running
+
+
 if __name__ == "__main__":
     frame = Frame(
         traceback_from_frame.__code__, globals(), locals(), None, PYTHON_VERSION_TRIPLE
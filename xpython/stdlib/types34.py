@@ -237,12 +237,12 @@ class _GeneratorWrapper:
 
 
 class _AsyncGeneratorWrapper(_GeneratorWrapper):
-    def __aiter__(self):
-        if self.__isgen:
-            return self.__wrapped
-        return self
+    """Wraps an interpreted generator whose code has
+    CO_ITERABLE_COROUTINE set, as types.coroutine() does, so that it
+    can be awaited and driven by an event loop."""
 
-    __await__ = __aiter__
+    def __await__(self):
+        return self._GeneratorWrapper__wrapped
 
 
 def coroutine(func):
@@ -8,14 +8,23 @@ import sys
 import six
 from typing import List
 from six.moves import reprlib
-from xdis import (CO_NEWLOCALS, IS_PYPY, PYTHON3, PYTHON_VERSION_TRIPLE,
-                  code2num, next_offset, op_has_argument)
+from xdis import (CO_COROUTINE, CO_NEWLOCALS, IS_PYPY, PYTHON3,
+                  PYTHON_VERSION_TRIPLE, code2num, next_offset,
+                  op_has_argument)
+from xdis.cross_dis import findlinestarts
 from xdis.cross_types import UnicodeForPython3
 from xdis.op_imports import get_opcode_module
-from xdis.opcodes.opcode_311 import _nb_ops
 
 from xpython.byteop import get_byteop
-from xpython.pyobj import Block, Frame, Traceback, traceback_from_frame
+from xpython.coderegistry import CodeMap, CodeRegistry
+from xpython.pyobj import (
+    Block,
+    Coroutine,
+    Frame,
+    InlinedState,
+    Traceback,
+    traceback_from_frame,
+)
 
 PY2 = not PYTHON3
 log = logging.getLogger(__name__)
@@ -116,6 +125,8 @@ def format_instruction(
         argrepr = ""
     elif byte_code in opc.COMPARE_OPS:
         argrepr = opc.cmp_op[int_arg]
+    elif byte_code in opc.FREE_OPS and code is not None:
+        argrepr = (code.co_cellvars + code.co_freevars)[int_arg]
     elif isinstance(arguments, list) and arguments:
         argrepr = arguments[0]
     else:
@@ -184,6 +195,30 @@ class PyVM(object):
         self.opc = get_opcode_module(python_version, variant)
         self.byteop = get_byteop(self, python_version, is_pypy)
 
+        # Starting in 3.11, some relative jumps go backwards, and
+        # LOAD_GLOBAL packs a "push NULL" flag into its operand.
+        self.backward_jump_ops = frozenset(
+            op for name, op in self.opc.opmap.items() if "_BACKWARD" in name
+        )
+        if self.version >= (3, 11):
+            self.load_global_with_null = self.opc.opmap["LOAD_GLOBAL"]
+        else:
+            self.load_global_with_null = None
+
+        # List, set and dict comprehensions are run inline in the calling
+        # frame rather than in a frame of their own; see
+        # enter_comprehension().
+        self.inline_comprehensions = True
+
+        # The line-number tables of each code object run so far, as
+        # (linestarts, line_starts) for the Frame fields of those names;
+        # see line_tables(). Code objects are held weakly, and told apart
+        # by identity, as equal ones can have different line numbers.
+        self.code_line_tables = CodeMap()
+
+        # Every code object run so far, and those nested in them, by line.
+        self.code_registry = CodeRegistry()
+
     ##############################################
     # Frame operations. First the frame stack....
     ##############################################
@@ -228,6 +263,20 @@ class PyVM(object):
         """Push values onto the value stack."""
         self.frame.stack.extend(vals)
 
+    def pushn(self, values):
+        """Push the values of the iterable `values` onto the value stack."""
+        self.frame.stack.extend(values)
+
+    def build(self, n: int, container_fn=None):
+        """Replace the top `n` values of the stack, in a single step, with
+        the list of those values (deepest value first), or with
+        container_fn() of that list.
+        """
+        stack = self.frame.stack
+        start = len(stack) - n
+        elts = stack[start:]
+        stack[start:] = [elts if container_fn is None else container_fn(elts)]
+
     def set(self, i: int, value):
         """Set a value at stack position i."""
         self.frame.stack[-i] = value
@@ -279,13 +328,16 @@ class PyVM(object):
         # The callargs default is safe because we never modify the dict.
         # pylint: disable=dangerous-default-value
 
-        log.debug(
-            "make_frame: code=%r, callargs=%s, f_globals=%r, f_locals=%r",
-            code,
-            repper(callargs),
-            (type(f_globals), id(f_globals)),
-            (type(f_locals), id(f_locals)),
-        )
+        # repper() runs __repr__() methods, which may be interpreted
+        # code, so only do that when the message is going to be shown.
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(
+                "make_frame: code=%r, callargs=%s, f_globals=%r, f_locals=%r",
+                code,
+                repper(callargs),
+                (type(f_globals), id(f_globals)),
+                (type(f_locals), id(f_locals)),
+            )
         if f_globals is not None:
             f_globals = f_globals
             if f_locals is None:
@@ -308,6 +360,7 @@ class PyVM(object):
             f_locals = {"__locals__": {}}
 
         f_locals.update(callargs)
+        linestarts, line_starts = self.line_tables(code)
         frame = Frame(
             f_code=code,
             f_globals=f_globals,
@@ -315,14 +368,31 @@ class PyVM(object):
             f_back=self.frame,
             version=self.version,
             closure=closure,
+            line_starts=line_starts,
         )
 
         # THINK ABOUT: should this go into making the frame?
-        frame.linestarts = dict(self.opc.findlinestarts(code, dup_lines=True))
+        frame.linestarts = linestarts
 
         log.debug("%r", frame)
         return frame
 
+    def line_tables(self, code) -> tuple:
+        """Return the line-number tables of `code` as a dictionary from
+        offset to line number, and as the list of (offset, line number)
+        pairs that Frame.line_number() uses. These are computed once for
+        each code object and shared by all frames running it, so they
+        must not be changed.
+        """
+        tables = self.code_line_tables.get(code)
+        if tables is None:
+            self.code_registry.add(code)
+            tables = self.code_line_tables[code] = (
+                dict(self.opc.findlinestarts(code, dup_lines=True)),
+                list(findlinestarts(code)),
+            )
+        return tables
+
     def push_frame(self, frame):
         self.frames.append(frame)
         self.frame = frame
@@ -347,7 +417,60 @@ class PyVM(object):
             if line:
                 print("    " + line.strip())
 
-    def resume_frame(self, frame):
+    def enter_comprehension(self, comprehension, iterator):
+        """Start running the code of `comprehension` in the current frame
+        with `iterator` as its ".0" parameter. The frame's code, locals,
+        cells, block stack and position are saved; the evaluation stack is
+        shared. RETURN_VALUE in the comprehension code calls
+        leave_comprehension() to restore them, leaving the result on the
+        stack.
+        """
+        frame = self.frame
+        code = comprehension.code
+        offset = frame.f_lasti
+        resume_offset = next_offset(
+            byteint(frame.f_code.co_code[offset]), self.opc, offset
+        )
+        frame.inlined.append(
+            InlinedState(
+                frame.f_code,
+                frame.f_locals,
+                frame.cells,
+                frame.block_stack,
+                frame.linestarts,
+                frame.line_starts,
+                frame.f_lineno,
+                resume_offset,
+            )
+        )
+        frame.f_code = code
+        frame.f_locals = {".0": iterator}
+        # Comprehensions with cell variables aren't run inline, so the
+        # cells are just the closure.
+        frame.cells = list(comprehension.closure) if code.co_freevars else None
+        frame.block_stack = []
+        frame.linestarts, frame.line_starts = self.line_tables(code)
+        frame.f_lineno = code.co_firstlineno
+        frame.f_lasti = 0
+        frame.fallthrough = False
+
+    def leave_comprehension(self, frame):
+        """Restore `frame` to the state it had before the innermost call to
+        enter_comprehension(). Execution continues after the call.
+        """
+        (
+            frame.f_code,
+            frame.f_locals,
+            frame.cells,
+            frame.block_stack,
+            frame.linestarts,
+            frame.line_starts,
+            frame.f_lineno,
+            frame.f_lasti,
+        ) = frame.inlined.pop()
+        frame.fallthrough = False
+
+    def resume_frame(self, frame, reexecute=False):
         frame.f_back = self.frame
         log.debug("resume_frame: %r", frame)
 
@@ -359,7 +482,8 @@ class PyVM(object):
             frame.fallthrough = False
             frame.f_lasti = 0
         else:
-            frame.fallthrough = True
+            # Unless asked to run the instruction we stopped at again.
+            frame.fallthrough = not reexecute
 
         val = self.eval_frame(frame)
         frame.f_back = None
@@ -374,7 +498,16 @@ class PyVM(object):
         """run code using f_globals and f_locals in our VM"""
         frame = self.make_frame(code, f_globals=f_globals, f_locals=f_locals)
         try:
-            val = self.eval_frame(frame)
+            if toplevel and self.version >= (3, 8) and code.co_flags & CO_COROUTINE:
+                # Code compiled allowing top-level await; see
+                # xpython --asyncio.
+                # Only this needs asyncio, so it isn't imported up front.
+                import asyncio
+
+                frame.generator = Coroutine(frame, code.co_name, None, self)
+                val = asyncio.run(frame.generator)
+            else:
+                val = self.eval_frame(frame)
         except Exception:
             # Until we get test/vmtest.py under control:
             if self.vmtest_testing:
@@ -423,7 +556,8 @@ class PyVM(object):
         co_code = f_code.co_code
         extended_arg = 0
 
-        # Note: There is never more than one argument.
+        # Note: There is never more than one argument, except for 3.11's
+        # LOAD_GLOBAL which also gets its push-NULL flag bit.
         # The list size is used to indicate whether an argument
         # exists or not.
         # FIMXE: remove and use int_arg as a indicator of whether
@@ -476,26 +610,31 @@ class PyVM(object):
                     if isinstance(arg, UnicodeForPython3):
                         arg = str(arg)
                 elif byte_code in self.opc.FREE_OPS:
-                    if int_arg < len(f_code.co_cellvars):
-                        arg = f_code.co_cellvars[int_arg]
-                    else:
-                        var_idx = int_arg - len(f.f_code.co_cellvars)
-                        arg = f_code.co_freevars[var_idx]
+                    # Cells are looked up by their index in frame.cells.
+                    arg = int_arg
                 elif byte_code in self.opc.NAME_OPS:
+                    if byte_code == self.load_global_with_null:
+                        # The low bit says whether to push NULL first.
+                        arg = f_code.co_names[int_arg >> 1]
+                        arguments = [str(arg), int_arg & 1]
+                        break
                     arg = f_code.co_names[int_arg]
                     if isinstance(arg, UnicodeForPython3):
                         arg = str(arg)
                 elif byte_code in self.opc.JREL_OPS:
                     # Many relative jumps are conditional,
                     # so setting f.fallthrough is wrong.
-                    if self.version >= (3, 10, 0):
+                    if self.version >= (3, 10):
                         int_arg += int_arg
-                    arg = arg_offset + int_arg
+                    if byte_code in self.backward_jump_ops:
+                        arg = arg_offset - int_arg
+                    else:
+                        arg = arg_offset + int_arg
                 elif byte_code in self.opc.JABS_OPS:
                     # We probably could set fallthough, since many (all?)
                     # of these are unconditional, but we'll make the jump do
                     # the work of setting.
-                    if self.version >= (3, 10, 0):
+                    if self.version >= (3, 10):
                         int_arg += int_arg
                     arg = int_arg
                 elif byte_code in self.opc.LOCAL_OPS:
@@ -538,45 +677,31 @@ class PyVM(object):
         self.in_exception_processing = False
         byteop = self.byteop
         try:
-            if bytecode_name.startswith("UNARY_"):
-                byteop.unaryOperator(bytecode_name[6:])
-            elif bytecode_name.startswith("BINARY_"):
-                if self.version < (3, 11):
-                    byteop.binaryOperator(bytecode_name[7:])
-                else:
-                    byteop.binaryOperator(_nb_ops[int_arg][0][3:])
-
-            elif bytecode_name.startswith("INPLACE_"):
-                byteop.inplaceOperator(bytecode_name[8:])
-            elif "SLICE+" in bytecode_name:
-                self.sliceOperator(bytecode_name)
-            else:
-                # dispatch
-                if hasattr(byteop, bytecode_name):
-                    bytecode_fn = getattr(byteop, bytecode_name, None)
-                else:
-                    bytecode_fn = None
-                if not bytecode_fn:  # pragma: no cover
-                    raise PyVMError(
-                        "Unknown bytecode type: %s\n\t%s"
-                        % (
-                            self.format_instruction(
-                                self.frame,
-                                self.opc,
-                                bytecode_name,
-                                int_arg,
-                                arguments,
-                                offset,
-                                line_number,
-                                False,
-                            ),
+            bytecode_fn = getattr(byteop, bytecode_name, None)
+            if bytecode_fn is not None:
+                why = bytecode_fn(*arguments)
+            else:  # pragma: no cover
+                raise PyVMError(
+                    "Unknown bytecode type: %s\n\t%s"
+                    % (
+                        self.format_instruction(
+                            self.frame,
+                            self.opc,
                             bytecode_name,
-                        )
+                            int_arg,
+                            arguments,
+                            offset,
+                            line_number,
+                            False,
+                        ),
+                        bytecode_name,
                     )
-                why = bytecode_fn(*arguments)
+                )
 
-        except Exception:
+        except BaseException:
             # Deal with exceptions encountered while executing the op.
+            # This includes BaseExceptions like GeneratorExit and
+            # asyncio's CancelledError, which interpreted code may handle.
             self.last_exception = sys.exc_info()
 
             # FIXME: dry code
@@ -674,29 +799,17 @@ class PyVM(object):
 
         return why
 
-    # Interpreter main loop
-    # This is analogous to CPython's _PyEval_EvalFramDefault() (in 3.x newer Python)
-    # or eval_frame() in older 2.x code.
-    def eval_frame(self, frame):
-        """Run a frame until it returns (somehow).
-
-        Exceptions are raised, the return value is returned.
+    def run_frame(self, frame, byte_code):
+        """Run the instructions of `frame`, the current frame, until it
+        returns, yields, or raises an exception it doesn't handle. This is
+        the instruction loop of eval_frame(). `byte_code` is the opcode of
+        the instruction last run in the frame, or None if none was.
 
+        Returns the "why" of the last instruction run, and that instruction
+        as parse_byte_and_args() gives it.
         """
-        self.f_code = frame.f_code
-        if frame.f_lasti == -1:
-            # We were started new, not yielded back from.
-            frame.f_lasti = 0
-            # Don't increment before fetching next instruction.
-            frame.fallthrough = False
-            byte_code = None
-        else:
-            byte_code = byteint(self.f_code.co_code[frame.f_lasti])
-            # byte_code == opcode["YIELD_VALUE"]?
-
-        self.push_frame(frame)
-        offset = 0
         while True:
+            instruction = self.parse_byte_and_args(byte_code)
             (
                 bytecode_name,
                 byte_code,
@@ -704,13 +817,19 @@ class PyVM(object):
                 arguments,
                 offset,
                 line_number,
-            ) = self.parse_byte_and_args(byte_code)
+            ) = instruction
             if log.isEnabledFor(logging.INFO):
                 self.log(bytecode_name, int_arg, arguments, offset, line_number)
 
             # When unwinding the block stack, we need to keep track of why we
             # are doing it.
             why = self.dispatch(bytecode_name, int_arg, arguments, offset, line_number)
+            if frame.inlined and why in ("exception", "reraise"):
+                # Comprehensions have no exception handlers, so the
+                # exception is handled in the code that called them.
+                while frame.inlined:
+                    self.leave_comprehension(frame)
+
             if why == "exception":
                 # TODO: ceval calls PyTraceBack_Here, not sure what that does.
 
@@ -747,7 +866,30 @@ class PyVM(object):
                     why = self.manage_block_stack(why)
 
             if why:
-                break
+                return why, instruction
+
+    # Interpreter main loop
+    # This is analogous to CPython's _PyEval_EvalFramDefault() (in 3.x newer Python)
+    # or eval_frame() in older 2.x code.
+    def eval_frame(self, frame):
+        """Run a frame until it returns (somehow).
+
+        Exceptions are raised, the return value is returned.
+
+        """
+        self.f_code = frame.f_code
+        if frame.f_lasti == -1:
+            # We were started new, not yielded back from.
+            frame.f_lasti = 0
+            # Don't increment before fetching next instruction.
+            frame.fallthrough = False
+            byte_code = None
+        else:
+            byte_code = byteint(self.f_code.co_code[frame.f_lasti])
+            # byte_code == opcode["YIELD_VALUE"]?
+
+        self.push_frame(frame)
+        why = self.run_frame(frame, byte_code)[0]
 
         # TODO: handle generator exception state
 
@@ -775,29 +917,6 @@ class PyVM(object):
         self.in_exception_processing = False
         return self.return_value
 
-    # Operators
-
-    def sliceOperator(self, op):
-        start = 0
-        end = None  # we will take this to mean end
-        op, count = op[:-2], int(op[-1])
-        if count == 1:
-            start = self.pop()
-        elif count == 2:
-            end = self.pop()
-        elif count == 3:
-            end = self.pop()
-            start = self.pop()
-        slice_len = self.pop()
-        if end is None:
-            end = len(slice_len)
-        if op.startswith("STORE_"):
-            slice_len[start:end] = self.pop()
-        elif op.startswith("DELETE_"):
-            del slice_len[start:end]
-        else:
-            self.push(slice_len[start:end])
-
 
 if __name__ == "__main__":
     # Simplest of tests
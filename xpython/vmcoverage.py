@@ -0,0 +1,429 @@
+"""A variant of PyVM that records which lines, and optionally which
+branches, are run.
+
+This is what "xpython --coverage" uses. Each code object run gets a
+bytearray with a byte for each offset of its bytecode, set when the
+instruction at the start of a line there is first run; after that the
+instruction costs one test of that byte. With branch coverage, the
+transitions between lines, called arcs as in coverage.py, are recorded
+in a bitmap with a bit for each pair of lines of the code object.
+
+The result is written in the SQLite data file format of coverage.py, so
+that "coverage report", "coverage html" and so on can be run on it, or
+in the format of coverage.py's JSON report.
+"""
+
+import datetime
+import json
+import os
+import sqlite3
+import sys
+from typing import Dict, Iterator, Set, TextIO, Tuple
+
+from xdis import IS_PYPY, PYTHON_VERSION_TRIPLE, iscode, next_offset
+from xdis.cross_dis import findlinestarts
+
+from xpython.version import __version__
+from xpython.vm import PyVM, format_instruction
+
+# The version of coverage.py's data file schema that write_sqlite()
+# follows, and that schema, from coverage/sqldata.py.
+COVERAGE_SCHEMA_VERSION = 7
+COVERAGE_SCHEMA = """\
+CREATE TABLE coverage_schema (version integer);
+CREATE TABLE meta (key text, value text, unique (key));
+CREATE TABLE file (id integer primary key, path text, unique (path));
+CREATE TABLE context (id integer primary key, context text, unique (context));
+CREATE TABLE line_bits (
+    file_id integer,
+    context_id integer,
+    numbits blob,
+    foreign key (file_id) references file (id),
+    foreign key (context_id) references context (id),
+    unique (file_id, context_id)
+);
+CREATE TABLE arc (
+    file_id integer,
+    context_id integer,
+    fromno integer,
+    tono integer,
+    foreign key (file_id) references file (id),
+    foreign key (context_id) references context (id),
+    unique (file_id, context_id, fromno, tono)
+);
+CREATE TABLE tracer (
+    file_id integer primary key,
+    tracer text,
+    foreign key (file_id) references file (id)
+);
+"""
+
+# The version of the format of coverage.py's JSON report that
+# write_json() follows.
+COVERAGE_JSON_FORMAT = 3
+
+# An arc is a pair of line numbers, the line run and the line run after
+# it. As in coverage.py, entering the code object of a function is an
+# arc from minus its first line number, and leaving it an arc to that.
+Arc = Tuple[int, int]
+
+
+class CodeCoverage:
+    """The lines and arcs run in one code object.
+
+    `linestarts` is the dictionary from offsets of instructions that start
+    a line to their line numbers that the VM uses for `code`.
+    """
+
+    def __init__(self, code, linestarts: Dict[int, int], branch: bool = False):
+        self.code = code
+        self.linestarts = linestarts
+        # A byte for each offset in the bytecode, set once the instruction
+        # there has been run. Only line starts are recorded.
+        self.executed = bytearray(len(code.co_code))
+
+        # With branch coverage, the lines of the code are given indexes
+        # from 1; index 0 stands for entering or leaving the code.
+        # The arc between indexes i and j is bit i * size + j of `arcs`.
+        lines = sorted(set(linestarts.values()))
+        self.lines = [-code.co_firstlineno] + lines
+        self.line_index = {line: i for i, line in enumerate(lines, 1)}
+        self.size = len(self.lines)
+        # Offsets jumped back to -> index of their line.
+        self.jump_lines: Dict[int, int] = {}
+        if branch:
+            self.arcs = bytearray((self.size * self.size + 7) // 8)
+        else:
+            self.arcs = None
+
+    def add_arc(self, start: int, end: int):
+        """Record the arc between the lines of indexes `start` and `end`."""
+        bit = start * self.size + end
+        arcs = self.arcs
+        if not arcs[bit >> 3] & (1 << (bit & 7)):
+            arcs[bit >> 3] |= 1 << (bit & 7)
+
+    def line_at(self, offset: int) -> int:
+        """Return the index of the line of the instruction at `offset`."""
+        line = self.jump_lines.get(offset)
+        if line is None:
+            line_number = None
+            for start, start_line in sorted(self.linestarts.items()):
+                if start > offset:
+                    break
+                line_number = start_line
+            line = self.jump_lines[offset] = self.line_index.get(line_number, 0)
+        return line
+
+    def executed_lines(self) -> Set[int]:
+        executed = self.executed
+        return {
+            line for offset, line in self.linestarts.items() if executed[offset]
+        }
+
+    def executed_arcs(self) -> Iterator[Arc]:
+        lines = self.lines
+        size = self.size
+        for i, byte in enumerate(self.arcs or ()):
+            while byte:
+                low_bit = byte & -byte
+                bit = i * 8 + low_bit.bit_length() - 1
+                yield lines[bit // size], lines[bit % size]
+                byte ^= low_bit
+
+
+class CoverageCollector:
+    """The code objects run by a PyVMCoverage, and what was run in each.
+    With `branch` set, arcs between lines are recorded as well as lines.
+    """
+
+    def __init__(self, branch: bool = False):
+        self.branch = branch
+        # id(code) -> CodeCoverage of code. Code objects of different
+        # files can compare equal, so they are told apart by identity;
+        # each CodeCoverage keeps its code object alive.
+        self.codes: Dict[int, CodeCoverage] = {}
+
+    def code_coverage(self, code, linestarts: Dict[int, int]) -> CodeCoverage:
+        code_coverage = self.codes.get(id(code))
+        if code_coverage is None:
+            code_coverage = self.codes[id(code)] = CodeCoverage(
+                code, linestarts, self.branch
+            )
+        return code_coverage
+
+    def executed_lines(self) -> Dict[str, Set[int]]:
+        """Return the lines run in each file."""
+        files: Dict[str, Set[int]] = {}
+        for code_coverage in self.codes.values():
+            lines = files.setdefault(code_coverage.code.co_filename, set())
+            lines.update(code_coverage.executed_lines())
+        return files
+
+    def executed_arcs(self) -> Dict[str, Set[Arc]]:
+        """Return the arcs run in each file."""
+        files: Dict[str, Set[Arc]] = {}
+        for code_coverage in self.codes.values():
+            arcs = files.setdefault(code_coverage.code.co_filename, set())
+            arcs.update(code_coverage.executed_arcs())
+        return files
+
+    def statements(self) -> Dict[str, Set[int]]:
+        """Return the lines that start an instruction in each file, as found
+        in the code objects run and those nested in them, whether or not
+        they were run."""
+        files: Dict[str, Set[int]] = {}
+        seen = set()
+        todo = [code_coverage.code for code_coverage in self.codes.values()]
+        while todo:
+            code = todo.pop()
+            if id(code) in seen:
+                continue
+            seen.add(id(code))
+            lines = files.setdefault(code.co_filename, set())
+            lines.update(line for _, line in findlinestarts(code) if line)
+            todo.extend(const for const in code.co_consts if iscode(const))
+        return files
+
+    def as_dict(self) -> dict:
+        """Return line coverage in the layout of coverage.py's JSON report,
+        ready for json.dump(). Statements are the lines that start an
+        instruction, so lines that coverage.py would exclude, such as
+        those of docstrings, may differ; functions and classes are not
+        reported on."""
+        executed = self.executed_lines()
+        totals = [0, 0]
+        files = {}
+        for filename, statements in sorted(self.statements().items()):
+            executed_lines = executed.get(filename, set())
+            missing_lines = statements - executed_lines
+            files[filename] = {
+                "executed_lines": sorted(executed_lines),
+                "summary": coverage_summary(len(executed_lines), len(statements)),
+                "missing_lines": sorted(missing_lines),
+                "excluded_lines": [],
+            }
+            totals[0] += len(executed_lines)
+            totals[1] += len(statements)
+        return {
+            "meta": {
+                "format": COVERAGE_JSON_FORMAT,
+                "version": __version__,
+                "timestamp": datetime.datetime.now().isoformat(),
+                "branch_coverage": False,
+                "show_contexts": False,
+            },
+            "files": files,
+            "totals": coverage_summary(*totals),
+        }
+
+    def write_json(self, out: TextIO):
+        json.dump(self.as_dict(), out, indent=1)
+        out.write("\n")
+
+    def write_sqlite(self, path: str):
+        """Write a coverage.py data file to `path`, replacing any file
+        there. Code not read from a file, whose name is like "<string>",
+        is left out since coverage.py can't report on it."""
+        if os.path.exists(path):
+            os.remove(path)
+        if self.branch:
+            data = self.executed_arcs()
+        else:
+            data = self.executed_lines()
+
+        db = sqlite3.connect(path)
+        try:
+            with db:
+                db.executescript(COVERAGE_SCHEMA)
+                db.execute(
+                    "insert into coverage_schema (version) values (?)",
+                    (COVERAGE_SCHEMA_VERSION,),
+                )
+                db.executemany(
+                    "insert into meta (key, value) values (?, ?)",
+                    [
+                        ("has_arcs", str(int(self.branch))),
+                        ("version", __version__),
+                        ("sys_argv", str(sys.argv)),
+                        (
+                            "when",
+                            datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                        ),
+                    ],
+                )
+                db.execute("insert into context (id, context) values (1, '')")
+                for filename, items in sorted(data.items()):
+                    if filename.startswith("<") or not items:
+                        continue
+                    file_id = db.execute(
+                        "insert into file (path) values (?)",
+                        (os.path.abspath(filename),),
+                    ).lastrowid
+                    if self.branch:
+                        db.executemany(
+                            "insert into arc (file_id, context_id, fromno, tono) "
+                            "values (?, 1, ?, ?)",
+                            [(file_id, start, end) for start, end in sorted(items)],
+                        )
+                    else:
+                        db.execute(
+                            "insert into line_bits (file_id, context_id, numbits) "
+                            "values (?, 1, ?)",
+                            (file_id, lines_to_numbits(items)),
+                        )
+        finally:
+            db.close()
+
+
+def lines_to_numbits(lines: Set[int]) -> bytes:
+    """Return `lines` as a coverage.py "numbits" value, a bitmap in which
+    bit n % 8 of byte n // 8 is set for each line number n."""
+    numbits = bytearray(max(lines) // 8 + 1)
+    for line in lines:
+        numbits[line // 8] |= 1 << line % 8
+    return bytes(numbits)
+
+
+def coverage_summary(covered: int, statements: int) -> dict:
+    """Return the "summary" of coverage.py's JSON report, given the number
+    of lines run out of the number of statements."""
+    percent = 100.0 * covered / statements if statements else 100.0
+    # Like coverage.py, don't round to 0% or 100% unless that is exact.
+    if 0 < percent < 1:
+        display = "1"
+    elif 99 < percent < 100:
+        display = "99"
+    else:
+        display = "%.0f" % percent
+    return {
+        "covered_lines": covered,
+        "num_statements": statements,
+        "percent_covered": percent,
+        "percent_covered_display": display,
+        "missing_lines": statements - covered,
+        "excluded_lines": 0,
+    }
+
+
+class PyVMCoverage(PyVM):
+    """A PyVM which records the lines it runs, and the arcs between them
+    when branch coverage is on, in `coverage`, a CoverageCollector
+    object."""
+
+    def __init__(
+        self,
+        coverage: CoverageCollector,
+        python_version=PYTHON_VERSION_TRIPLE,
+        is_pypy=IS_PYPY,
+        vmtest_testing=False,
+        format_instruction_func=format_instruction,
+    ):
+        super().__init__(
+            python_version,
+            is_pypy,
+            vmtest_testing,
+            format_instruction_func=format_instruction_func,
+        )
+        self.coverage = coverage
+
+        # What is recorded is kept with each frame, which must run a
+        # single code object for that.
+        self.inline_comprehensions = False
+
+        # Line coverage alone needs nothing more than the check of a
+        # byte at the start of each line.
+        if coverage.branch:
+            self.dispatch = self.dispatch_arcs
+
+    def line_tables(self, code) -> tuple:
+        """Like PyVM.line_tables(), but with the line starts that CPython
+        traces. From 3.11 on, code starts with a prologue up to a RESUME
+        that is on the "def" line, or on line 0 for a module, and that is
+        not traced. Its line starts are dropped, and the instruction after
+        it starts its line instead, as CPython reports a line on entry.
+        """
+        tables = self.code_line_tables.get(code)
+        if tables is None:
+            linestarts, line_starts = PyVM.line_tables(self, code)
+            resume_op = self.opc.opmap.get("RESUME")
+            if resume_op is not None:
+                co_code = code.co_code
+                offset = 0
+                while offset < len(co_code) and co_code[offset] != resume_op:
+                    offset = next_offset(co_code[offset], self.opc, offset)
+                first = next_offset(resume_op, self.opc, offset)
+                line = None
+                for start, start_line in line_starts:
+                    if start >= first:
+                        break
+                    line = start_line
+                linestarts = {
+                    start: start_line
+                    for start, start_line in linestarts.items()
+                    if start >= first and start_line
+                }
+                if line and first not in linestarts and first < len(co_code):
+                    linestarts[first] = line
+            tables = self.code_line_tables[code] = (linestarts, line_starts)
+        return tables
+
+    def eval_frame(self, frame):
+        # Generators come back here each time they are resumed.
+        if not hasattr(frame, "code_coverage"):
+            frame.code_coverage = self.coverage.code_coverage(
+                frame.f_code, frame.linestarts
+            )
+            # For branch coverage, the index of the last line run.
+            frame.coverage_line = 0
+        try:
+            return_value = PyVM.eval_frame(self, frame)
+        except BaseException:
+            self.leave_code(frame)
+            raise
+        # A generator that only yielded is run again later.
+        generator = frame.generator
+        if generator is None or generator.finished:
+            self.leave_code(frame)
+        return return_value
+
+    def leave_code(self, frame):
+        code_coverage = frame.code_coverage
+        if code_coverage.arcs is not None:
+            code_coverage.add_arc(frame.coverage_line, 0)
+
+    def dispatch(self, bytecode_name, int_arg, arguments, offset, line_number):
+        if line_number is not None:
+            executed = self.frame.code_coverage.executed
+            if not executed[offset]:
+                executed[offset] = 1
+        return PyVM.dispatch(
+            self, bytecode_name, int_arg, arguments, offset, line_number
+        )
+
+    def dispatch_arcs(self, bytecode_name, int_arg, arguments, offset, line_number):
+        frame = self.frame
+        code_coverage = frame.code_coverage
+        if line_number is not None:
+            executed = code_coverage.executed
+            if not executed[offset]:
+                executed[offset] = 1
+            # A line can start at several offsets, so staying on a line
+            # is not an arc from it to itself.
+            line = code_coverage.line_index[line_number]
+            if line != frame.coverage_line:
+                code_coverage.add_arc(frame.coverage_line, line)
+                frame.coverage_line = line
+
+        why = PyVM.dispatch(
+            self, bytecode_name, int_arg, arguments, offset, line_number
+        )
+
+        # As in CPython's line tracing, jumping back, as to the top of a
+        # loop, arrives at a line even when it is the same line or the
+        # target is not the start of one.
+        if not frame.fallthrough and frame.f_lasti < offset:
+            line = code_coverage.line_at(frame.f_lasti)
+            code_coverage.add_arc(frame.coverage_line, line)
+            frame.coverage_line = line
+        return why
@@ -0,0 +1,189 @@
+"""A variant of PyVM that profiles the functions it runs.
+
+This is what "xpython --profile" uses. cProfile, run on xpython itself,
+sees only eval_frame(), dispatch() and the instruction handlers; here
+each interpreted frame is timed as a call of its code object. Native
+functions called from interpreted code are timed as well and get their
+own entries. The result is written in the format of cProfile's
+.prof files, so it can be read with pstats or snakeviz.
+"""
+
+import marshal
+from time import perf_counter
+from types import BuiltinFunctionType, CodeType, ModuleType
+from typing import Dict, List, Tuple
+
+from xdis import IS_PYPY, PYTHON_VERSION_TRIPLE
+
+from xpython.pyobj import Comprehension, Function, Method
+from xpython.vm import PyVM, format_instruction
+
+# How pstats names a function: (filename, first line number, name).
+# Functions that have no code, like built-in ones, have a filename of
+# "~" and a line number of 0.
+FunctionKey = Tuple[str, int, str]
+
+
+def code_key(code) -> FunctionKey:
+    return (code.co_filename, code.co_firstlineno, code.co_name)
+
+
+def native_key(func) -> FunctionKey:
+    """Return the pstats name for `func`, a callable that is run natively,
+    following what cProfile shows for it where there is an equivalent."""
+    code = getattr(func, "__code__", None)
+    if isinstance(code, CodeType):
+        return code_key(code)
+    name = getattr(func, "__qualname__", None) or getattr(func, "__name__", "?")
+    if isinstance(func, BuiltinFunctionType):
+        owner = func.__self__
+        if owner is None or isinstance(owner, ModuleType):
+            module = getattr(func, "__module__", None)
+            if module:
+                name = f"{module}.{name}"
+            return ("~", 0, f"<built-in method {name}>")
+        owner_name = type(owner).__name__
+        return ("~", 0, f"<method '{func.__name__}' of '{owner_name}' objects>")
+    if isinstance(func, type):
+        return ("~", 0, f"<class '{func.__module__}.{name}'>")
+    return ("~", 0, f"<{type(func).__name__} object {name}>")
+
+
+class FunctionProfiler:
+    """Call counts, time spent in each function itself (total time) and
+    time spent in it and everything it called (cumulative time), kept
+    both per function and per caller and callee pair.
+
+    Calls must be properly nested: each enter() is matched by a leave().
+    """
+
+    def __init__(self):
+        # function -> [primitive calls, calls, total time, cumulative time,
+        #              {caller: [calls, primitive calls, total time,
+        #                        cumulative time]}]
+        # The entries per caller are in the order pstats keeps them in.
+        self.stats: Dict[FunctionKey, list] = {}
+        # The calls in progress, innermost last, as
+        # [function, start time, time spent in callees].
+        self.calls: List[list] = []
+        # function, or (caller, function) -> the number of calls to it, or
+        # from caller to it, in progress.
+        self.active: Dict[object, int] = {}
+
+    def enter(self, key: FunctionKey):
+        active = self.active
+        calls = self.calls
+        active[key] = active.get(key, 0) + 1
+        if calls:
+            pair = (calls[-1][0], key)
+            active[pair] = active.get(pair, 0) + 1
+        calls.append([key, perf_counter(), 0.0])
+
+    def leave(self):
+        key, start, in_callees = self.calls.pop()
+        elapsed = perf_counter() - start
+        own = elapsed - in_callees
+        calls = self.calls
+        if calls:
+            calls[-1][2] += elapsed
+            caller = calls[-1][0]
+        else:
+            caller = None
+
+        # As in cProfile, a recursive call is not primitive, and its
+        # time is already in the cumulative time of the outermost one.
+        # For the entry per caller, a call is recursive when there is
+        # a call from the same caller to the function in progress.
+        active = self.active
+        active[key] -= 1
+        stat = self.stats.get(key)
+        if stat is None:
+            stat = self.stats[key] = [0, 0, 0.0, 0.0, {}]
+        stat[1] += 1
+        stat[2] += own
+        if not active[key]:
+            stat[0] += 1
+            stat[3] += elapsed
+        if caller is not None:
+            pair = (caller, key)
+            active[pair] -= 1
+            by_caller = stat[4].get(caller)
+            if by_caller is None:
+                by_caller = stat[4][caller] = [0, 0, 0.0, 0.0]
+            by_caller[0] += 1
+            by_caller[2] += own
+            if not active[pair]:
+                by_caller[1] += 1
+                by_caller[3] += elapsed
+
+    def pstats_dict(self) -> dict:
+        """Return the statistics in the form that pstats.Stats keeps in
+        its `stats` attribute."""
+        return {
+            key: (
+                cc,
+                nc,
+                tt,
+                ct,
+                {caller: tuple(entry) for caller, entry in callers.items()},
+            )
+            for key, (cc, nc, tt, ct, callers) in self.stats.items()
+        }
+
+    def dump_stats(self, path: str):
+        """Write the statistics to `path` in the format of
+        cProfile.Profile.dump_stats()."""
+        with open(path, "wb") as out:
+            marshal.dump(self.pstats_dict(), out)
+
+
+class PyVMProfiled(PyVM):
+    """A PyVM which times each frame it runs, and each native function
+    called from one, in `profiler`, a FunctionProfiler object."""
+
+    def __init__(
+        self,
+        profiler: FunctionProfiler,
+        python_version=PYTHON_VERSION_TRIPLE,
+        is_pypy=IS_PYPY,
+        vmtest_testing=False,
+        format_instruction_func=format_instruction,
+    ):
+        super().__init__(
+            python_version,
+            is_pypy,
+            vmtest_testing,
+            format_instruction_func=format_instruction_func,
+        )
+        self.profiler = profiler
+
+        # Profiles are expected to show each comprehension as a call.
+        self.inline_comprehensions = False
+
+        # Native functions are called from the end of
+        # call_function_with_args_resolved(); time those calls by
+        # shadowing that method on our ByteOp instance.
+        byteop = self.byteop
+        call_function_with_args_resolved = byteop.call_function_with_args_resolved
+
+        def profiled_call(func, pos_args, named_args):
+            if isinstance(func, (Function, Method, Comprehension)) or (
+                isinstance(func, type) and isinstance(func.__init__, Function)
+            ):
+                # These end up in eval_frame().
+                return call_function_with_args_resolved(func, pos_args, named_args)
+            profiler.enter(native_key(func))
+            try:
+                return call_function_with_args_resolved(func, pos_args, named_args)
+            finally:
+                profiler.leave()
+
+        byteop.call_function_with_args_resolved = profiled_call
+
+    def eval_frame(self, frame):
+        profiler = self.profiler
+        profiler.enter(code_key(frame.f_code))
+        try:
+            return PyVM.eval_frame(self, frame)
+        finally:
+            profiler.leave()
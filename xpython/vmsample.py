@@ -0,0 +1,175 @@
+"""A variant of PyVM that samples the interpreted call stack.
+
+This is what "xpython --profile-sample" uses. Every so many instructions,
+or every so many microseconds as measured by a timer thread, the stack
+of interpreted frames is recorded. The result can be written in the
+collapsed-stack format read by flamegraph.pl and similar tools, or as a
+speedscope profile.
+
+Unlike tracing through PyVMTraced callbacks, taking a sample costs
+nothing between samples beyond decrementing a counter, so the timing of
+a long run is not distorted much.
+"""
+
+import json
+import sys
+import threading
+from time import perf_counter
+from typing import Dict, List, Optional, TextIO, Tuple
+
+from xdis import IS_PYPY, PYTHON_VERSION_TRIPLE
+
+from xpython.vm import PyVM, format_instruction
+
+# A stack is a tuple of (co_filename, co_name, line number) triples,
+# outermost call first.
+Stack = Tuple[Tuple[str, str, int], ...]
+
+
+class StackSampler:
+    """The stacks sampled in a run, and how often each was seen.
+
+    With `every` set, a sample is taken each time that many instructions
+    have been run and each sample counts as one. Otherwise a sample is
+    taken every `interval` microseconds, and is weighted by the time
+    since the previous sample.
+    """
+
+    def __init__(self, interval: float = 1000.0, every: Optional[int] = None):
+        self.interval = interval
+        self.every = every
+        self.stacks: Dict[Stack, float] = {}
+        self.last_sample_time = perf_counter()
+
+    @property
+    def unit(self) -> str:
+        return "none" if self.every else "microseconds"
+
+    def sample(self, frames: list):
+        """Record the stack given by `frames`, a list of Frame objects with
+        the outermost first, such as PyVM.frames."""
+        stack = []
+        for frame in frames:
+            # Comprehensions run inline replace the code of the frame that
+            # runs them; the code they replaced is still a caller.
+            for inlined in frame.inlined:
+                code = inlined.f_code
+                stack.append((code.co_filename, code.co_name, inlined.f_lineno))
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_name, frame.line_number()))
+        stack = tuple(stack)
+
+        if self.every:
+            weight = 1
+        else:
+            now = perf_counter()
+            weight = (now - self.last_sample_time) * 1e6
+            self.last_sample_time = now
+        self.stacks[stack] = self.stacks.get(stack, 0) + weight
+
+    def write_collapsed(self, out: TextIO):
+        """Write one line per distinct stack: its frames, outermost first,
+        as filename:function:line separated by ";", then the number of
+        samples or microseconds spent there."""
+        lines = []
+        for stack, weight in self.stacks.items():
+            frames = ";".join("%s:%s:%d" % frame for frame in stack)
+            lines.append("%s %d" % (frames, round(weight)))
+        lines.sort()
+        for line in lines:
+            out.write(line + "\n")
+
+    def write_speedscope(self, out: TextIO, name: str = "xpython"):
+        """Write the samples as a speedscope "sampled" profile; see
+        https://www.speedscope.app/file-format-schema.json"""
+        frames: List[dict] = []
+        frame_index: Dict[tuple, int] = {}
+        samples = []
+        weights = []
+        for stack, weight in self.stacks.items():
+            sample = []
+            for frame in stack:
+                i = frame_index.get(frame)
+                if i is None:
+                    filename, function, line = frame
+                    i = frame_index[frame] = len(frames)
+                    frames.append({"name": function, "file": filename, "line": line})
+                sample.append(i)
+            samples.append(sample)
+            weights.append(weight)
+
+        json.dump(
+            {
+                "$schema": "https://www.speedscope.app/file-format-schema.json",
+                "shared": {"frames": frames},
+                "profiles": [
+                    {
+                        "type": "sampled",
+                        "name": name,
+                        "unit": self.unit,
+                        "startValue": 0,
+                        "endValue": sum(weights),
+                        "samples": samples,
+                        "weights": weights,
+                    }
+                ],
+                "name": name,
+                "exporter": "xpython",
+            },
+            out,
+        )
+        out.write("\n")
+
+
+class PyVMSampled(PyVM):
+    """A PyVM which records its stack of frames in `sampler`, a
+    StackSampler object, as it runs."""
+
+    def __init__(
+        self,
+        sampler: StackSampler,
+        python_version=PYTHON_VERSION_TRIPLE,
+        is_pypy=IS_PYPY,
+        vmtest_testing=False,
+        format_instruction_func=format_instruction,
+    ):
+        super().__init__(
+            python_version,
+            is_pypy,
+            vmtest_testing,
+            format_instruction_func=format_instruction_func,
+        )
+        self.sampler = sampler
+        # The number of instructions left to run before the next sample.
+        # When sampling by time, the timer thread sets this to 1 instead.
+        self.sample_every = sampler.every or sys.maxsize
+        self.sample_countdown = self.sample_every
+
+    def run_code(self, code, f_globals=None, f_locals=None, toplevel=True):
+        if self.sampler.every or not toplevel:
+            return super().run_code(code, f_globals, f_locals, toplevel)
+
+        stop = threading.Event()
+        interval = self.sampler.interval / 1e6
+
+        def tick():
+            while not stop.wait(interval):
+                self.sample_countdown = 1
+
+        timer = threading.Thread(target=tick, name="xpython sampler", daemon=True)
+        self.sampler.last_sample_time = perf_counter()
+        timer.start()
+        try:
+            return super().run_code(code, f_globals, f_locals, toplevel)
+        finally:
+            stop.set()
+            timer.join()
+
+    def dispatch(self, bytecode_name, int_arg, arguments, offset, line_number):
+        self.sample_countdown -= 1
+        if self.sample_countdown <= 0:
+            self.sample_countdown = self.sample_every
+            self.sampler.sample(self.frames)
+        return PyVM.dispatch(
+            self, bytecode_name, int_arg, arguments, offset, line_number
+        )
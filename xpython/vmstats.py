@@ -0,0 +1,232 @@
+"""A variant of PyVM that counts and times the instructions it runs.
+
+This is what "xpython --opstats" uses. PyVM itself does no counting at
+all; here dispatch() is wrapped so that each instruction is timed around
+the call to its handler.
+"""
+
+import json
+from typing import Dict, List, TextIO
+
+from xdis import IS_PYPY, PYTHON_VERSION_TRIPLE
+from xdis.cross_dis import findlinestarts
+
+from xpython.vm import PyVM, format_instruction
+
+if PYTHON_VERSION_TRIPLE >= (3, 7):
+    from time import perf_counter_ns
+else:
+    from time import perf_counter
+
+    def perf_counter_ns() -> int:
+        return int(perf_counter() * 1e9)
+
+
+# Latency histograms have a bucket for each power of two of
+# nanoseconds: bucket i counts the instructions that took at least
+# 2**(i-1) ns but less than 2**i ns. The last bucket takes everything
+# slower than that, which is about 18 minutes.
+HISTOGRAM_BUCKETS = 41
+
+
+class OpStats:
+    """Execution counts, time taken and latency histograms for each opcode
+    name and, when `per_offset` is set, for each instruction, identified
+    by its code object and offset.
+
+    The time charged to an instruction is the time spent in its handler,
+    less the time spent running any frame from there; a CALL instruction
+    is not charged for running the function it calls. Decoding
+    instructions is not charged to any of them.
+    """
+
+    def __init__(self, per_offset: bool = False):
+        self.per_offset = per_offset
+        # opname -> [count, total ns, histogram]
+        self.ops: Dict[str, list] = {}
+        # (code, offset) -> [opname, count, total ns]
+        self.instructions: Dict[tuple, list] = {}
+
+    def record(self, opname: str, code, offset: int, ns: int):
+        """Count one execution of the instruction at `offset` of `code`,
+        which took `ns` nanoseconds."""
+        entry = self.ops.get(opname)
+        if entry is None:
+            entry = self.ops[opname] = [0, 0, [0] * HISTOGRAM_BUCKETS]
+        entry[0] += 1
+        entry[1] += ns
+        entry[2][min(ns.bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+        if self.per_offset:
+            key = (code, offset)
+            entry = self.instructions.get(key)
+            if entry is None:
+                self.instructions[key] = [opname, 1, ns]
+            else:
+                entry[1] += 1
+                entry[2] += ns
+
+    def total_ns(self) -> int:
+        return sum(entry[1] for entry in self.ops.values())
+
+    def as_dict(self) -> dict:
+        """Return the statistics as a dictionary of plain Python values,
+        ready for json.dump(). Opcodes and instructions are sorted with
+        the most time-consuming first. Histograms are given without their
+        trailing empty buckets."""
+        opcodes = {}
+        for opname, (count, ns, histogram) in sorted(
+            self.ops.items(), key=lambda item: -item[1][1]
+        ):
+            last = max(i for i, n in enumerate(histogram) if n)
+            opcodes[opname] = {
+                "count": count,
+                "time_ns": ns,
+                "histogram": histogram[: last + 1],
+            }
+
+        instructions = []
+        line_starts = {}
+        for (code, offset), (opname, count, ns) in sorted(
+            self.instructions.items(), key=lambda item: -item[1][2]
+        ):
+            if code not in line_starts:
+                line_starts[code] = list(findlinestarts(code))
+            instructions.append(
+                {
+                    "filename": code.co_filename,
+                    "function": code.co_name,
+                    "firstlineno": code.co_firstlineno,
+                    "offset": offset,
+                    "line": line_of_offset(line_starts[code], offset),
+                    "opname": opname,
+                    "count": count,
+                    "time_ns": ns,
+                }
+            )
+
+        return {
+            "total_ns": self.total_ns(),
+            "histogram_buckets": "bucket i: 2**(i-1) <= ns < 2**i",
+            "opcodes": opcodes,
+            "instructions": instructions,
+        }
+
+    def write_json(self, out: TextIO):
+        json.dump(self.as_dict(), out, indent=1)
+        out.write("\n")
+
+    def write_report(self, out: TextIO, limit: int = 30):
+        """Write a table of the opcodes, and of the `limit` instructions
+        if per-offset statistics were kept, with the most time-consuming
+        first."""
+        stats = self.as_dict()
+        total = stats["total_ns"] or 1
+        out.write(
+            "%-24s %12s %12s %7s %9s %9s %9s\n"
+            % ("opcode", "count", "time (ms)", "time %", "mean ns", "p50 ns", "p99 ns")
+        )
+        for opname, entry in stats["opcodes"].items():
+            count, ns, histogram = entry["count"], entry["time_ns"], entry["histogram"]
+            out.write(
+                "%-24s %12d %12.3f %6.2f%% %9d %9d %9d\n"
+                % (
+                    opname,
+                    count,
+                    ns / 1e6,
+                    100.0 * ns / total,
+                    ns // count,
+                    percentile(histogram, count, 0.50),
+                    percentile(histogram, count, 0.99),
+                )
+            )
+        if stats["instructions"]:
+            out.write(
+                "\n%-40s %8s %-24s %12s %12s\n"
+                % ("location", "offset", "opcode", "count", "time (ms)")
+            )
+            for entry in stats["instructions"][:limit]:
+                location = "%s:%s(%s)" % (
+                    entry["filename"],
+                    entry["line"],
+                    entry["function"],
+                )
+                out.write(
+                    "%-40s %8d %-24s %12d %12.3f\n"
+                    % (
+                        location,
+                        entry["offset"],
+                        entry["opname"],
+                        entry["count"],
+                        entry["time_ns"] / 1e6,
+                    )
+                )
+
+
+def line_of_offset(line_starts: List[tuple], offset: int):
+    """Return the line number of the instruction at `offset`, given the
+    (offset, line) pairs of findlinestarts()."""
+    line = None
+    for start, start_line in line_starts:
+        if start > offset:
+            break
+        line = start_line
+    return line
+
+
+def percentile(histogram: List[int], count: int, fraction: float) -> int:
+    """Return an upper bound in nanoseconds for the `fraction` quantile of
+    a latency histogram with `count` entries."""
+    wanted = fraction * count
+    seen = 0
+    for i, n in enumerate(histogram):
+        seen += n
+        if seen >= wanted:
+            return (1 << i) - 1
+    return (1 << (len(histogram) - 1)) - 1
+
+
+class PyVMOpStats(PyVM):
+    """A PyVM which records each instruction it runs in `opstats`, an
+    OpStats object."""
+
+    def __init__(
+        self,
+        opstats: OpStats,
+        python_version=PYTHON_VERSION_TRIPLE,
+        is_pypy=IS_PYPY,
+        vmtest_testing=False,
+        format_instruction_func=format_instruction,
+    ):
+        super().__init__(
+            python_version,
+            is_pypy,
+            vmtest_testing,
+            format_instruction_func=format_instruction_func,
+        )
+        self.opstats = opstats
+        # Time taken so far by frames run from inside the handler of the
+        # instruction being timed, such as that of a function it calls.
+        self.nested_ns = 0
+
+    def eval_frame(self, frame):
+        outer_nested_ns = self.nested_ns
+        start = perf_counter_ns()
+        try:
+            return PyVM.eval_frame(self, frame)
+        finally:
+            self.nested_ns = outer_nested_ns + perf_counter_ns() - start
+
+    def dispatch(self, bytecode_name, int_arg, arguments, offset, line_number):
+        # The handler can change the frame's code, as when a comprehension
+        # is run inline, so note it first.
+        code = self.frame.f_code
+        outer_nested_ns = self.nested_ns
+        self.nested_ns = 0
+        start = perf_counter_ns()
+        why = PyVM.dispatch(
+            self, bytecode_name, int_arg, arguments, offset, line_number
+        )
+        elapsed = perf_counter_ns() - start
+        self.opstats.record(bytecode_name, code, offset, elapsed - self.nested_ns)
+        self.nested_ns = outer_nested_ns
+        return why
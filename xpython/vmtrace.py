@@ -4,10 +4,11 @@ This can be used in a debugger or profiler.
 
 import logging
 
-from xdis import IS_PYPY, PYTHON_VERSION_TRIPLE, codeType2Portable
+from xdis import IS_PYPY, PYTHON_VERSION_TRIPLE
 # We will add a new "DEBUG" opcode
 from xdis.opcodes.base import def_op
 
+from xpython.coderegistry import CodeMap
 from xpython.pyobj import Frame, traceback_from_frame
 from xpython.vm import PyVM, PyVMError, byteint, format_instruction
 
@@ -90,6 +91,9 @@ class PyVMTraced(PyVM):
         )
         self.event_flags = event_flags
         self.callback = callback
+
+        # Tracers expect a call event for each comprehension.
+        self.inline_comprehensions = False
         # Add a new opcode to allow us high-speed breakpoints
 
         # FIXME: older xdis uses  "self.opc.l" instead of "self.opc.loc"
@@ -98,36 +102,53 @@ class PyVMTraced(PyVM):
                 self.opc.loc = self.opc.l
         def_op(self.opc.loc, "BRKPT", BREAKPOINT_OP, 0, 0)
 
-    def add_breakpoint(self, frame: Frame, offset: int):
+        # The breakpoints of each code object that has any, as a dictionary
+        # from offset to the opcode there. Each frame has that of its code
+        # as `brkpt`, so breakpoints added later are seen by frames already
+        # running. Code objects are held weakly, and told apart by
+        # identity, as those of different files can compare equal.
+        self.code_breakpoints = CodeMap()
+
+    def add_breakpoint(self, code, offset: int):
+        """
+        Adds a breakpoint at `offset` of `code`, a code object or a Frame whose
+        code is used. It applies to every frame running the code, now or later:
+        when such a frame gets to `offset`, the pseudo-op BRKPT is run in place
+        of the instruction there, which it runs afterwards. The bytecode itself
+        is not changed.
+        """
+        if isinstance(code, Frame):
+            code = code.f_code
+        breakpoints = self.code_breakpoints.get(code)
+        if breakpoints is None:
+            breakpoints = self.code_breakpoints[code] = {}
+            for frame in self.frames:
+                if frame.f_code is code:
+                    frame.brkpt = breakpoints
+        breakpoints[offset] = byteint(code.co_code[offset])
+
+    def add_line_breakpoint(self, filename: str, line: int):
         """
-        Adds a breakpoint at `offset` of `frame`. This is done by modifying the
-        bytecode opcode at the given offset by replacing it with a pseudo-op BRKPT
-        instruction. The old opcode is squirreled a way though.
+        Adds breakpoints at the first line of `filename`, from `line` on, that
+        has code, in each code object that the VM has run so far or that is
+        nested in one of those; see `PyVM.code_registry`. The line used is
+        returned, or None if no code was found.
         """
-        # FIXME: to be more useful we need to work on a code object, and modified code
-        # objects  then get replaced when creating frames.
-        # Convert code to something we can change, then
-        # Convert its bytecode bytes to a list, update the list and replace this back in
-        # the code.
-        code = codeType2Portable(frame.f_code, self.version)
-        frame.brkpt[offset] = code.co_code[offset]
-        bytecode = list(code.co_code)
-        bytecode[offset] = BREAKPOINT_OP
-        code.co_code = bytes(bytecode)
-        frame.f_code = code
-
-    def remove_breakpoint(self, frame: Frame, offset: int):
+        line, locations = self.code_registry.find(filename, line)
+        for code, offset in locations:
+            self.add_breakpoint(code, offset)
+        return line
+
+    def remove_breakpoint(self, code, offset: int):
         """
-        Removes a breakpoint at `offset` of `frame`. This is done by restoring the
-        opcode that was previously smashed using `add_breakpoint()`
+        Removes the breakpoint at `offset` of `code`, a code object or a Frame,
+        previously set using `add_breakpoint()`.
         """
-        # Convert code to something we can change, then
-        # Convert its bytecode ytes to a list, update the list and replace this back in
-        # the code.
-        code = frame.f_code
-        bytecode = list(code.co_code)
-        bytecode[offset] = frame.brkpt[offset]
-        code.co_code = bytes(bytecode)
+        if isinstance(code, Frame):
+            code = code.f_code
+        breakpoints = self.code_breakpoints.get(code)
+        if breakpoints:
+            breakpoints.pop(offset, None)
 
     # FIXME: put callback in f_trace, and update it accordingly
     def eval_frame(self, frame: Frame):
@@ -148,6 +169,8 @@ class PyVMTraced(PyVM):
         if frame.event_flags & PyVMEVENT_STEP_OVER:
             frame.event_flags = PyVMEVENT_NONE
 
+        frame.brkpt = self.code_breakpoints.get(frame.f_code, frame.brkpt)
+
         result = None
         if frame.f_lasti == -1:
             # We were started new, not yielded back from
@@ -201,12 +224,28 @@ class PyVMTraced(PyVM):
             elif result == "return":
                 return self.return_value
 
-        self.frame.linestarts = dict(
-            self.opc.findlinestarts(frame.f_code, dup_lines=True)
-        )
-
         opoffset = 0
         while True:
+            if not (
+                frame.event_flags and (frame.f_trace or self.callback)
+            ) and not self.code_breakpoints:
+                # Nothing in the frame, or in the frames it calls, which
+                # inherit its flags, has an event to report, and there are
+                # no breakpoints. So no callback can be made before the
+                # frame is left that could turn tracing back on, and the
+                # rest of it is run as PyVM.eval_frame() does, with nothing
+                # checked between instructions.
+                why, instruction = self.run_frame(frame, byte_code)
+                (
+                    byte_name,
+                    byte_code,
+                    intArg,
+                    arguments,
+                    opoffset,
+                    line_number,
+                ) = instruction
+                break
+
             (
                 byte_name,
                 byte_code,
@@ -215,6 +254,8 @@ class PyVMTraced(PyVM):
                 opoffset,
                 line_number,
             ) = self.parse_byte_and_args(byte_code)
+            if frame.brkpt and opoffset in frame.brkpt:
+                byte_name, arguments = "BRKPT", []
 
             if log.isEnabledFor(logging.INFO):
                 self.log(byte_name, intArg, arguments, opoffset, line_number)